@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the bot_logic hot paths with regression thresholds
+
+Runs SmartIntentRecognizer.detect_intent, get_contextual_response and the
+WhatsAppBot.process_message dispatch over a fixed corpus, records ns/op and
+allocated bytes/op, and compares them with bench_baseline.json.
+
+Usage:
+    python bench_bot_logic.py                    # compare against the baseline
+    python bench_bot_logic.py --update-baseline  # record a new baseline
+    python bench_bot_logic.py --tolerance 0.5    # allow 50% slowdown
+
+Baselines are machine specific: record one on the machine that runs the check.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot.bot_logic import WhatsAppBot, SmartIntentRecognizer
+from whatsapp_bot.session_store import InMemorySessionStore
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+CORPUS = {
+    'short_command': [
+        "hi", "1", "2", "7", "14", "menu", "back", "help", "parent", "human",
+        "hello", "tutor", "how much", "services", "agent",
+    ],
+    'long_paragraph': [
+        "Good afternoon, my name is Mrs Adeyemi and I am looking for a private teacher who can help my "
+        "two children with their homework after school, especially mathematics and English, and also "
+        "prepare the older one for the WAEC and JAMB examinations next year. Please tell me how much "
+        "it costs, what time the sessions hold and whether you have tutors around Lekki.",
+        "We are a secondary school in Abuja and we need to hire qualified teachers for physics and "
+        "chemistry, and we are also interested in a school management system and digital "
+        "transformation for our admin team. Who can we speak to about this and what is the process?",
+        "I would love to volunteer with your literacy outreach because I believe every child deserves "
+        "to read well. I have weekends free and can also help with the back to school initiative if "
+        "you need people to support children who dropped out of school.",
+    ],
+    'emoji': [
+        "👋👋", "hi 😊", "I need a tutor 🙏🏾📚", "🔥🔥🔥 exam prep?? 💯", "👨‍👩‍👧 parent here ❤️",
+        "how much 💰💰", "😔 I have a problem with my order",
+    ],
+    'non_latin': [
+        "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi", "Ndewo, achọrọ m onye nkuzi", "Sannu, ina son malami",
+        "مرحبا، أحتاج إلى مدرس", "我需要一个数学老师", "Здравствуйте, нужен репетитор",
+        "abeg wetin una dey charge for lesson",
+    ],
+}
+
+ROLES = [None, '1', '2', '3', '6']
+
+
+def _messages():
+    return [message for messages in CORPUS.values() for message in messages]
+
+
+def bench_detect_intent():
+    recognizer = SmartIntentRecognizer()
+    messages = _messages()
+
+    def run(message):
+        recognizer.detect_intent(message)
+    return run, messages
+
+
+def bench_contextual_response():
+    recognizer = SmartIntentRecognizer()
+    cases = [(intent, 0.9, role) for intent in recognizer.intent_patterns for role in ROLES]
+
+    def run(case):
+        recognizer.get_contextual_response(*case)
+    return run, cases
+
+
+def bench_process_message():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    messages = _messages()
+
+    def run(message):
+        bot.process_message("+2348000000000", message)
+    return run, messages
+
+
+BENCHMARKS = {
+    'detect_intent': bench_detect_intent,
+    'get_contextual_response': bench_contextual_response,
+    'process_message': bench_process_message,
+}
+
+
+def measure(setup, min_seconds, repeats):
+    """Return (ns/op, allocated bytes/op) for a benchmark
+
+    Time is the best of ``repeats`` passes over the inputs, each pass repeated
+    until it runs for at least ``min_seconds``. Allocation is the tracemalloc
+    peak above the starting level for a single op, averaged over the inputs.
+    """
+    run, inputs = setup()
+
+    # Warm up and calibrate the number of passes per timing sample
+    passes = 1
+    while True:
+        started = time.perf_counter_ns()
+        for _ in range(passes):
+            for item in inputs:
+                run(item)
+        elapsed = time.perf_counter_ns() - started
+        if elapsed >= min_seconds * 1e9:
+            break
+        passes *= 2
+
+    best = elapsed
+    for _ in range(repeats - 1):
+        started = time.perf_counter_ns()
+        for _ in range(passes):
+            for item in inputs:
+                run(item)
+        best = min(best, time.perf_counter_ns() - started)
+    ns_per_op = best / (passes * len(inputs))
+
+    tracemalloc.start()
+    allocated = 0
+    for item in inputs:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run(item)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+
+    return ns_per_op, allocated / len(inputs)
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human readable regressions beyond the tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('ns_per_op', 'bytes_per_op'):
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(
+                    f"{name} {metric}: {current[metric]:,.0f} > {previous[metric]:,.0f} (+{tolerance:.0%} allowed)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=float(os.environ.get('BENCH_TOLERANCE', '0.25')),
+                        help="Allowed relative regression before failing (default 0.25)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds per timing sample")
+    parser.add_argument('--repeats', type=int, default=5, help="Timing samples per benchmark")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    args = parser.parse_args()
+
+    # Measure the matching logic, not console logging
+    logging.getLogger('whatsapp_bot').setLevel(logging.WARNING)
+    logging.getLogger('whatsapp_bot.bot_logic').setLevel(logging.WARNING)
+
+    results = {}
+    print(f"{'benchmark':<26} {'ns/op':>12} {'bytes/op':>10}")
+    for name in args.only or BENCHMARKS:
+        ns_per_op, bytes_per_op = measure(BENCHMARKS[name], args.min_time, args.repeats)
+        results[name] = {'ns_per_op': round(ns_per_op, 1), 'bytes_per_op': round(bytes_per_op, 1)}
+        print(f"{name:<26} {ns_per_op:>12,.0f} {bytes_per_op:>10,.0f}")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ Performance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print(f"\n✅ Within {args.tolerance:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the priority lanes
+
+Floods a LaneScheduler with greeting-like jobs while complaints and handoff
+requests trickle in, each job sleeping to stand in for the Graph API send,
+then prints the per-lane latency metrics. The urgent lane's wait should
+stay near one job's duration however deep the normal backlog gets.
+
+Usage:
+    python bench_lanes.py
+    python bench_lanes.py --jobs 5000 --workers 8 --job-ms 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot.lanes import LANES, LOW, NORMAL, URGENT, LaneScheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000, help="Messages in the burst (default 2000)")
+    parser.add_argument('--urgent-share', type=float, default=0.02, help="Fraction that are urgent (default 0.02)")
+    parser.add_argument('--workers', type=int, default=4, help="Worker threads (default 4)")
+    parser.add_argument('--job-ms', type=float, default=2.0, help="Simulated time per turn (default 2ms)")
+    parser.add_argument('--starvation-after', type=float, default=2.0, help="Seconds before a job is promoted")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    scheduler = LaneScheduler(workers=args.workers, starvation_after=args.starvation_after, max_queued=args.jobs * 2)
+    job_seconds = args.job_ms / 1000
+
+    started = time.monotonic()
+    for _ in range(args.jobs):
+        roll = rng.random()
+        lane = URGENT if roll < args.urgent_share else LOW if roll > 0.95 else NORMAL
+        scheduler.submit(lane, time.sleep, job_seconds)
+
+    while sum(scheduler.queued().values()) or sum(s['processed'] for s in scheduler.stats().values()) < args.jobs:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+
+    print(f"{args.jobs} jobs on {args.workers} workers in {elapsed:.2f}s")
+    print(f"{'lane':<8} {'jobs':>6} {'promoted':>8} {'wait p50':>9} {'wait p95':>9} {'wait max':>9}  (ms)")
+    stats = scheduler.stats()
+    for lane in LANES:
+        lane_stats = stats[lane]
+        print(f"{lane:<8} {lane_stats['processed']:>6} {lane_stats['promoted']:>8} "
+              f"{lane_stats['wait_p50_ms'] or 0:>9.1f} {lane_stats['wait_p95_ms'] or 0:>9.1f} "
+              f"{lane_stats['wait_max_ms'] or 0:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
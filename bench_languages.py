@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark for language identification plus intent matching
+
+Times, per language, the character trigram language identifier and
+keyword matching against that language's own compiled index, and compares
+the total with matching every message against a single index holding
+every language's keywords. Caches are disabled so every message pays the
+full cost.
+
+Usage:
+    python bench_languages.py
+    python bench_languages.py --repeat 2000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from bench_bot_logic import CORPUS
+from whatsapp_bot.bot_logic import SmartIntentRecognizer
+from whatsapp_bot.languages import (
+    ENGLISH, LANGUAGE_KEYWORDS, LANGUAGE_SAMPLES, LanguageIdentifier, language_patterns,
+)
+from whatsapp_bot.tokenizer import tokenize
+
+MESSAGES = {
+    'en': CORPUS['short_command'] + CORPUS['long_paragraph'],
+    'pcm': ["abeg i wan get lesson teacher for my pikin", "how much una dey collect", "una dey where",
+            "my pikin dey write jamb next month", "e no dey work o, na wahala"],
+    'yo': ["e kaaro, mo fe oluko fun omo mi", "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi", "nibo ni e wa",
+           "elo ni e n gba fun eko ile", "omo mi fe se idanwo waec"],
+    'ig': ["kedu, achoro m onye nkuzi maka nwa m", "ego ole ka unu na-ana", "ebee ka unu no",
+           "nwa m choro nkwadebe ule", "biko o naghi aru oru"],
+    'ha': ["sannu, ina son malami don dana", "nawa ne kudin karatun gida", "ina kuke",
+           "dana zai rubuta jarrabawa", "akwai matsala, baya aiki"],
+}
+
+
+def time_per_op(function, messages, repeat):
+    started = time.perf_counter_ns()
+    for _ in range(repeat):
+        for message in messages:
+            function(message)
+    return (time.perf_counter_ns() - started) / (repeat * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500, help="Passes over each language's messages (default 500)")
+    args = parser.parse_args()
+
+    logging.getLogger('whatsapp_bot.bot_logic').setLevel(logging.WARNING)
+    identifier = LanguageIdentifier(LANGUAGE_SAMPLES, cache_size=0)
+    english = SmartIntentRecognizer(cache_size=0)
+    recognizers = {ENGLISH: english}
+    combined = dict(english.intent_patterns)
+    for language in LANGUAGE_KEYWORDS:
+        patterns = language_patterns(english.intent_patterns, language)
+        recognizers[language] = SmartIntentRecognizer(patterns, cache_size=0, fold_marks=True)
+        for intent, keywords in patterns.items():
+            combined[intent] = tuple(dict.fromkeys(combined.get(intent, ()) + keywords))
+    single_index = SmartIntentRecognizer(combined, cache_size=0, fold_marks=True)
+
+    def per_language(message):
+        tokens = tokenize(message)
+        return recognizers[identifier.identify(tokens)].match_intent(tokens)
+
+    def all_in_one(message):
+        return single_index.match_intent(tokenize(message))
+
+    print(f"{'language':<9} {'identified':>10} {'identify ns':>12} {'match ns':>9} {'total ns':>9} {'one index ns':>13}")
+    for language, messages in MESSAGES.items():
+        tokens = [tokenize(message) for message in messages]
+        correct = sum(identifier.identify(message) == language for message in tokens)
+        identify_ns = time_per_op(identifier.identify, tokens, args.repeat)
+        own = recognizers[language]
+        match_ns = time_per_op(own.match_intent, tokens, args.repeat)
+        total_ns = time_per_op(per_language, messages, args.repeat)
+        single_ns = time_per_op(all_in_one, messages, args.repeat)
+        print(f"{language:<9} {correct:>5}/{len(messages):<4} {identify_ns:12.0f} {match_ns:9.0f} {total_ns:9.0f} {single_ns:13.0f}")
+
+    keywords = {language: sum(map(len, recognizer.intent_patterns.values())) for language, recognizer in recognizers.items()}
+    print(f"\nKeywords per index: {keywords}; single index: {sum(map(len, combined.values()))}")
+
+
+if __name__ == '__main__':
+    main()
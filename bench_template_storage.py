@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Storage report for logging outgoing replies as response template references
+
+Replays a synthetic but realistic message mix (menu navigation, free text,
+follow-up questions and a broadcast) through the bot with in-memory sessions
+and compares the bytes message_logs would hold when every outgoing reply is
+stored in full with the bytes needed when catalog replies only reference a
+response_templates row.
+
+Usage:
+    python bench_template_storage.py              # 2000 users
+    python bench_template_storage.py --users 20000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from bench_bot_logic import CORPUS
+from whatsapp_bot.bot_logic import BotReply
+from whatsapp_bot.replay import ReplayBot
+from whatsapp_bot.session_store import InMemorySessionStore
+
+# Bytes of a template_id (bigint) column per outgoing row
+REFERENCE_BYTES = 8
+
+MENU_PATHS = [
+    ["hi", "2", "how much"], ["menu", "7", "13", "back"], ["hello", "1"], ["help", "14"],
+    ["I need a tutor for my son", "how much", "where are you located"], ["3", "exam prep??"],
+]
+
+BROADCAST = (
+    "📢 PAP (Purpose Awareness Program) registration is now open! Help your child discover their "
+    "purpose this holiday. Register here: https://forms.gle/eTkf1N9qrKZyNJr4A"
+)
+
+
+def build_dataset(users, seed=7):
+    """(message_type, reply) pairs for ``users`` simulated conversations"""
+    rng = random.Random(seed)
+    free_text = [message for messages in CORPUS.values() for message in messages]
+    bot = ReplayBot(session_store=InMemorySessionStore())
+    rows = []
+
+    for user in range(users):
+        phone_number = f"+234800{user:07d}"
+        messages = list(rng.choice(MENU_PATHS))
+        messages += rng.sample(free_text, rng.randint(0, 3))
+        for message in messages:
+            rows.append(("incoming", message))
+            rows.append(("outgoing", bot.process_message(phone_number, message)))
+        if rng.random() < 0.5:
+            rows.append(("outgoing", BotReply(BROADCAST, template="broadcast.1")))
+        bot.session_store.sessions.pop(phone_number, None)
+    return rows
+
+
+def storage_report(rows):
+    full_bytes = 0
+    referenced_bytes = 0
+    templates = {}
+    templated_rows = 0
+
+    for message_type, text in rows:
+        size = len(str(text).encode('utf-8'))
+        full_bytes += size
+        key = getattr(text, 'template', None)
+        if message_type == "outgoing" and key is not None:
+            templated_rows += 1
+            referenced_bytes += REFERENCE_BYTES
+            templates[(key, str(text))] = size
+        else:
+            referenced_bytes += size
+
+    template_bytes = sum(templates.values())
+    return {
+        'rows': len(rows),
+        'templated_rows': templated_rows,
+        'templates': len(templates),
+        'full_bytes': full_bytes,
+        'referenced_bytes': referenced_bytes + template_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000, help="Simulated conversations (default 2000)")
+    args = parser.parse_args()
+
+    logging.getLogger('whatsapp_bot.bot_logic').setLevel(logging.WARNING)
+    report = storage_report(build_dataset(args.users))
+
+    saved = report['full_bytes'] - report['referenced_bytes']
+    print(f"{report['rows']} message rows, {report['templated_rows']} outgoing rows from "
+          f"{report['templates']} distinct templates")
+    print(f"Full text:            {report['full_bytes'] / 1024:10.1f} KiB")
+    print(f"Template references:  {report['referenced_bytes'] / 1024:10.1f} KiB (including response_templates)")
+    print(f"Saved:                {saved / 1024:10.1f} KiB ({saved / report['full_bytes'] * 100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the follow-up timing wheel
+
+Times scheduling, cancelling and expiring timers in the hierarchical
+timing wheel as the number of pending timers grows, next to a binary heap
+(where cancelling means finding and removing the entry). Per-operation
+cost in the wheel should stay flat from thousands to millions of timers.
+
+Usage:
+    python bench_timing_wheel.py
+    python bench_timing_wheel.py --sizes 10000 1000000
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from whatsapp_bot.timing_wheel import TimingWheel
+
+DAY = 24 * 60 * 60
+
+
+def per_op_ns(started, count):
+    return (time.perf_counter_ns() - started) / count
+
+
+def bench_wheel(deadlines, cancel):
+    wheel = TimingWheel(tick=1.0, now=0.0)
+    started = time.perf_counter_ns()
+    for key, deadline in enumerate(deadlines):
+        wheel.schedule(key, deadline)
+    schedule_ns = per_op_ns(started, len(deadlines))
+
+    started = time.perf_counter_ns()
+    for key in cancel:
+        wheel.cancel(key)
+    cancel_ns = per_op_ns(started, len(cancel))
+
+    started = time.perf_counter_ns()
+    fired = 0
+    for now in range(0, DAY + 1, 60):
+        fired += len(wheel.advance(now))
+    expire_ns = per_op_ns(started, max(fired, 1))
+    return schedule_ns, cancel_ns, expire_ns
+
+
+def bench_heap(deadlines, cancel, cancel_sample):
+    heap = []
+    started = time.perf_counter_ns()
+    for key, deadline in enumerate(deadlines):
+        heapq.heappush(heap, (deadline, key))
+    schedule_ns = per_op_ns(started, len(deadlines))
+
+    # Removing an arbitrary entry means a linear search and a re-heapify
+    started = time.perf_counter_ns()
+    for key in cancel[:cancel_sample]:
+        index = next(index for index, (_, entry) in enumerate(heap) if entry == key)
+        heap[index] = heap[-1]
+        heap.pop()
+        heapq.heapify(heap)
+    cancel_ns = per_op_ns(started, cancel_sample)
+    return schedule_ns, cancel_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="Pending timer counts to try (default 10000 100000 1000000)")
+    parser.add_argument('--heap-cancels', type=int, default=20, help="Heap cancellations timed per size (default 20)")
+    args = parser.parse_args()
+
+    generator = random.Random(50)
+    print(f"{'timers':>9} {'wheel add ns':>13} {'wheel cancel ns':>16} {'wheel expire ns':>16} "
+          f"{'heap add ns':>12} {'heap cancel ns':>15}")
+    for size in args.sizes:
+        deadlines = [generator.uniform(1, DAY) for _ in range(size)]
+        cancel = generator.sample(range(size), size // 2)
+        wheel_add, wheel_cancel, wheel_expire = bench_wheel(deadlines, cancel)
+        heap_add, heap_cancel = bench_heap(deadlines, cancel, args.heap_cancels)
+        print(f"{size:>9} {wheel_add:13.0f} {wheel_cancel:16.0f} {wheel_expire:16.0f} {heap_add:12.0f} {heap_cancel:15.0f}")
+
+
+if __name__ == '__main__':
+    main()
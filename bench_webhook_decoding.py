@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Parsing benchmark for WhatsApp webhook payloads
+Compares the old json.loads + dict walk with the typed decoder and the
+status-only fast path on payloads shaped like the ones Meta sends
+"""
+
+import json
+import sys
+import timeit
+
+from whatsapp_bot import payloads
+from whatsapp_bot.payloads import decode_webhook
+
+PHONE_NUMBER_ID = "106540352242922"
+
+
+def _envelope(value):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{"value": value, "field": "messages"}],
+        }],
+    }
+
+
+def _metadata():
+    return {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550783881", "phone_number_id": PHONE_NUMBER_ID},
+    }
+
+
+def text_payload():
+    value = _metadata()
+    value["contacts"] = [{"profile": {"name": "Adaeze Okafor"}, "wa_id": "2348012345678"}]
+    value["messages"] = [{
+        "from": "2348012345678",
+        "id": "wamid.HBgNMjM0ODAxMjM0NTY3OBUCABIYFjNFQjBDNzE4RjZCMTY1NjFFMzFFAA==",
+        "timestamp": "1724486400",
+        "text": {"body": "Good afternoon, I need a maths tutor for my daughter preparing for WAEC"},
+        "type": "text",
+    }]
+    return json.dumps(_envelope(value)).encode()
+
+
+def status_payload(count):
+    value = _metadata()
+    value["statuses"] = [{
+        "id": f"wamid.HBgNMjM0ODAxMjM0NTY3OBUCABEYEjQ1QkNGRjA4QjYwNzc5{i:04d}AA==",
+        "status": ("sent", "delivered", "read")[i % 3],
+        "timestamp": "1724486460",
+        "recipient_id": "2348012345678",
+        "conversation": {
+            "id": "7f5a2bd62d6a4c1f8a0b5f8bd0e0d1c2",
+            "expiration_timestamp": "1724572860",
+            "origin": {"type": "service"},
+        },
+        "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+    } for i in range(count)]
+    return json.dumps(_envelope(value)).encode()
+
+
+def legacy_walk(body):
+    """The decoding handle_webhook/process_message used to do"""
+    data = json.loads(body)
+    found = []
+    if "entry" in data:
+        for entry in data["entry"]:
+            if "changes" in entry:
+                for change in entry["changes"]:
+                    if change.get("field") == "messages":
+                        value = change["value"]
+                        if "messages" in value:
+                            for message in value["messages"]:
+                                found.append((message["from"], message.get("text", {}).get("body", "").strip()))
+    return found
+
+
+def fast_path(body):
+    """What handle_webhook now does before any message processing"""
+    changes = decode_webhook(body)
+    if not any(change.messages for change in changes):
+        return []
+    return changes
+
+
+def bench(func, body, number):
+    best = min(timeit.repeat(lambda: func(body), number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = [
+        ("text message", text_payload()),
+        ("1 status", status_payload(1)),
+        ("25 statuses", status_payload(25)),
+    ]
+
+    print(f"JSON backend: {'orjson' if payloads.orjson is not None else 'json'}")
+    print(f"{'payload':<14} {'bytes':>6} {'legacy us':>10} {'decode us':>10} {'fast path us':>13}")
+    for name, body in cases:
+        legacy = bench(legacy_walk, body, number)
+        decoded = bench(decode_webhook, body, number)
+        fast = bench(fast_path, body, number)
+        print(f"{name:<14} {len(body):>6} {legacy:>10.2f} {decoded:>10.2f} {fast:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
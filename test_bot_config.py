@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tests for runtime-published intents and responses
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+
+from django.db import connection
+
+from whatsapp_bot import views
+from whatsapp_bot.bot_config import publish_config
+from whatsapp_bot.bot_logic import WhatsAppBot
+from whatsapp_bot.models import BotConfig, MessageLog, UserSession
+from whatsapp_bot.payloads import InboundMessage
+from whatsapp_bot.session_store import DatabaseSessionStore, InMemorySessionStore
+from whatsapp_bot.tenants import TenantRegistry, tenant_registry
+
+CHESS_CONFIG = {
+    'intent_patterns': {'chess_club': ['chess', 'checkmate']},
+    'intent_priorities': {'chess_club': 9},
+    'responses': {'greeting': "Welcome to Uniqwrites v2"},
+    'smart_responses': {'chess_club': {'default': "♟ Join our chess club!"}},
+}
+
+
+def _cleanup():
+    BotConfig.objects.all().delete()
+    # The process-wide registry may have loaded a test version
+    tenant_registry.invalidate()
+
+
+def test_published_version_is_swapped_in():
+    _cleanup()
+    registry = TenantRegistry(ttl=60)
+    old_bot = registry.default_bot()
+    assert registry.refresh_config() is False
+
+    publish_config(CHESS_CONFIG, comment="chess club")
+    assert registry.refresh_config() is True
+    bot = registry.get_bot('')
+    assert bot is not old_bot and bot.config_version == BotConfig.objects.get().version
+
+    bot.session_store = InMemorySessionStore()
+    reply = bot.process_message("+1234500041", "Do you teach chess, up to checkmate?")
+    assert (reply, reply.intent) == ("♟ Join our chess club!", "chess_club")
+    assert bot.process_message("+1234500041", "menu") == "Welcome to Uniqwrites v2"
+    # Built-in entries the configuration does not mention are untouched
+    assert bot.intent_recognizer.match_intent("exam preparation")[0] == "exam_prep"
+
+    # A message that started on the old bot finishes with the old tables
+    assert old_bot.intent_recognizer.match_intent("Do you teach chess?") == ('unknown', 0.0)
+
+    # Unpublishing everything goes back to the built-in tables
+    _cleanup()
+    assert registry.refresh_config() is True
+    assert registry.get_bot('').config_version is None
+
+
+def test_turns_in_flight_keep_the_configuration_they_started_with():
+    _cleanup()
+    in_flight, later = "+1234500041", "+1234500042"
+    UserSession.objects.filter(phone_number__in=[in_flight, later]).delete()
+    old_bot = tenant_registry.default_bot()
+
+    loaded, release = threading.Event(), threading.Event()
+    real_get_or_create = DatabaseSessionStore.get_or_create
+    sent = {}
+
+    def pause_after_loading(store, phone_number):
+        session = real_get_or_create(store, phone_number)
+        if phone_number == in_flight:
+            loaded.set()
+            release.wait(5)
+        return session
+
+    def post_message(bot, phone_number, message):
+        sent[phone_number] = (bot, str(message))
+        return "wamid.out", None
+
+    def handle(phone_number):
+        try:
+            views.handle_message("", InboundMessage("wamid.in", phone_number, "1724486400", "text", "menu"))
+        finally:
+            connection.close()
+
+    with mock.patch.object(DatabaseSessionStore, 'get_or_create', autospec=True, side_effect=pause_after_loading), \
+            mock.patch.object(WhatsAppBot, 'post_message', autospec=True, side_effect=post_message):
+        turn = threading.Thread(target=handle, args=(in_flight,))
+        turn.start()
+        assert loaded.wait(5)
+        # Published and swapped in while the first turn is between loading its session and replying
+        publish_config(CHESS_CONFIG)
+        assert tenant_registry.refresh_config() is True
+        handle(later)
+        release.set()
+        turn.join(5)
+
+    in_flight_bot, in_flight_reply = sent[in_flight]
+    assert in_flight_bot is old_bot and in_flight_reply != "Welcome to Uniqwrites v2"
+    later_bot, later_reply = sent[later]
+    assert later_bot.config_version == BotConfig.objects.get().version
+    assert later_reply == "Welcome to Uniqwrites v2"
+    UserSession.objects.filter(phone_number__in=[in_flight, later]).delete()
+    MessageLog.objects.filter(phone_number__in=[in_flight, later]).delete()
+    _cleanup()
+
+
+def test_rebuild_runs_off_the_request_path():
+    _cleanup()
+    registry = TenantRegistry(ttl=60, config_poll=0.001)
+    old_bot = registry.default_bot()
+    publish_config(CHESS_CONFIG)
+
+    started, release = threading.Event(), threading.Event()
+    real_refresh = registry.refresh_config
+
+    def slow_refresh():
+        started.set()
+        release.wait(5)
+        return real_refresh()
+
+    with mock.patch.object(registry, 'refresh_config', side_effect=slow_refresh) as refresh:
+        registry._config_checked = 0.0
+        assert registry.get_bot('') is old_bot
+        assert started.wait(5)
+        # Still rebuilding: requests keep the current bot and no second rebuild starts
+        registry._config_checked = 0.0
+        assert registry.get_bot('') is old_bot
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'bot-config-refresh':
+                thread.join(5)
+    assert refresh.call_count == 1
+    assert registry.get_bot('').config_version is not None
+    _cleanup()
+
+
+def test_invalid_configuration_is_rejected():
+    _cleanup()
+    with pytest.raises(ValidationError):
+        publish_config({'intent_patterns': {'chess_club': 'chess'}})
+    assert not BotConfig.objects.exists()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(CHESS_CONFIG, f)
+    try:
+        call_command('publish_bot_config', f.name, comment="from file", stdout=open(os.devnull, 'w'))
+    finally:
+        os.remove(f.name)
+    assert BotConfig.objects.get().smart_responses == CHESS_CONFIG['smart_responses']
+    _cleanup()
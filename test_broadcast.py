@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for broadcast recipient claiming, checkpoints and resuming an interrupted run
+"""
+
+import os
+import sys
+
+import django
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot.broadcast import claim_recipients, run_broadcast
+from whatsapp_bot.models import Broadcast, BroadcastRecipient, MessageLog, UserSession
+
+TENANT = "broadcast-test"
+PHONES = [f"+12345000{30 + i:02d}" for i in range(7)]
+
+
+class RecordingBot:
+    """Records sends; raises on ``crash_on`` as if the process died mid-page"""
+
+    def __init__(self, crash_on=None):
+        self.sent = []
+        self.crash_on = crash_on
+
+    def post_message(self, phone_number, message):
+        if phone_number == self.crash_on:
+            raise RuntimeError("process died")
+        self.sent.append(phone_number)
+        return f"wamid.{phone_number}", None
+
+
+def _cleanup():
+    Broadcast.objects.filter(phone_number_id=TENANT).delete()
+    UserSession.objects.filter(phone_number_id=TENANT).delete()
+    MessageLog.objects.filter(phone_number_id=TENANT).delete()
+
+
+def _broadcast():
+    for phone_number in PHONES:
+        UserSession.objects.create(phone_number_id=TENANT, phone_number=phone_number)
+    return Broadcast.objects.create(name="Term starts", message="Classes resume on Monday", phone_number_id=TENANT)
+
+
+def test_claim_returns_only_recipients_this_call_inserted():
+    _cleanup()
+    broadcast = _broadcast()
+    assert claim_recipients(broadcast, PHONES[:3]) == PHONES[:3]
+    # A second (e.g. concurrent) run over an overlapping page gets only the unclaimed ones
+    assert claim_recipients(broadcast, PHONES[1:5]) == PHONES[3:5]
+    assert claim_recipients(broadcast, PHONES[:5]) == []
+    assert BroadcastRecipient.objects.filter(broadcast=broadcast).count() == 5
+    _cleanup()
+
+
+def test_interrupted_broadcast_resumes_from_its_checkpoint_without_resending():
+    _cleanup()
+    broadcast = _broadcast()
+    first_page_end = UserSession.objects.get(phone_number_id=TENANT, phone_number=PHONES[2]).pk
+
+    # Dies on the second page after claiming it, with the rest of that page already sent
+    bot = RecordingBot(crash_on=PHONES[4])
+    with pytest.raises(RuntimeError):
+        run_broadcast(broadcast, bot, rate=1000, concurrency=1, page_size=3)
+    broadcast.refresh_from_db()
+    assert bot.sent == PHONES[:4] + [PHONES[5]]
+    assert (broadcast.status, broadcast.last_session_id, broadcast.sent_count) == ('running', first_page_end, 3)
+
+    resumed = RecordingBot()
+    report = run_broadcast(Broadcast.objects.get(pk=broadcast.pk), resumed, rate=1000, concurrency=1, page_size=3)
+    # The interrupted page's recipients stay claimed and are skipped, so nobody is messaged twice
+    assert resumed.sent == [PHONES[6]]
+    assert (report.sent, report.skipped) == (1, 3)
+
+    broadcast.refresh_from_db()
+    assert broadcast.status == 'completed'
+    assert broadcast.sent_count == 4
+    statuses = dict(BroadcastRecipient.objects.filter(broadcast=broadcast).values_list('phone_number', 'status'))
+    assert statuses == {**dict.fromkeys(PHONES[:3] + PHONES[6:], 'sent'), **dict.fromkeys(PHONES[3:6], 'claimed')}
+    assert MessageLog.objects.filter(phone_number_id=TENANT, message_type='outgoing').count() == 4
+    _cleanup()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for merging bursts of messages from the same user into one turn
+"""
+
+import os
+import sys
+import time
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot import views
+from whatsapp_bot.coalescing import MessageCoalescer, coalesce_batch
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage, MediaRef
+
+TEST_PHONE = "+1234500049"
+
+
+def _text(body, phone_number=TEST_PHONE, index=0):
+    return InboundMessage(f"wamid.burst{index}", phone_number, "1724486400", "text", body)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_batch_merges_consecutive_texts_per_sender():
+    image = InboundMessage("wamid.image", TEST_PHONE, "1724486400", "image", "", MediaRef("media-1", "image/jpeg", "", ""))
+    merged = coalesce_batch([_text("hi", index=1), _text("I need", index=2), _text("hello", "+1"), image,
+                             _text("a tutor", index=3)])
+    assert [(message.message_id, message.body) for message in merged] == [
+        ("wamid.burst2", "hi I need"), ("wamid.burst0", "hello"), ("wamid.image", ""), ("wamid.burst3", "a tutor")]
+
+
+def test_menu_choices_are_never_merged():
+    merged = coalesce_batch([_text("hi", index=1), _text("2", index=2), _text("Back", index=3),
+                             _text("parent", index=4), _text("I need", index=5), _text("a tutor", index=6)])
+    assert [message.body for message in merged] == ["hi", "2", "Back", "parent", "I need a tutor"]
+
+    handled = []
+    coalescer = MessageCoalescer(window=5, handler=lambda phone_number_id, message: handled.append(message.body))
+    assert coalescer.offer('', _text("hi")) is True
+    assert coalescer.offer('', _text("I need")) is False
+    # The choice flushes the held text first, then is handled as its own turn
+    assert coalescer.offer('', _text("2")) is True
+    assert handled == ["I need"] and coalescer.pending() == 0
+    assert coalescer.offer('', _text("menu")) is True
+    assert handled == ["I need"]
+
+
+def test_first_message_is_immediate_and_followers_are_merged():
+    handled = []
+    coalescer = MessageCoalescer(window=0.5, handler=lambda phone_number_id, message: handled.append(message.body),
+                                 max_messages=3)
+    assert coalescer.offer('', _text("hi")) is True
+    assert coalescer.offer('', _text("I need")) is False
+    assert coalescer.offer('', _text("a tutor")) is False
+    assert coalescer.offer('', _text("hello", "+1")) is True
+    assert handled == [] and coalescer.pending() == 2
+    assert _wait_for(lambda: handled == ["I need a tutor"])
+
+    # A full burst goes without waiting, and after a quiet window messages are immediate again
+    for body in ("one", "two"):
+        assert coalescer.offer('', _text(body)) is False
+    assert coalescer.offer('', _text("three")) is False
+    assert handled == ["I need a tutor", "one two three"]
+    time.sleep(0.6)
+    assert coalescer.offer('', _text("later")) is True
+
+
+def test_burst_gets_one_reply_for_the_merged_text():
+    _cleanup()
+    # Wide enough that a slow first turn still leaves the follow-ups inside the window
+    coalescer = MessageCoalescer(window=2, handler=views.dispatch_message)
+    with mock.patch.object(views, "message_coalescer", coalescer), \
+            mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        for index, body in enumerate(["hi", "I need", "home tutoring for my child"]):
+            views.process_message(ChangeValue(phone_number_id="", messages=(_text(body, index=index),), statuses=()))
+        assert send.call_count == 1
+        assert _wait_for(lambda: send.call_count == 2)
+    assert send.call_args.args[1].intent == "tutoring_inquiry"
+    incoming = MessageLog.objects.filter(phone_number=TEST_PHONE, message_type='incoming').order_by('id')
+    # The merged turn's logs are committed just after its reply is sent; each message keeps its own row
+    assert _wait_for(lambda: list(incoming.values_list('message_content', 'wa_message_id')) == [
+        ("hi", "wamid.burst0"), ("I need", "wamid.burst1"), ("home tutoring for my child", "wamid.burst2")])
+    _cleanup()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for read-replica routing: which connection each query runs on
+"""
+
+import os
+import sys
+from io import StringIO
+from unittest import mock
+
+import django
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from whatsapp_bot import views
+from whatsapp_bot.db_router import replica_configured, use_replica
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import InboundMessage
+
+TEST_PHONE = "+1234500044"
+
+pytestmark = pytest.mark.skipif(not replica_configured(), reason="No replica database configured")
+
+
+class Queries:
+    """Captures the SQL run on the primary and on the replica"""
+
+    def __enter__(self):
+        self._contexts = [CaptureQueriesContext(connections[alias]) for alias in ('default', 'replica')]
+        for context in self._contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for context in self._contexts:
+            context.__exit__(*exc_info)
+
+    def on(self, alias, table):
+        context = self._contexts[0 if alias == 'default' else 1]
+        return [query['sql'] for query in context.captured_queries if table in query['sql']]
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_webhook_stays_on_the_primary():
+    _cleanup()
+    message = InboundMessage("wamid.replica", TEST_PHONE, "1724486400", "text", "hello")
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out"), Queries() as queries:
+        views.handle_message("", message)
+    assert queries.on('default', 'user_sessions') and queries.on('default', 'message_logs')
+    assert not queries.on('replica', '')
+    _cleanup()
+
+
+def test_replica_block_reads_its_own_writes():
+    _cleanup()
+    UserSession.objects.create(phone_number=TEST_PHONE)
+    with use_replica(), Queries() as queries:
+        assert UserSession.objects.filter(phone_number=TEST_PHONE).exists()
+        assert len(queries.on('replica', 'user_sessions')) == 1
+
+        UserSession.objects.filter(phone_number=TEST_PHONE).update(current_state='tutoring')
+        assert UserSession.objects.get(phone_number=TEST_PHONE).current_state == 'tutoring'
+        assert len(queries.on('replica', 'user_sessions')) == 1
+        assert len(queries.on('default', 'user_sessions')) == 2
+    _cleanup()
+
+
+def test_admin_lists_and_analytics_read_from_the_replica():
+    _cleanup()
+    session = UserSession.objects.create(phone_number=TEST_PHONE)
+    MessageLog.objects.create(phone_number=TEST_PHONE, message_type='incoming', message_content="hello")
+    admin_user, _ = User.objects.get_or_create(
+        username='replica-test-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(admin_user)
+    try:
+        with Queries() as queries:
+            assert client.get('/admin/whatsapp_bot/messagelog/').status_code == 200
+            call_command('replay_conversations', phone=[TEST_PHONE], stdout=StringIO())
+        assert len(queries.on('replica', 'message_logs')) >= 2
+        assert not queries.on('default', 'message_logs')
+
+        # After deleting a session the admin's list views use the primary, so the change shows at once
+        response = client.post(f'/admin/whatsapp_bot/usersession/{session.pk}/delete/', {'post': 'yes'})
+        assert response.status_code == 302
+        with Queries() as queries:
+            response = client.get('/admin/whatsapp_bot/usersession/', {'q': TEST_PHONE})
+        assert b"0 results" in response.content
+        assert queries.on('default', 'user_sessions') and not queries.on('replica', 'user_sessions')
+    finally:
+        admin_user.delete()
+        _cleanup()
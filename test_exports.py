@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming message log export endpoint and command
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+
+from whatsapp_bot.exports import export_queryset, iter_messages
+from whatsapp_bot.models import MessageLog, ResponseTemplate
+
+TEST_PHONE = "+1234500046"
+TEST_KEY = "test.export"
+START = datetime(2001, 2, 1, 9, tzinfo=dt_timezone.utc)
+
+
+def _cleanup():
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    ResponseTemplate.objects.filter(key=TEST_KEY).delete()
+
+
+def _create_messages():
+    template = ResponseTemplate.objects.create(key=TEST_KEY, version=1, text="Welcome, \"parent\"")
+    messages = []
+    for index in range(7):
+        # Pairs share a timestamp, so pages must break ties on id
+        messages.append(MessageLog.objects.create(
+            phone_number=TEST_PHONE, message_type='incoming' if index % 2 == 0 else 'outgoing',
+            message_content=f"message {index}, ọmọ" if index != 3 else '',
+            template=template if index == 3 else None,
+            timestamp=START + timedelta(minutes=index // 2),
+        ))
+    return messages
+
+
+def test_keyset_pages_cover_every_row_once():
+    _cleanup()
+    messages = _create_messages()
+    rows = list(iter_messages(export_queryset(phone_numbers=[TEST_PHONE]), page_size=2))
+    assert [row['id'] for row in rows] == [message.pk for message in messages]
+    assert rows[3]['text'] == "Welcome, \"parent\""
+
+    outgoing = list(iter_messages(export_queryset(
+        since=START + timedelta(minutes=1), phone_numbers=[TEST_PHONE], direction='outgoing'), page_size=1))
+    assert [row['id'] for row in outgoing] == [messages[3].pk, messages[5].pk]
+    _cleanup()
+
+
+def test_endpoint_streams_gzipped_csv():
+    _cleanup()
+    messages = _create_messages()
+    assert Client().get('/webhook/export/messages/').status_code == 302
+
+    admin_user, _ = User.objects.get_or_create(
+        username='export-test-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(admin_user)
+    try:
+        response = client.get('/webhook/export/messages/', {'format': 'csv', 'phone': TEST_PHONE, 'since': '2001-02-01',
+                                                             'until': '2001-02-02'}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == 200 and response.streaming
+        assert response['Content-Encoding'] == 'gzip'
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert [int(row['id']) for row in rows] == [message.pk for message in messages]
+        assert rows[3]['text'] == "Welcome, \"parent\"" and rows[0]['text'] == "message 0, ọmọ"
+
+        response = client.get('/webhook/export/messages/', {'since': 'yesterday'})
+        assert response.status_code == 400
+    finally:
+        admin_user.delete()
+        _cleanup()
+
+
+def test_command_writes_gzipped_ndjson():
+    _cleanup()
+    messages = _create_messages()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'messages.ndjson.gz')
+        call_command('export_messages', phone=[TEST_PHONE], direction='incoming', output=path, page_size=3,
+                     stderr=io.StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as exported:
+            rows = [json.loads(line) for line in exported]
+    assert [row['id'] for row in rows] == [message.pk for message in messages[::2]]
+    assert rows[0]['timestamp'] == START.isoformat()
+    _cleanup()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-sender inbound flood limiter
+"""
+
+import os
+import sys
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from whatsapp_bot import views
+from whatsapp_bot.flood import ALLOW, DROP, NOTIFY, CacheFloodLimiter, MemoryFloodLimiter
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage
+
+TEST_PHONE = "+1234500048"
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_token_bucket_notifies_once_then_drops():
+    limiter = MemoryFloodLimiter(rate=1, burst=3, max_senders=2)
+    with mock.patch("whatsapp_bot.flood.time.monotonic", return_value=100.0) as clock:
+        assert [limiter.check('', TEST_PHONE) for _ in range(6)] == [ALLOW] * 3 + [NOTIFY, DROP, DROP]
+        clock.return_value = 101.5
+        assert [limiter.check('', TEST_PHONE) for _ in range(3)] == [ALLOW, NOTIFY, DROP]
+        # Other senders and other tenants have their own buckets, and state stays bounded
+        assert limiter.check('other-tenant', TEST_PHONE) == ALLOW
+        assert limiter.check('', "+1") == ALLOW
+        assert len(limiter._buckets) == 2
+    assert limiter.metrics.snapshot() == {'allowed': 6, 'throttled': 2, 'dropped': 3}
+
+
+def test_shared_cache_limits_across_instances():
+    caches['default'].clear()
+    first, second = (CacheFloodLimiter(rate=0.1, burst=3, cache_alias='default') for _ in range(2))
+    with mock.patch("whatsapp_bot.flood.time.time", return_value=3000.0):
+        decisions = [limiter.check('', TEST_PHONE) for limiter in (first, second, first, second, first, second)]
+    assert decisions == [ALLOW, ALLOW, ALLOW, NOTIFY, DROP, DROP]
+    # Half a window later the previous window still counts for half
+    with mock.patch("whatsapp_bot.flood.time.time", return_value=3045.0):
+        assert first.check('', TEST_PHONE) == NOTIFY
+    with mock.patch("whatsapp_bot.flood.time.time", return_value=3065.0):
+        assert first.check('', TEST_PHONE) == ALLOW
+    caches['default'].clear()
+
+
+def test_flooding_sender_is_dropped_before_any_database_work():
+    _cleanup()
+    burst = [InboundMessage(f"wamid.flood{index}", TEST_PHONE, "1724486400", "text", "menu") for index in range(5)]
+    with mock.patch.object(views, "flood_limiter", MemoryFloodLimiter(rate=0.001, burst=2)), \
+            mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        views.process_message(ChangeValue(phone_number_id="", messages=tuple(burst), statuses=()))
+        assert [call.args[1].intent for call in send.call_args_list] == ['main_menu', 'main_menu', 'throttled']
+        assert MessageLog.objects.filter(phone_number=TEST_PHONE, message_type='incoming').count() == 2
+        assert MessageLog.objects.get(phone_number=TEST_PHONE, template__key='menu.throttled')
+
+        send.reset_mock()
+        with CaptureQueriesContext(connection) as queries:
+            views.process_message(ChangeValue(phone_number_id="", messages=tuple(burst[:3]), statuses=()))
+        assert not queries.captured_queries and not send.called
+    _cleanup()
+
+
+def test_throttle_notice_that_fails_to_send_is_logged_as_failed():
+    _cleanup()
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", side_effect=ConnectionError("timed out")):
+        views.send_throttle_notice("", TEST_PHONE)
+    notice = MessageLog.objects.get(phone_number=TEST_PHONE, template__key='menu.throttled')
+    assert (notice.message_type, notice.wa_message_id, notice.delivery_status) == ('outgoing', None, 'failed')
+    _cleanup()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the timing wheel and the scheduled follow-up engine
+"""
+
+import math
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from whatsapp_bot import views
+from whatsapp_bot.follow_ups import FollowUpScheduler, dispatch_follow_ups
+from whatsapp_bot.models import FollowUp, MessageLog, UserSession
+from whatsapp_bot.payloads import InboundMessage
+from whatsapp_bot.timing_wheel import TimingWheel
+
+TEST_PHONE = "+1234500050"
+
+
+def _cleanup():
+    FollowUp.objects.filter(phone_number__startswith=TEST_PHONE).delete()
+    UserSession.objects.filter(phone_number__startswith=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number__startswith=TEST_PHONE).delete()
+
+
+def test_timing_wheel_fires_each_timer_once_at_its_tick():
+    # Small wheels (16 ticks per two levels) so timers cascade and overflow
+    wheel = TimingWheel(tick=1.0, wheel_size=4, levels=2, now=3.0)
+    generator = random.Random(50)
+    deadlines = {key: 3 + generator.uniform(0, 60) for key in range(300)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline, value=key * 2)
+    cancelled = set(generator.sample(sorted(deadlines), 100))
+    for key in cancelled:
+        assert wheel.cancel(key)
+    assert not wheel.cancel(next(iter(cancelled))) and len(wheel) == 200
+
+    fired = {}
+    for now in range(4, 70):
+        for key, value in wheel.advance(now + 0.5):
+            assert value == key * 2 and key not in fired
+            fired[key] = now
+    assert fired == {key: max(4, math.ceil(deadline)) for key, deadline in deadlines.items() if key not in cancelled}
+    assert len(wheel) == 0
+
+
+def test_quiet_user_is_nudged_and_replying_cancels():
+    _cleanup()
+    scheduler = FollowUpScheduler(delays=[60, 120], batch_size=1)
+    enquiry = InboundMessage("wamid.role", TEST_PHONE, "1724486400", "text", "2")
+    with mock.patch.object(views, "follow_up_scheduler", scheduler), mock.patch.object(scheduler, "_start"), \
+            mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        views.handle_message("", enquiry)
+        assert send.call_args.args[1].intent == "role_selection"
+        assert scheduler.pending() == 2
+        assert list(FollowUp.objects.filter(phone_number=TEST_PHONE).order_by('step').values_list('step', 'status')) == [
+            (1, 'pending'), (2, 'pending')]
+
+        # Nothing is due yet; a minute later the first nudge goes out
+        assert not scheduler.run_once(time.time() + 30)
+        FollowUp.objects.filter(phone_number=TEST_PHONE, step=1).update(due_at=timezone.now())
+        assert scheduler.run_once(time.time() + 61) == {'sent': 1}
+        assert send.call_args.args[1].intent == "follow_up"
+        first = FollowUp.objects.get(phone_number=TEST_PHONE, step=1)
+        assert (first.status, first.wa_message_id) == ('sent', 'wamid.out')
+        assert MessageLog.objects.filter(phone_number=TEST_PHONE, template__key='menu.follow_up').count() == 1
+
+        # Writing again cancels the second nudge
+        views.handle_message("", enquiry._replace(message_id="wamid.reply", body="thanks"))
+        assert scheduler.pending() == 0
+        assert FollowUp.objects.get(phone_number=TEST_PHONE, step=2).status == 'cancelled'
+        assert not scheduler.run_once(time.time() + 121)
+    _cleanup()
+
+
+def test_overdue_follow_ups_are_sent_in_batches_unless_answered():
+    _cleanup()
+    scheduled_at = timezone.now() - timedelta(hours=2)
+    quiet, answered = (f"{TEST_PHONE}1", f"{TEST_PHONE}2")
+    FollowUp.objects.bulk_create([
+        FollowUp(phone_number=phone_number, step=step, due_at=scheduled_at + timedelta(hours=1), created_at=scheduled_at)
+        for phone_number in (quiet, answered) for step in (1, 2)
+    ])
+    # The reply reached a process that held no timers for this user
+    MessageLog.objects.create(phone_number=answered, message_type='incoming', message_content="done",
+                              timestamp=scheduled_at + timedelta(minutes=5))
+    output = StringIO()
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value=None) as send:
+        call_command('send_follow_ups', batch_size=3, stdout=output)
+    assert send.call_count == 2 and {call.args[0] for call in send.call_args_list} == {quiet}
+    assert "Processed 4 follow-up(s): 0 sent, 2 failed, 2 cancelled" in output.getvalue()
+    assert set(FollowUp.objects.filter(phone_number=answered).values_list('status', flat=True)) == {'cancelled'}
+    _cleanup()
+
+
+def test_sweep_retries_stalled_sends_and_expires_late_follow_ups():
+    _cleanup()
+    now = timezone.now()
+    stalled, in_flight, late, due = (f"{TEST_PHONE}{index}" for index in range(1, 5))
+    FollowUp.objects.bulk_create([
+        # Claimed by a dispatcher that died before sending
+        FollowUp(phone_number=stalled, due_at=now - timedelta(minutes=30), status='sending',
+                 claimed_at=now - timedelta(minutes=20), created_at=now - timedelta(hours=1)),
+        # Claimed by a dispatcher that is still sending
+        FollowUp(phone_number=in_flight, due_at=now - timedelta(minutes=1), status='sending',
+                 claimed_at=now, created_at=now - timedelta(hours=1)),
+        # Overdue by more than the grace period, e.g. after an outage
+        FollowUp(phone_number=late, due_at=now - timedelta(hours=7), created_at=now - timedelta(hours=8)),
+        FollowUp(phone_number=due, due_at=now - timedelta(minutes=1), created_at=now - timedelta(hours=1)),
+    ])
+    scheduler = FollowUpScheduler(delays=[60])
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        assert scheduler.sweep() == {'recovered': 1, 'expired': 1, 'sent': 2}
+        # The wheel path never sends a late follow-up either
+        late_id = FollowUp.objects.get(phone_number=late).pk
+        FollowUp.objects.filter(pk=late_id).update(status='pending')
+        assert not scheduler.run_once() and not dispatch_follow_ups([late_id])
+    assert sorted(call.args[0] for call in send.call_args_list) == [stalled, due]
+    assert dict(FollowUp.objects.filter(phone_number__startswith=TEST_PHONE).values_list('phone_number', 'status')) == {
+        stalled: 'sent', in_flight: 'sending', late: 'pending', due: 'sent'}
+
+    output = StringIO()
+    call_command('send_follow_ups', stdout=output)
+    assert "0 sent, 0 failed, 0 cancelled; 1 expired, 0 retried" in output.getvalue()
+    assert FollowUp.objects.get(phone_number=late).status == 'expired'
+    _cleanup()
+
+
+def test_scheduler_thread_starts_on_first_use():
+    for delays, started in (([60], True), ([], False)):
+        scheduler = FollowUpScheduler(delays=delays)
+        with mock.patch.object(scheduler, "_start") as start:
+            scheduler.cancel('', TEST_PHONE)
+        assert start.called is started
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the human-agent handoff inbox and its event stream
+"""
+
+import os
+import sys
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from whatsapp_bot import views
+from whatsapp_bot.flood import MemoryFloodLimiter
+from whatsapp_bot.handoffs import HandoffFeed, encode_event
+from whatsapp_bot.models import Handoff, MessageLog, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage
+
+TEST_PHONE = "+1234500039"
+
+
+def _cleanup():
+    Handoff.objects.filter(phone_number=TEST_PHONE).delete()
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    User.objects.filter(username='handoff-test-agent').delete()
+
+
+def _send(body):
+    change = ChangeValue(
+        phone_number_id="",
+        messages=(InboundMessage("wamid.in", TEST_PHONE, "1724486400", "text", body),),
+        statuses=(),
+    )
+    # Flood limiting off, so these conversations do not use up the sender's budget in later tests
+    with mock.patch.object(views, "flood_limiter", MemoryFloodLimiter(rate=0, burst=0)), \
+            mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send_message:
+        views.process_message(change)
+    return send_message
+
+
+def test_handoff_lifecycle():
+    _cleanup()
+    feed = HandoffFeed()
+    feed.snapshot()
+    assert _send("14").called
+    handoff = Handoff.objects.get(phone_number=TEST_PHONE)
+    assert (handoff.status, handoff.reason) == ("open", "human_agent")
+    assert UserSession.objects.get(phone_number=TEST_PHONE).awaiting_agent
+    assert [(event_type, data['id']) for event_type, data in feed.poll()] == [("handoff", handoff.pk)]
+
+    # While waiting the bot stays quiet and the agents get the message
+    assert not _send("my son needs help with maths").called
+    handoff.refresh_from_db()
+    assert handoff.last_message == "my son needs help with maths"
+    assert [(event_type, data['direction'], data['text']) for event_type, data in feed.poll()] == [
+        ("message", "incoming", "my son needs help with maths")]
+
+    agent = User.objects.create(username='handoff-test-agent', is_staff=True)
+    client = Client()
+    client.force_login(agent)
+
+    queue = client.get('/webhook/handoffs/').json()['handoffs']
+    assert handoff.pk in [item['id'] for item in queue]
+
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.agent") as send_message:
+        response = client.post(f'/webhook/handoffs/{handoff.pk}/reply/', {'text': "Hello, I'm Ada. How can I help?"})
+    assert response.json() == {'sent': True, 'wa_message_id': "wamid.agent"}
+    send_message.assert_called_once_with(TEST_PHONE, "Hello, I'm Ada. How can I help?")
+    handoff.refresh_from_db()
+    assert (handoff.status, handoff.agent_id) == ("claimed", agent.pk)
+    assert MessageLog.objects.filter(phone_number=TEST_PHONE, wa_message_id="wamid.agent").exists()
+    claimed, reply = feed.poll()
+    assert (claimed[0], claimed[1]['agent']) == ("claimed", 'handoff-test-agent')
+    assert reply == ("message", {
+        'handoff': handoff.pk, 'phone_number': TEST_PHONE, 'direction': 'outgoing', 'agent': 'handoff-test-agent',
+        'text': "Hello, I'm Ada. How can I help?", 'sent': True, 'timestamp': reply[1]['timestamp']})
+
+    assert client.post(f'/webhook/handoffs/{handoff.pk}/close/').json()['status'] == "closed"
+    assert not UserSession.objects.get(phone_number=TEST_PHONE).awaiting_agent
+    assert [(event_type, data['id']) for event_type, data in feed.poll()] == [("closed", handoff.pk)]
+
+    # Back with the bot
+    assert _send("7").called
+    _cleanup()
+
+
+def test_agent_endpoints_need_staff():
+    client = Client()
+    assert client.get('/webhook/handoffs/').status_code == 302
+    assert client.get('/webhook/handoffs/stream/').status_code == 403
+
+
+@override_settings(WHATSAPP_HANDOFF_POLL_SECONDS=0.01, WHATSAPP_HANDOFF_STREAM_SECONDS=0.5)
+def test_stream_sees_handoffs_from_other_processes_and_ends():
+    _cleanup()
+    client = Client()
+    client.force_login(User.objects.create(username='handoff-test-agent', is_staff=True))
+    response = client.get('/webhook/handoffs/stream/')
+    assert response['Content-Type'] == 'text/event-stream'
+    stream = iter(response.streaming_content)
+    assert next(stream) == b"retry: 10\n\n"
+    assert next(stream).startswith(b"event: snapshot\n")
+
+    # Opened by another process: nothing is published in memory, the stream reads it from the database
+    handoff = Handoff.objects.create(phone_number=TEST_PHONE, reason="human_agent", last_message="help")
+    rest = b"".join(stream)
+    assert rest.startswith(f'event: handoff\ndata: {{"id": {handoff.pk}, '.encode())
+    assert encode_event('message', {'n': 1}) == 'event: message\ndata: {"n": 1}\n\n'
+    _cleanup()
+
+
+def test_navigating_away_closes_the_handoff():
+    _cleanup()
+    assert _send("14").called
+    handoff = Handoff.objects.get(phone_number=TEST_PHONE)
+
+    feed = HandoffFeed()
+    feed.snapshot()
+    assert _send("menu").called
+    handoff.refresh_from_db()
+    assert handoff.status == "closed" and handoff.closed_at is not None
+    assert [(event_type, data['id']) for event_type, data in feed.poll()] == [("closed", handoff.pk)]
+    assert not UserSession.objects.get(phone_number=TEST_PHONE).awaiting_agent
+
+    # Asking for an agent again opens a new handoff rather than reusing the stale one
+    assert _send("14").called
+    reopened = Handoff.objects.get(phone_number=TEST_PHONE, status="open")
+    assert reopened.pk != handoff.pk
+    _cleanup()
+
+
+def test_unclaimed_handoffs_time_out():
+    _cleanup()
+    assert _send("14").called
+    waited_too_long = timezone.now() - timedelta(hours=5)
+    Handoff.objects.filter(phone_number=TEST_PHONE).update(created_at=waited_too_long)
+
+    # The message that finds the handoff timed out frees the user; the next one is answered
+    assert not _send("is anyone there?").called
+    assert Handoff.objects.get(phone_number=TEST_PHONE).status == "closed"
+    assert not UserSession.objects.get(phone_number=TEST_PHONE).awaiting_agent
+    assert _send("7").called
+
+    # Users who stop writing are released by the command
+    assert _send("14").called
+    Handoff.objects.filter(phone_number=TEST_PHONE, status="open").update(created_at=waited_too_long)
+    output = StringIO()
+    call_command('expire_handoffs', stdout=output)
+    assert "Closed 1 unclaimed handoff(s)" in output.getvalue()
+    assert not Handoff.objects.filter(phone_number=TEST_PHONE, status__in=["open", "claimed"]).exists()
+    assert not UserSession.objects.get(phone_number=TEST_PHONE).awaiting_agent
+    _cleanup()
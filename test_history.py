@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the keyset-paginated conversation history API
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from whatsapp_bot.models import MessageLog, UserSession
+
+TEST_PHONE = "+1234500047"
+START = datetime(2001, 3, 1, 9, tzinfo=dt_timezone.utc)
+
+
+def _cleanup():
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_history_pages_with_session_state():
+    _cleanup()
+    UserSession.objects.create(phone_number=TEST_PHONE, current_state='help_submenu', user_role='parent')
+    messages = [
+        MessageLog.objects.create(phone_number=TEST_PHONE, message_type='incoming' if index % 2 == 0 else 'outgoing',
+                                  message_content=f"message {index}", timestamp=START + timedelta(minutes=index // 2))
+        for index in range(5)
+    ]
+    MessageLog.objects.create(phone_number=f"{TEST_PHONE}9", message_content="someone else", timestamp=START)
+    admin_user, _ = User.objects.get_or_create(
+        username='history-test-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(admin_user)
+    url = f'/webhook/history/{TEST_PHONE}/'
+    try:
+        assert Client().get(url).status_code == 302
+
+        pages, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get(url, {'limit': 2, **({'cursor': cursor} if cursor else {})}).json()
+            pages.append([message['id'] for message in page['messages']])
+            [session] = page['sessions']
+            assert (session['current_state'], session['user_role'], session['expired']) == ('help_submenu', 'parent', False)
+            history_queries = [query['sql'] for query in queries.captured_queries if 'message_logs' in query['sql']]
+            assert len(history_queries) == 1 and 'OFFSET' not in history_queries[0]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        assert pages == [[messages[0].pk, messages[1].pk], [messages[2].pk, messages[3].pk], [messages[4].pk]]
+        assert client.get(url, {'cursor': 'not-a-cursor'}).status_code == 400
+    finally:
+        admin_user.delete()
+        _cleanup()
+        MessageLog.objects.filter(phone_number=f"{TEST_PHONE}9").delete()
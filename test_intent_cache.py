@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the memoised intent scores in SmartIntentRecognizer
+"""
+
+import os
+import sys
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot.bot_logic import SmartIntentRecognizer
+
+
+def test_cached_results_match_uncached():
+    cached = SmartIntentRecognizer(cache_size=16)
+    uncached = SmartIntentRecognizer(cache_size=0)
+    for message in ["hi", "Hi!", "  HI  ", "I need a tutor", "how much?", "how much", "where", "random words"]:
+        for recent in [(), ("tutoring_inquiry",)]:
+            assert cached.detect_intent(message, recent) == uncached.detect_intent(message, recent)
+
+    stats = cached.cache_stats()
+    # "Hi!", "  HI  " and "how much" normalize to entries already cached; repeats with context hit too
+    assert stats['misses'] == 5
+    assert stats['hits'] == 11
+    assert stats['hit_rate'] == 11 / 16
+
+
+def test_cache_is_bounded():
+    recognizer = SmartIntentRecognizer(cache_size=2)
+    for message in ["hi", "tutor", "exam", "hi"]:
+        recognizer.detect_intent(message)
+    assert recognizer.cache_stats()['size'] == 2
+    assert recognizer.cache_stats()['hits'] == 0
+
+
+def test_pattern_changes_invalidate_cache():
+    recognizer = SmartIntentRecognizer(cache_size=16)
+    assert recognizer.detect_intent("wetin dey")[0] == 'unknown'
+
+    recognizer.intent_patterns['greeting'] = ['wetin dey']
+    assert recognizer.detect_intent("wetin dey")[0] == 'greeting'
+
+    recognizer.intent_patterns = {'pricing_inquiry': ['wetin dey']}
+    assert recognizer.detect_intent("wetin dey")[0] == 'pricing_inquiry'
+
+    recognizer.intent_priorities.update({'pricing_inquiry': 40})
+    assert recognizer.detect_intent("wetin dey")[1] == 1.0
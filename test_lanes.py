@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for priority lanes: classification, scheduling order and starvation protection
+"""
+
+import os
+import sys
+import threading
+import time
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot import views
+from whatsapp_bot.bot_logic import WhatsAppBot
+from whatsapp_bot.lanes import LOW, NORMAL, URGENT, LaneScheduler, UrgentConversations, lane_for, urgent_conversations
+from whatsapp_bot.models import Handoff, MessageLog, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage
+from whatsapp_bot.session_store import InMemorySessionStore
+
+TEST_PHONE = "+1234500038"
+
+
+def _message(body, type="text", phone_number=TEST_PHONE):
+    return InboundMessage("wamid.in", phone_number, "1724486400", type, body)
+
+
+def test_lane_classification():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    urgent = UrgentConversations(ttl=60)
+
+    assert lane_for(bot, _message("14"), urgent) == URGENT
+    assert lane_for(bot, _message("Human!"), urgent) == URGENT
+    assert lane_for(bot, _message("I have a complaint, the tutor is not working out"), urgent) == URGENT
+    assert lane_for(bot, _message("hello"), urgent) == NORMAL
+    assert lane_for(bot, _message("", type="sticker"), urgent) == LOW
+
+    urgent.mark(TEST_PHONE)
+    assert lane_for(bot, _message("hello"), urgent) == URGENT
+    assert lane_for(bot, _message("", type="sticker"), urgent) == URGENT
+
+
+def _run_blocked(scheduler, jobs):
+    """Queue ``jobs`` behind a blocking job and return the order they ran in"""
+    release = threading.Event()
+    order = []
+
+    scheduler.submit(NORMAL, release.wait)
+    for lane, name in jobs:
+        scheduler.submit(lane, order.append, name)
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while len(order) < len(jobs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return order
+
+
+def test_urgent_jobs_run_first():
+    scheduler = LaneScheduler(workers=1, starvation_after=120)
+    order = _run_blocked(scheduler, [(LOW, "sticker"), (NORMAL, "hi"), (URGENT, "complaint"), (NORMAL, "tutor")])
+    assert order == ["complaint", "hi", "tutor", "sticker"]
+
+    stats = scheduler.stats()
+    assert stats[URGENT]['processed'] == 1
+    assert stats[URGENT]['wait_p50_ms'] is not None
+    assert stats[NORMAL]['processed'] == 3
+
+
+def test_starved_jobs_are_promoted():
+    # Every job counts as starved at once, so the scheduler falls back to arrival order
+    scheduler = LaneScheduler(workers=1, starvation_after=0)
+    order = _run_blocked(scheduler, [(LOW, "sticker"), (NORMAL, "hi"), (URGENT, "complaint")])
+    assert order == ["sticker", "hi", "complaint"]
+    assert scheduler.stats()[LOW]['promoted'] == 1
+
+
+def test_batch_is_handled_urgent_first():
+    change = ChangeValue(
+        phone_number_id="",
+        messages=(_message("hello"), _message("I have a problem", phone_number="+1234500039")),
+        statuses=(),
+    )
+    with mock.patch.object(views, "handle_message") as handle_message:
+        views.process_message(change)
+    assert [call.args[1].body for call in handle_message.call_args_list] == ["I have a problem", "hello"]
+
+
+def test_a_senders_messages_keep_their_order_in_the_highest_lane():
+    phone_number = "+1234500036"
+    Handoff.objects.filter(phone_number=phone_number).delete()
+    UserSession.objects.filter(phone_number=phone_number).delete()
+    messages = (_message("2", phone_number=phone_number), _message("hello"), _message("human", phone_number=phone_number))
+    # The urgent "human" lifts its sender's earlier "2" with it, ahead of the other sender
+    assert views.sender_lanes("", messages) == [(URGENT, [messages[0], messages[2]]), (NORMAL, [messages[1]])]
+
+    change = ChangeValue(phone_number_id="", messages=(messages[0], messages[2]), statuses=())
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        views.process_message(change)
+    # "2" is answered as a role choice before the handoff, not swallowed as a message to the agent
+    assert [call.args[1].intent for call in send.call_args_list] == ["role_selection", "human_agent"]
+
+    Handoff.objects.filter(phone_number=phone_number).delete()
+    UserSession.objects.filter(phone_number=phone_number).delete()
+    MessageLog.objects.filter(phone_number=phone_number).delete()
+    urgent_conversations._marked.pop(phone_number, None)
+
+
+def test_jobs_for_one_sender_run_one_at_a_time_in_order():
+    scheduler = LaneScheduler(workers=4, starvation_after=120)
+    events, lock = [], threading.Lock()
+
+    def turn(sender, index):
+        with lock:
+            events.append((sender, 'start', index))
+        time.sleep(0.005)
+        with lock:
+            events.append((sender, 'end', index))
+
+    for index in range(10):
+        # A later urgent job for the same sender still waits for its earlier ones
+        scheduler.submit(URGENT if index == 5 else NORMAL, turn, 'a', index, key='a')
+        scheduler.submit(NORMAL, turn, 'b', index, key='b')
+
+    deadline = time.monotonic() + 5
+    while len(events) < 40 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for sender in 'ab':
+        steps = [(step, index) for name, step, index in events if name == sender]
+        assert steps == [(step, index) for index in range(10) for step in ('start', 'end')]
+    assert scheduler.queued() == {URGENT: 0, NORMAL: 0, LOW: 0} and not scheduler._backlogs
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for language identification and the per-language intent indexes
+"""
+
+import os
+import sys
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from bench_bot_logic import CORPUS
+from whatsapp_bot.bot_logic import SMART_RESPONSES, WhatsAppBot
+from whatsapp_bot.lanes import URGENT, UrgentConversations, lane_for
+from whatsapp_bot.languages import LANGUAGE_RESPONSES, language_identifier
+from whatsapp_bot.payloads import InboundMessage
+from whatsapp_bot.session_store import InMemorySessionStore
+from whatsapp_bot.tokenizer import tokenize
+
+MESSAGES = {
+    'pcm': ["abeg i wan get lesson teacher for my pikin", "how much una dey collect", "una dey where"],
+    'yo': ["e kaaro, mo fe oluko fun omo mi", "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi", "nibo ni e wa"],
+    'ig': ["kedu, achoro m onye nkuzi maka nwa m", "ego ole", "ebee ka unu no"],
+    'ha': ["sannu, ina son malami don dana", "nawa ne kudin", "akwai matsala"],
+}
+
+
+def test_identifies_languages():
+    for language, messages in MESSAGES.items():
+        for message in messages:
+            assert language_identifier.identify(message) == language, message
+    # English traffic, and anything too short to tell, stays English
+    english = [message for group in ('short_command', 'long_paragraph', 'emoji') for message in CORPUS[group]]
+    assert {language_identifier.identify(message) for message in english} == {'en'}
+    assert language_identifier.identify("ok") == 'en'
+
+
+def test_template_keys_name_the_text_that_was_sent():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    # A Pidgin message for an intent Pidgin has no text for is answered, and attributed, in English
+    reply = bot.process_message("+1234500421", "i wan help una")
+    assert reply == SMART_RESPONSES['volunteer_interest']['default']
+    assert reply.template == "smart.volunteer_interest.default"
+
+    # A role without its own text gets the language's default text, under that key
+    bot.process_message("+1234500422", "5")
+    reply = bot.process_message("+1234500422", "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi")
+    assert reply == LANGUAGE_RESPONSES['yo']['tutoring_inquiry']['default']
+    assert reply.template == "smart.tutoring_inquiry.default.yo"
+
+    # A role with English-only text keeps the English key
+    bot.process_message("+1234500423", "2")
+    reply = bot.process_message("+1234500423", "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi")
+    assert reply == SMART_RESPONSES['tutoring_inquiry']['2']
+    assert reply.template == "smart.tutoring_inquiry.2"
+
+
+def test_tone_marks_are_optional():
+    assert tokenize("Ọmọ mi fẹ́ ṣe ìdánwò, ɗana").plain == "omo mi fe se idanwo dana"
+    assert tokenize("tutor").plain == "tutor"
+
+
+def test_replies_in_the_users_language():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    for phone_number, (language, message) in enumerate([
+        ('yo', "Ẹ káàárọ̀, mo fẹ́ olùkọ́ fún ọmọ mi"),
+        ('ig', "kedu, achoro m onye nkuzi maka nwa m"),
+        ('ha', "sannu, ina son malami don dana"),
+        ('pcm', "abeg i wan get lesson teacher for my pikin"),
+    ]):
+        reply = bot.process_message(f"+12345000420{phone_number}", message)
+        assert reply.intent == "tutoring_inquiry"
+        assert reply == LANGUAGE_RESPONSES[language]['tutoring_inquiry']['default']
+        assert reply.template == f"smart.tutoring_inquiry.default.{language}"
+
+    reply = bot.process_message("+123450004299", "I need home tutoring for my child")
+    assert reply.template == "smart.tutoring_inquiry.default"
+
+
+def test_complaints_in_any_language_take_the_urgent_lane():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    message = InboundMessage("wamid.1", "+1234500042", "1724486400", "text", "abeg e no dey work, na wahala")
+    assert lane_for(bot, message, UrgentConversations(ttl=60)) == URGENT
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for media message decoding and streaming downloads, against a local stand-in for the Graph API
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+
+from whatsapp_bot import views
+from whatsapp_bot.media import download_media, media_downloader
+from whatsapp_bot.models import MediaDownload, MediaFile, MessageLog, UserSession
+from whatsapp_bot.payloads import decode_webhook
+
+TEST_PHONE = "+1234500043"
+REPORT_CARD = os.urandom(300 * 1024) + b"end of report card"
+REPORT_CARD_SHA256 = hashlib.sha256(REPORT_CARD).hexdigest()
+
+
+class GraphStandIn(BaseHTTPRequestHandler):
+    """Serves media ids as JSON and their content in small writes, counting file requests"""
+    files = {'media-1': REPORT_CARD, 'media-2': REPORT_CARD}
+    file_requests = []
+
+    def do_GET(self):
+        assert self.headers['Authorization'].startswith('Bearer ')
+        name = self.path.rsplit('/', 1)[-1]
+        if self.path.startswith('/v18.0/') and name in self.files:
+            body = json.dumps({
+                'id': name,
+                'url': f"http://127.0.0.1:{self.server.server_port}/files/{name}",
+                'mime_type': 'application/pdf',
+                'sha256': hashlib.sha256(self.files[name]).hexdigest(),
+                'file_size': len(self.files[name]),
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith('/files/') and name in self.files:
+            self.file_requests.append(name)
+            content = self.files[name]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            for start in range(0, len(content), 8192):
+                self.wfile.write(content[start:start + 8192])
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _media_webhook(media_id, sha256=''):
+    return json.dumps({"entry": [{"changes": [{"field": "messages", "value": {
+        "metadata": {"phone_number_id": ""},
+        "messages": [{
+            "from": TEST_PHONE, "id": f"wamid.{media_id}", "timestamp": "1724486400", "type": "document",
+            "document": {"id": media_id, "mime_type": "application/pdf", "sha256": sha256,
+                         "filename": "Report card.PDF", "caption": ""},
+        }],
+    }}]}]}).encode()
+
+
+def _cleanup():
+    downloads = MediaDownload.objects.filter(phone_number=TEST_PHONE)
+    files = list(MediaFile.objects.filter(downloads__in=downloads).distinct())
+    downloads.delete()
+    for media_file in files:
+        media_file.file.delete(save=False)
+        media_file.delete()
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_decodes_media_messages():
+    [change] = decode_webhook(_media_webhook("media-1", sha256="abc"))
+    [message] = change.messages
+    assert (message.type, message.body) == ("document", "")
+    assert message.media.media_id == "media-1" and message.media.filename == "Report card.PDF"
+
+
+def test_downloads_are_left_to_the_management_command_by_default():
+    # Serverless instances freeze after responding, so no download thread is started
+    _cleanup()
+    [change] = decode_webhook(_media_webhook("media-1"))
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out"):
+        views.process_message(change)
+    assert media_downloader.workers == 0 and media_downloader._executor is None
+    assert MediaDownload.objects.get(phone_number=TEST_PHONE).status == "pending"
+    _cleanup()
+
+
+def test_download_streams_hashes_and_deduplicates():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    GraphStandIn.file_requests = []
+    _cleanup()
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            WHATSAPP_GRAPH_API_URL=f"http://127.0.0.1:{server.server_port}/v18.0",
+            WHATSAPP_MEDIA_CHUNK_SIZE=16 * 1024,
+        ):
+            # The webhook only records the download and acknowledges the file
+            [change] = decode_webhook(_media_webhook("media-1"))
+            with mock.patch("whatsapp_bot.media.media_downloader.submit") as submit, \
+                    mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+                views.process_message(change)
+            first = MediaDownload.objects.get(phone_number=TEST_PHONE)
+            submit.assert_called_once_with(first.pk, expected_sha256="")
+            assert send.call_args.args[1].intent == "media_received"
+            assert MessageLog.objects.filter(phone_number=TEST_PHONE, message_content="[document]").exists()
+
+            # Memory stays bounded: the body is consumed in WHATSAPP_MEDIA_CHUNK_SIZE pieces
+            with mock.patch("requests.models.Response.iter_content", autospec=True,
+                            side_effect=lambda response, chunk_size: iter(
+                                lambda: response.raw.read(chunk_size), b"")) as iter_content:
+                first = download_media(first.pk)
+            assert iter_content.call_args.kwargs['chunk_size'] == 16 * 1024
+            assert (first.status, first.media_file.sha256, first.media_file.size) == (
+                "done", REPORT_CARD_SHA256, len(REPORT_CARD))
+            assert first.media_file.file.name.endswith(".pdf")
+            with default_storage.open(first.media_file.file.name) as stored:
+                assert stored.read() == REPORT_CARD
+
+            # The same file sent again is linked to the stored copy
+            second = MediaDownload.objects.create(
+                phone_number=TEST_PHONE, media_id="media-2", media_type="document", mime_type="application/pdf"
+            )
+            second = download_media(second.pk)
+            assert second.media_file_id == first.media_file_id
+            assert GraphStandIn.file_requests == ["media-1"]
+
+            # When the webhook already carries the hash, known content is not even resolved
+            known = MediaDownload.objects.create(phone_number=TEST_PHONE, media_id="gone", media_type="image")
+            sha256_b64 = base64.b64encode(bytes.fromhex(REPORT_CARD_SHA256)).decode()
+            assert download_media(known.pk, expected_sha256=sha256_b64).media_file_id == first.media_file_id
+
+            # Failures are recorded and retried by the management command
+            missing = MediaDownload.objects.create(phone_number=TEST_PHONE, media_id="missing", media_type="audio")
+            assert (download_media(missing.pk).status, MediaDownload.objects.get(pk=missing.pk).error) == (
+                "failed", "http_404")
+            GraphStandIn.files = {**GraphStandIn.files, 'missing': b"voice note"}
+            call_command('download_media', retry_failed=True, stdout=open(os.devnull, 'w'))
+            missing.refresh_from_db()
+            assert missing.status == "done" and missing.media_file.size == len(b"voice note")
+            _cleanup()
+    finally:
+        GraphStandIn.files = {'media-1': REPORT_CARD, 'media-2': REPORT_CARD}
+        server.shutdown()
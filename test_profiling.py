@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the slow-request profiler middleware and the slow_requests command
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from whatsapp_bot.models import UserSession
+from whatsapp_bot.profiling import SlowRequestProfilerMiddleware, TimedHttpCall, load_profiles
+
+
+def _slow_view(request):
+    UserSession.objects.filter(phone_number="+1234500040").exists()
+    with TimedHttpCall('POST', 'https://graph.facebook.com/v18.0/1/messages') as call:
+        time.sleep(0.08)
+        call.status = 200
+    return HttpResponse("OK")
+
+
+def _fast_view(request):
+    return HttpResponse("OK")
+
+
+def _middleware(directory, view, max_files=200):
+    with override_settings(
+        WHATSAPP_PROFILE_SLOW_MS=40,
+        WHATSAPP_PROFILE_DIR=directory,
+        WHATSAPP_PROFILE_MAX_FILES=max_files,
+        WHATSAPP_PROFILE_SAMPLE_RATE=1.0,
+    ):
+        return SlowRequestProfilerMiddleware(view)
+
+
+def test_slow_webhook_request_is_profiled():
+    with tempfile.TemporaryDirectory() as directory:
+        middleware = _middleware(directory, _slow_view)
+        response = middleware(RequestFactory().post('/webhook/', data='{}', content_type='application/json'))
+        assert response.status_code == 200
+
+        [(name, profile)] = load_profiles(directory)
+        assert name.endswith('ms.json') and profile['duration_ms'] >= 40
+        assert profile['query_count'] == 1 and 'user_sessions' in profile['queries'][0]['sql']
+        assert profile['http_calls'][0]['status'] == 200 and profile['http_calls'][0]['ms'] >= 80
+        # The sampler caught the request sleeping inside the outbound call
+        assert any('_slow_view' in stack for stack in profile['stack_samples'])
+        assert '_slow_view' in profile['cprofile']
+
+        out = io.StringIO()
+        call_command('slow_requests', dir=directory, stdout=out)
+        assert name in out.getvalue() and 'hottest frames' in out.getvalue()
+
+        out = io.StringIO()
+        call_command('slow_requests', dir=directory, show=name, stdout=out)
+        assert 'graph.facebook.com' in out.getvalue()
+
+
+def test_fast_and_other_requests_are_not_saved():
+    with tempfile.TemporaryDirectory() as directory:
+        _middleware(directory, _fast_view)(RequestFactory().post('/webhook/'))
+        _middleware(directory, _slow_view)(RequestFactory().get('/admin/'))
+        assert load_profiles(directory) == []
+        # Outside a profiled request the HTTP timer records nothing
+        with TimedHttpCall('POST', 'https://example.com') as call:
+            assert call.calls is None
+
+
+def test_profile_directory_rotates():
+    with tempfile.TemporaryDirectory() as directory:
+        middleware = _middleware(directory, _slow_view, max_files=2)
+        for _ in range(3):
+            middleware(RequestFactory().post('/webhook/'))
+        profiles = load_profiles(directory)
+        assert len(profiles) == 2
+        assert all(json.load(open(os.path.join(directory, name)))['status'] == 200 for name, _ in profiles)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for replaying logged conversations through the current bot logic
+"""
+
+import os
+import sys
+from io import StringIO
+from unittest import mock
+
+import django
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from whatsapp_bot import views
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import InboundMessage
+from whatsapp_bot.replay import iter_turns, replay_conversations
+
+TEST_PHONE = "+1234500028"
+CONVERSATION = ["hello", "1", "menu", "I need a maths tutor for my son"]
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def _record_conversation():
+    """Run the conversation through the webhook handler so its replies are logged as in production"""
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out"):
+        for turn, body in enumerate(CONVERSATION):
+            views.handle_message("", InboundMessage(f"wamid.replay-{turn}", TEST_PHONE, "1724486400", "text", body))
+
+
+def test_iter_turns_pairs_messages_with_their_replies():
+    rows = [("outgoing", "broadcast"), ("incoming", "hi"), ("outgoing", "a"), ("outgoing", "b"),
+            ("incoming", "1"), ("incoming", "2"), ("outgoing", "c")]
+    assert list(iter_turns(rows)) == [("hi", "a\nb"), ("1", None), ("2", "c")]
+
+
+def test_replaying_a_recorded_conversation_reproduces_its_replies():
+    _cleanup()
+    _record_conversation()
+    queryset = MessageLog.objects.filter(phone_number=TEST_PHONE)
+    assert queryset.filter(message_type='outgoing').count() == len(CONVERSATION)
+
+    result = replay_conversations(queryset)
+    assert (result.users, result.turns, result.unanswered, result.diff_count) == (1, len(CONVERSATION), 0, 0)
+
+    # A reply that differs from what the bot says now is reported with its turn
+    changed = queryset.filter(message_type='outgoing').order_by('timestamp', 'id')[1]
+    changed.message_content, changed.template = "An older reply", None
+    changed.save()
+    result = replay_conversations(queryset)
+    assert result.diff_count == 1
+    diff = result.diffs[0]
+    assert (diff.phone_number, diff.turn, diff.message, diff.actual) == (TEST_PHONE, 2, "1", "An older reply")
+    assert diff.replayed
+
+    out = StringIO()
+    with pytest.raises(CommandError, match="1 replies changed"):
+        call_command('replay_conversations', phone=[TEST_PHONE], fail_on_diff=True, stdout=out)
+    assert "Turns replayed:      4" in out.getvalue()
+    assert "- An older reply" in out.getvalue()
+    _cleanup()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for logging outgoing catalog replies as response template references
+"""
+
+import os
+import sys
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot import views
+from whatsapp_bot.bot_logic import BOT_RESPONSES, BotReply
+from whatsapp_bot.models import MessageLog, ResponseTemplate, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage
+from whatsapp_bot.response_templates import TemplateCatalog, message_text, outgoing_content
+
+TEST_PHONE = "+1234500035"
+TEST_KEY = "test.template"
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    ResponseTemplate.objects.filter(key=TEST_KEY).delete()
+
+
+def test_changed_text_gets_a_new_version():
+    _cleanup()
+    catalog = TemplateCatalog()
+    first = catalog.resolve(TEST_KEY, "Hello")
+    assert catalog.resolve(TEST_KEY, "Hello") is first
+    assert first.version == 1
+
+    edited = catalog.resolve(TEST_KEY, "Hello there")
+    assert edited.version == 2
+
+    # A fresh process finds the stored versions instead of adding more
+    assert TemplateCatalog().resolve(TEST_KEY, "Hello").pk == first.pk
+    assert ResponseTemplate.objects.filter(key=TEST_KEY).count() == 2
+    _cleanup()
+
+
+def test_dynamic_replies_keep_full_text():
+    assert outgoing_content(BotReply("Custom text")) == {'message_content': "Custom text", 'template': None}
+    assert outgoing_content("Plain str") == {'message_content': "Plain str", 'template': None}
+
+
+def test_outgoing_log_references_template_and_rebuilds_text():
+    _cleanup()
+    change = ChangeValue(
+        phone_number_id="",
+        messages=(InboundMessage("wamid.in", TEST_PHONE, "1724486400", "text", "help"),),
+        statuses=(),
+    )
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out"):
+        views.process_message(change)
+
+    outgoing = MessageLog.objects.select_related('template').get(phone_number=TEST_PHONE, message_type="outgoing")
+    assert outgoing.message_content == ""
+    assert outgoing.template.key == "menu.7"
+    assert outgoing.text == BOT_RESPONSES["7"]
+
+    texts = dict(
+        MessageLog.objects.filter(phone_number=TEST_PHONE)
+        .values_list('message_type', message_text())
+    )
+    assert texts == {"incoming": "help", "outgoing": BOT_RESPONSES["7"]}
+    _cleanup()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the conversation rollup counters, backfill and dashboard
+"""
+
+import os
+import sys
+from datetime import datetime, timezone as dt_timezone
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+
+from whatsapp_bot.models import ConversationRollup, MessageLog
+from whatsapp_bot.rollups import RollupBuffer, record_message, rollup_buffer, upsert_rollups
+from whatsapp_bot.session_store import SessionTurn
+
+TEST_PHONE = "+1234500034"
+HOUR = datetime(2001, 1, 1, 10, tzinfo=dt_timezone.utc)
+
+
+def _cleanup():
+    ConversationRollup.objects.filter(hour__year=2001).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_upsert_adds_to_existing_counters():
+    _cleanup()
+    buffer = RollupBuffer(interval=60, max_size=100)
+    buffer.add([((HOUR, 'greeting', '', 'incoming'), 1)])
+    buffer.add([((HOUR, 'greeting', '', 'incoming'), 2)])
+    assert buffer.flush() == 1
+    upsert_rollups([((HOUR, 'greeting', '', 'incoming'), 4)])
+
+    assert ConversationRollup.objects.get(hour=HOUR, intent='greeting', direction='incoming').count == 7
+    _cleanup()
+
+
+def test_counts_are_written_before_the_request_ends_by_default():
+    # Serverless instances freeze after responding, so nothing may wait on the flush timer
+    _cleanup()
+    assert rollup_buffer.interval == 0
+    record_message('incoming', 'greeting', at=HOUR)
+    record_message('incoming', 'greeting', at=HOUR)
+    assert ConversationRollup.objects.get(hour=HOUR, intent='greeting', direction='incoming').count == 2
+    _cleanup()
+
+
+def test_counts_in_a_turn_are_written_with_the_turn():
+    _cleanup()
+    with SessionTurn():
+        record_message('incoming', 'greeting', at=HOUR)
+        record_message('outgoing', 'greeting', at=HOUR)
+        record_message('incoming', 'greeting', at=HOUR)
+        assert not ConversationRollup.objects.filter(hour=HOUR).exists()
+    counts = dict(ConversationRollup.objects.filter(hour=HOUR, intent='greeting').values_list('direction', 'count'))
+    assert counts == {'incoming': 2, 'outgoing': 1}
+    _cleanup()
+
+
+def test_backfill_rebuilds_range_from_history():
+    _cleanup()
+    stale = ConversationRollup.objects.create(hour=HOUR, intent='stale', direction='incoming', count=99)
+    for content, message_type in [("menu", "incoming"), ("welcome", "outgoing"), ("1", "incoming"), ("ok", "outgoing")]:
+        log = MessageLog.objects.create(phone_number=TEST_PHONE, message_type=message_type, message_content=content)
+        MessageLog.objects.filter(pk=log.pk).update(timestamp=HOUR)
+
+    call_command('backfill_rollups', since='2001-01-01', until='2001-01-02', stdout=StringIO())
+
+    counts = {
+        (row.intent, row.role, row.direction): row.count
+        for row in ConversationRollup.objects.filter(hour=HOUR)
+    }
+    assert not ConversationRollup.objects.filter(pk=stale.pk).exists()
+    assert counts == {
+        ('main_menu', '', 'incoming'): 1,
+        ('main_menu', '', 'outgoing'): 1,
+        ('role_selection', '1', 'incoming'): 1,
+        ('role_selection', '1', 'outgoing'): 1,
+    }
+    _cleanup()
+
+
+def test_dashboard_reads_rollups():
+    admin_user, _ = User.objects.get_or_create(
+        username='rollup-test-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(admin_user)
+    response = client.get('/admin/whatsapp_bot/conversationrollup/?days=7')
+    assert response.status_code == 200
+    assert b"Conversation analytics" in response.content
+    admin_user.delete()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for session expiry at read time and the batched session cleanup command
+"""
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from whatsapp_bot import views
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import InboundMessage
+from whatsapp_bot.session_store import DatabaseSessionStore
+
+TEST_PHONE = "+1234500045"
+LONG_AGO = datetime(2001, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number__startswith=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number__startswith=TEST_PHONE).delete()
+
+
+def test_idle_sessions_read_back_fresh():
+    _cleanup()
+    store = DatabaseSessionStore(ttl=3600)
+    session = store.get_or_create(TEST_PHONE)
+    session.current_state, session.user_role, session.recent_turns = 'help_submenu', 'parent', [['greeting', 1.0, 0]]
+    session.save()
+    assert store.get_or_create(TEST_PHONE).current_state == 'help_submenu'
+
+    UserSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+    expired = store.get_or_create(TEST_PHONE)
+    assert (expired.pk, expired.current_state, expired.user_role, expired.recent_turns) == (
+        session.pk, 'greeting', None, [])
+    assert DatabaseSessionStore(ttl=0).get_or_create(TEST_PHONE).current_state == 'help_submenu'
+    _cleanup()
+
+
+def test_turns_that_save_nothing_still_keep_the_session_active():
+    _cleanup()
+    session = UserSession.objects.create(phone_number=TEST_PHONE, current_state='role_selected', user_role='2')
+    nearly_idle = timezone.now() - timedelta(seconds=DatabaseSessionStore().ttl - 60)
+    UserSession.objects.filter(pk=session.pk).update(updated_at=nearly_idle)
+
+    # Unrecognised text from a user with a role gets the role help, which changes nothing on the session
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out") as send:
+        views.handle_message("", InboundMessage("wamid.in", TEST_PHONE, "1724486400", "text", "qwerty zxcv"))
+    assert send.call_args.args[1].template == "role_help.2"
+
+    session.refresh_from_db()
+    assert session.updated_at > timezone.now() - timedelta(minutes=1)
+    assert (session.current_state, session.user_role) == ('role_selected', '2')
+    _cleanup()
+
+
+def test_cleanup_removes_idle_sessions_in_batches():
+    _cleanup()
+    for index in range(5):
+        UserSession.objects.create(phone_number=f"{TEST_PHONE}{index}", current_state='help_submenu')
+    UserSession.objects.create(phone_number=f"{TEST_PHONE}8", awaiting_agent=True)
+    UserSession.objects.filter(phone_number__startswith=TEST_PHONE).update(updated_at=LONG_AGO)
+    UserSession.objects.create(phone_number=f"{TEST_PHONE}9")
+
+    idle_days = (timezone.now() - datetime(2002, 1, 1, tzinfo=dt_timezone.utc)).days
+    with tempfile.TemporaryDirectory() as directory:
+        archive = os.path.join(directory, 'sessions.jsonl.gz')
+        output = StringIO()
+        call_command('cleanup_sessions', idle_days=idle_days, batch_size=2, pause=0, archive=archive, stdout=output)
+        with gzip.open(archive, 'rt') as archived:
+            rows = [json.loads(line) for line in archived]
+
+    assert "  2 session(s) removed\n  4 session(s) removed\n  5 session(s) removed" in output.getvalue()
+    assert sorted(row['phone_number'] for row in rows) == [f"{TEST_PHONE}{index}" for index in range(5)]
+    assert rows[0]['current_state'] == 'help_submenu'
+    # Recently active sessions and open handoffs are kept
+    assert sorted(UserSession.objects.filter(phone_number__startswith=TEST_PHONE).values_list('phone_number', flat=True)) == [
+        f"{TEST_PHONE}8", f"{TEST_PHONE}9"]
+    _cleanup()
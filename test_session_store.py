@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-statement session upsert and per-turn writes
+"""
+
+import os
+import sys
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from whatsapp_bot import views
+from whatsapp_bot.bot_logic import BOT_RESPONSES
+from whatsapp_bot.models import MessageLog, UserSession
+from whatsapp_bot.payloads import ChangeValue, InboundMessage
+from whatsapp_bot.response_templates import template_catalog
+from whatsapp_bot.session_store import DatabaseSessionStore
+
+TEST_PHONE = "+1234500032"
+
+
+def _cleanup():
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_upsert_creates_then_returns_existing_session():
+    _cleanup()
+    store = DatabaseSessionStore("tenant-a")
+
+    created = store.get_or_create(TEST_PHONE)
+    assert created.pk is not None
+    assert created.current_state == "greeting"
+
+    created.current_state = "help_menu"
+    store.save(created)
+
+    loaded = store.get_or_create(TEST_PHONE)
+    assert loaded.pk == created.pk
+    assert loaded.current_state == "help_menu"
+
+    # A different tenant gets its own session
+    assert DatabaseSessionStore("tenant-b").get_or_create(TEST_PHONE).pk != created.pk
+    _cleanup()
+
+
+def test_turn_commits_session_and_both_logs_together():
+    _cleanup()
+    change = ChangeValue(
+        phone_number_id="",
+        messages=(InboundMessage("wamid.in", TEST_PHONE, "1724486400", "text", "7"),),
+        statuses=(),
+    )
+
+    # The reply's template is registered once per process; do that outside the measured turn
+    template_catalog.resolve("menu.7", BOT_RESPONSES["7"])
+
+    with mock.patch("whatsapp_bot.bot_logic.WhatsAppBot.send_message", return_value="wamid.out"):
+        with CaptureQueriesContext(connection) as queries:
+            views.process_message(change)
+
+    writes = [q["sql"] for q in queries.captured_queries if not q["sql"].startswith("SELECT")]
+    # Upsert, then one transaction holding the session UPDATE and one multi-row INSERT
+    assert writes[0].startswith("INSERT INTO \"user_sessions\"")
+    assert sum("INSERT INTO \"message_logs\"" in sql for sql in writes) == 1
+    if connection.vendor == "postgresql":
+        assert len(writes) == 2
+
+    session = UserSession.objects.get(phone_number=TEST_PHONE)
+    assert session.current_state == "help_menu"
+    logs = list(MessageLog.objects.filter(phone_number=TEST_PHONE).values_list("message_type", "wa_message_id"))
+    assert sorted(logs) == [("incoming", "wamid.in"), ("outgoing", "wamid.out")]
+    _cleanup()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for batched delivery status tracking on MessageLog
+"""
+
+import json
+import os
+import sys
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.test import RequestFactory
+
+from whatsapp_bot import views
+from whatsapp_bot.models import MessageLog
+from whatsapp_bot.payloads import StatusUpdate
+from whatsapp_bot.status_tracking import StatusBuffer, status_buffer
+from bench_webhook_decoding import status_payload
+
+TEST_PHONE = "+1234500027"
+
+
+def _status(message_id, status, timestamp="1724486460"):
+    return StatusUpdate(message_id=message_id, status=status, recipient=TEST_PHONE,
+                        timestamp=timestamp, error_code=None)
+
+
+def test_statuses_are_applied_in_one_batch_and_never_regress():
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    for wamid in ("wamid.test-a", "wamid.test-b"):
+        MessageLog.objects.create(phone_number=TEST_PHONE, message_type="outgoing",
+                                  message_content="hello", wa_message_id=wamid)
+
+    buffer = StatusBuffer(interval=60, max_size=100)
+    buffer.add([_status("wamid.test-a", "sent"), _status("wamid.test-a", "read"),
+                _status("wamid.test-b", "delivered"), _status("wamid.unknown", "read")])
+    assert buffer.flush() == 3
+
+    # A late "delivered" must not overwrite "read"
+    buffer.add([_status("wamid.test-a", "delivered")])
+    buffer.flush()
+
+    statuses = dict(MessageLog.objects.filter(phone_number=TEST_PHONE)
+                    .values_list("wa_message_id", "delivery_status"))
+    assert statuses == {"wamid.test-a": "read", "wamid.test-b": "delivered"}
+    assert MessageLog.objects.get(wa_message_id="wamid.test-a").status_updated_at is not None
+
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def test_webhook_statuses_are_applied_before_the_response():
+    # Serverless instances freeze after responding, so by default nothing is left in a buffer
+    assert status_buffer.interval == 0
+    body = status_payload(1)
+    wamid = json.loads(body)["entry"][0]["changes"][0]["value"]["statuses"][0]["id"]
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.create(phone_number=TEST_PHONE, message_type="outgoing",
+                              message_content="hello", wa_message_id=wamid)
+
+    request = RequestFactory().post("/webhook/", data=body, content_type="application/json")
+    assert views.handle_webhook(request).status_code == 200
+    assert MessageLog.objects.get(wa_message_id=wamid).delivery_status == "sent"
+
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
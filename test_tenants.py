@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for routing webhook messages to per-tenant bots by phone_number_id
+"""
+
+import os
+import sys
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot import views
+from whatsapp_bot.bot_logic import WhatsAppBot
+from whatsapp_bot.models import MessageLog, Tenant, UserSession
+from whatsapp_bot.payloads import InboundMessage
+
+TEST_PHONE = "+1234500031"
+TENANTS = {"tenant-a-031": "token-a", "tenant-b-031": "token-b"}
+
+
+def _setup():
+    _cleanup()
+    for phone_number_id, access_token in TENANTS.items():
+        Tenant.objects.create(phone_number_id=phone_number_id, name=phone_number_id, access_token=access_token)
+
+
+def _cleanup():
+    Tenant.objects.filter(phone_number_id__in=TENANTS).delete()
+    UserSession.objects.filter(phone_number=TEST_PHONE).delete()
+    MessageLog.objects.filter(phone_number=TEST_PHONE).delete()
+
+
+def _handle(phone_number_id, body):
+    views.handle_message(phone_number_id, InboundMessage("wamid.in", TEST_PHONE, "1724486400", "text", body))
+
+
+def _sends(post_message):
+    """(phone_number_id, access token, text) of every message sent"""
+    return [(bot.phone_number_id, bot.access_token, message) for (bot, _, message), _ in post_message.call_args_list]
+
+
+def test_messages_are_answered_by_the_tenant_they_were_sent_to():
+    _setup()
+    with mock.patch.object(WhatsAppBot, "post_message", autospec=True, return_value=("wamid.out", None)) as post_message:
+        _handle("tenant-a-031", "hello")
+        _handle("tenant-b-031", "1")
+    sends = _sends(post_message)
+    assert [send[:2] for send in sends] == [("tenant-a-031", "token-a"), ("tenant-b-031", "token-b")]
+    assert set(MessageLog.objects.filter(phone_number=TEST_PHONE).values_list('phone_number_id', flat=True)) == set(TENANTS)
+    _cleanup()
+
+
+def test_each_tenant_keeps_its_own_session_for_the_same_user():
+    _setup()
+    with mock.patch.object(WhatsAppBot, "post_message", autospec=True, return_value=("wamid.out", None)):
+        _handle("tenant-a-031", "hello")
+        _handle("tenant-b-031", "1")
+    sessions = {session.phone_number_id: session for session in UserSession.objects.filter(phone_number=TEST_PHONE)}
+    assert set(sessions) == set(TENANTS)
+    assert sessions["tenant-a-031"].user_role is None
+    assert sessions["tenant-b-031"].user_role == "1"
+    _cleanup()
+
+
+def test_error_reply_comes_from_the_tenant_number():
+    _setup()
+    with mock.patch.object(WhatsAppBot, "process_message", side_effect=RuntimeError("boom")), \
+            mock.patch.object(WhatsAppBot, "post_message", autospec=True, return_value=("wamid.out", None)) as post_message:
+        _handle("tenant-b-031", "hello")
+    (phone_number_id, access_token, text), = _sends(post_message)
+    assert (phone_number_id, access_token) == ("tenant-b-031", "token-b")
+    assert "technical difficulties" in text
+    _cleanup()
+
+
+def test_admin_form_never_shows_the_access_token():
+    from django.contrib import admin
+    from django.test import RequestFactory
+    from whatsapp_bot.admin import TenantAdmin
+    _setup()
+    tenant = Tenant.objects.get(phone_number_id="tenant-a-031")
+    tenant_admin = TenantAdmin(Tenant, admin.site)
+    TenantForm = tenant_admin.get_form(RequestFactory().get("/"), tenant)
+    assert "token-a" not in TenantForm(instance=tenant).as_div()
+    assert "token-a" not in tenant_admin.current_access_token(tenant)
+    data = {"phone_number_id": "tenant-a-031", "name": "renamed", "access_token": "", "is_active": True,
+            "intent_overrides": "{}", "response_overrides": "{}"}
+    form = TenantForm(data, instance=tenant)
+    assert form.is_valid(), form.errors
+    form.save()
+    tenant.refresh_from_db()
+    assert (tenant.name, tenant.access_token) == ("renamed", "token-a")
+    assert not TenantForm(dict(data, phone_number_id="tenant-c-031")).is_valid()
+    _cleanup()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared single-pass message tokenizer
+"""
+
+import os
+import sys
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from whatsapp_bot.bot_logic import BOT_RESPONSES, SmartIntentRecognizer, WhatsAppBot
+from whatsapp_bot.session_store import InMemorySessionStore
+from whatsapp_bot.tokenizer import tokenize
+
+
+def test_normalizes_case_punctuation_and_emoji():
+    tokens = tokenize("  Hi!!  I need a TUTOR 🙏🏾📚 ")
+    assert tokens.text == "hi i need a tutor"
+    assert tokens.tokens == ("hi", "i", "need", "a", "tutor")
+    assert tokens.emoji == ("🙏", "🏾", "📚")
+    assert "need a tutor" in tokens.ngrams
+    assert tokenize("Straße").text == "strasse"
+
+
+def test_keeps_tone_marks_inside_words():
+    assert tokenize("Ẹ káàárọ̀, mo fẹ́ olùkọ́").tokens == ("ẹ", "káàárọ̀", "mo", "fẹ́", "olùkọ́")
+
+
+def test_menu_numbers():
+    assert tokenize(" 7 ").number == "7"
+    assert tokenize("12.").number == "12"
+    assert tokenize("1 2").number is None
+    assert tokenize("tutor").number is None
+
+
+def test_keywords_are_normalized_like_messages():
+    recognizer = SmartIntentRecognizer(cache_size=0)
+    assert recognizer.detect_intent("What's up?")[0] == "greeting"
+
+
+def test_keywords_match_whole_words_through_the_ngrams():
+    recognizer = SmartIntentRecognizer(cache_size=0)
+    # 'hi' is inside "this" and "with" but is not a word of either message
+    assert recognizer.match_intent("this child is struggling with maths")[0] == "unknown"
+    assert recognizer.match_intent("do you have tutors in Lekki")[0] == "tutoring_inquiry"
+    # Phrases longer than the n-grams are still found, as whole words
+    recognizer.intent_patterns['greeting'] = ['a very warm hello to you all']
+    assert recognizer.match_intent("and a very warm hello to you all!")[0] == "greeting"
+    assert recognizer.match_intent("a very warm hello to you allies")[0] == "unknown"
+
+
+def test_bot_reuses_tokens_for_menus_and_aliases():
+    bot = WhatsAppBot(session_store=InMemorySessionStore())
+    assert bot.process_message("+1234500037", "7.") == BOT_RESPONSES["7"]
+    assert bot.process_message("+1234500037", "Help!") == BOT_RESPONSES["7"]
+    assert bot.process_message("+1234500037", "School  Admin") == BOT_RESPONSES["6"]
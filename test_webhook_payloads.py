@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for typed webhook decoding and the status-only fast path
+"""
+
+import json
+import os
+import sys
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uniqwrites.settings')
+django.setup()
+
+from django.test import RequestFactory
+
+from whatsapp_bot import views
+from whatsapp_bot.payloads import decode_webhook
+from bench_webhook_decoding import status_payload, text_payload
+
+
+def test_decode_text_message():
+    changes = decode_webhook(text_payload())
+
+    assert len(changes) == 1
+    assert changes[0].phone_number_id == "106540352242922"
+    assert changes[0].statuses == ()
+    message = changes[0].messages[0]
+    assert message.phone_number == "2348012345678"
+    assert message.type == "text"
+    assert message.body.startswith("Good afternoon")
+
+
+def test_decode_failed_status():
+    body = json.loads(status_payload(1))
+    status = body["entry"][0]["changes"][0]["value"]["statuses"][0]
+    status["status"] = "failed"
+    status["errors"] = [{"code": 131026, "title": "Message undeliverable"}]
+
+    update = decode_webhook(json.dumps(body).encode())[0].statuses[0]
+    assert update.status == "failed"
+    assert update.error_code == 131026
+
+
+def test_status_only_detection():
+    assert any(change.messages for change in decode_webhook(text_payload()))
+    # The change's "field": "messages" value must not count as messages
+    assert b'"field": "messages"' in status_payload(1)
+    assert not any(change.messages for change in decode_webhook(status_payload(3)))
+
+
+def test_status_only_webhook_skips_message_pipeline():
+    request = RequestFactory().post("/webhook/", data=status_payload(5), content_type="application/json")
+
+    with mock.patch.object(views, "process_message") as process_message:
+        response = views.handle_webhook(request)
+
+    assert response.status_code == 200
+    process_message.assert_not_called()
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'whatsapp_bot.profiling.SlowRequestProfilerMiddleware',  # Inactive unless WHATSAPP_PROFILE_SLOW_MS is set
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,6 +70,9 @@ if DEBUG:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # A second connection to the same file stands in for the read replica, so
+    # replica routing is exercised locally
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
 else:
     # Use Neon in production
     DATABASES = {
@@ -78,11 +83,134 @@ else:
         )
     }
 
+    # Admin list views, exports and analytics commands read from this replica;
+    # the webhook, and every write, stays on the primary
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        DATABASES['replica'] = dj_database_url.parse(
+            os.environ['DATABASE_REPLICA_URL'],
+            conn_max_age=600,
+            conn_health_checks=True,
+        )
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+    # Behind PgBouncer in transaction pooling mode nothing may outlive a transaction:
+    # no server-side cursors and no server-side prepared statements
+    if os.environ.get('DATABASE_PGBOUNCER', 'False').lower() == 'true':
+        for database in DATABASES.values():
+            database['DISABLE_SERVER_SIDE_CURSORS'] = True
+            if importlib.util.find_spec('psycopg'):
+                # psycopg 3 prepares frequently repeated queries; psycopg2 never does
+                database.setdefault('OPTIONS', {})['prepare_threshold'] = None
+
+DATABASE_ROUTERS = ['whatsapp_bot.db_router.ReplicaRouter']
+# After an admin saves or deletes something, that user's list views read from
+# the primary for this many seconds so their change is visible despite replica lag
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', '5'))
+
 # WhatsApp API Configuration
 WHATSAPP_VERIFY_TOKEN = os.environ.get('WHATSAPP_VERIFY_TOKEN')
 WHATSAPP_ACCESS_TOKEN = os.environ.get('WHATSAPP_ACCESS_TOKEN')
 WHATSAPP_PHONE_NUMBER_ID = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')
 
+# Delivery/read status callbacks are applied in one UPDATE per webhook request. A
+# positive interval instead buffers them and applies them from a timer thread once
+# per that many seconds; only use it on long-running servers, since on serverless
+# hosts (Vercel) the instance freezes after the response and the buffer is lost
+WHATSAPP_STATUS_FLUSH_INTERVAL = float(os.environ.get('WHATSAPP_STATUS_FLUSH_INTERVAL', '0'))
+WHATSAPP_STATUS_BATCH_SIZE = int(os.environ.get('WHATSAPP_STATUS_BATCH_SIZE', '500'))
+
+# Additional WhatsApp numbers are configured as Tenant rows; their cached
+# configuration is re-checked against the database after this many seconds
+WHATSAPP_TENANT_CACHE_TTL = int(os.environ.get('WHATSAPP_TENANT_CACHE_TTL', '60'))
+
+# Intents and responses published as BotConfig versions (admin or manage.py
+# publish_bot_config) are picked up by each process within this many seconds;
+# 0 only loads the configuration at startup
+WHATSAPP_BOT_CONFIG_POLL = float(os.environ.get('WHATSAPP_BOT_CONFIG_POLL', '30'))
+
+# Per-sender flood limit, checked before any database or network work: a burst of
+# WHATSAPP_FLOOD_BURST messages, refilled at WHATSAPP_FLOOD_RATE per second (0 disables).
+# Senders over it get one notice and are dropped. State is kept in memory for up to
+# WHATSAPP_FLOOD_MAX_SENDERS senders, or in the WHATSAPP_FLOOD_CACHE cache alias when
+# several instances must share it
+WHATSAPP_FLOOD_RATE = float(os.environ.get('WHATSAPP_FLOOD_RATE', '0.5'))
+WHATSAPP_FLOOD_BURST = int(os.environ.get('WHATSAPP_FLOOD_BURST', '10'))
+WHATSAPP_FLOOD_MAX_SENDERS = int(os.environ.get('WHATSAPP_FLOOD_MAX_SENDERS', '10000'))
+WHATSAPP_FLOOD_CACHE = os.environ.get('WHATSAPP_FLOOD_CACHE', '')
+
+# Text messages a user sends within this many seconds of their previous one are
+# merged into a single turn and answered once (0 answers every message). The first
+# message of a burst is answered straight away; held messages are flushed by a
+# background thread, so leave this at 0 on serverless hosts
+WHATSAPP_COALESCE_WINDOW = float(os.environ.get('WHATSAPP_COALESCE_WINDOW', '0'))
+WHATSAPP_COALESCE_MAX_MESSAGES = int(os.environ.get('WHATSAPP_COALESCE_MAX_MESSAGES', '10'))
+
+# Users who go quiet after being sent a form are nudged this many seconds later,
+# once per comma-separated delay (empty sends no follow-ups). Keep the delays inside
+# WhatsApp's 24-hour customer service window. Each process fires its own timers from
+# an in-memory timing wheel and sweeps up overdue ones; on serverless hosts run
+# manage.py send_follow_ups on a schedule instead
+WHATSAPP_FOLLOW_UP_DELAYS = [int(delay) for delay in os.environ.get('WHATSAPP_FOLLOW_UP_DELAYS', '').split(',') if delay.strip()]
+WHATSAPP_FOLLOW_UP_TICK = float(os.environ.get('WHATSAPP_FOLLOW_UP_TICK', '1'))
+WHATSAPP_FOLLOW_UP_BATCH_SIZE = int(os.environ.get('WHATSAPP_FOLLOW_UP_BATCH_SIZE', '100'))
+WHATSAPP_FOLLOW_UP_SWEEP_INTERVAL = float(os.environ.get('WHATSAPP_FOLLOW_UP_SWEEP_INTERVAL', '60'))
+# Nudges more than this many seconds overdue are expired rather than sent late (keep the
+# longest delay plus this inside the 24-hour window), and ones stuck sending for longer
+# than the lease (a dispatcher that died mid-send) are claimed again
+WHATSAPP_FOLLOW_UP_GRACE = int(os.environ.get('WHATSAPP_FOLLOW_UP_GRACE', '21600'))
+WHATSAPP_FOLLOW_UP_LEASE = int(os.environ.get('WHATSAPP_FOLLOW_UP_LEASE', '300'))
+
+# Agents' handoff event streams poll the database this often, and end after the stream
+# lifetime (the browser reconnects), so a stream works on any host and holds a worker briefly
+WHATSAPP_HANDOFF_POLL_SECONDS = float(os.environ.get('WHATSAPP_HANDOFF_POLL_SECONDS', '2'))
+WHATSAPP_HANDOFF_STREAM_SECONDS = float(os.environ.get('WHATSAPP_HANDOFF_STREAM_SECONDS', '25'))
+# A handoff no agent claims within this many seconds is closed and the user is answered by the
+# bot again (0 waits forever); the user's next message or manage.py expire_handoffs closes it
+WHATSAPP_HANDOFF_TIMEOUT = int(os.environ.get('WHATSAPP_HANDOFF_TIMEOUT', '14400'))
+
+# Conversation state is forgotten after this many idle seconds (0 keeps it forever);
+# manage.py cleanup_sessions removes sessions that stay idle much longer
+WHATSAPP_SESSION_TTL = int(os.environ.get('WHATSAPP_SESSION_TTL', '86400'))
+
+# Hourly analytics counters for a conversation turn are written in the turn's own transaction
+# (on PostgreSQL, in the same statement); broadcasts and follow-ups upsert theirs once per batch.
+# A positive interval instead accumulates counts made outside a turn in memory and upserts them
+# from a timer thread; only use it on long-running servers, since serverless hosts (Vercel)
+# freeze after the response and unflushed counts are lost (manage.py backfill_rollups rebuilds
+# them from message_logs)
+WHATSAPP_ROLLUP_FLUSH_INTERVAL = float(os.environ.get('WHATSAPP_ROLLUP_FLUSH_INTERVAL', '0'))
+WHATSAPP_ROLLUP_BATCH_SIZE = int(os.environ.get('WHATSAPP_ROLLUP_BATCH_SIZE', '1000'))
+
+# Intent keyword scores are memoised per normalized message (0 disables the cache)
+WHATSAPP_INTENT_CACHE_SIZE = int(os.environ.get('WHATSAPP_INTENT_CACHE_SIZE', '1024'))
+
+# Priority lanes: complaints and human-agent handoffs are processed before other messages.
+# With 0 workers every message is handled inside the webhook request (required on serverless
+# hosts); otherwise a pool of this many threads drains the lanes after the webhook is acknowledged
+WHATSAPP_LANE_WORKERS = int(os.environ.get('WHATSAPP_LANE_WORKERS', '0'))
+WHATSAPP_LANE_STARVATION_AFTER = float(os.environ.get('WHATSAPP_LANE_STARVATION_AFTER', '2'))  # Seconds
+WHATSAPP_LANE_MAX_QUEUED = int(os.environ.get('WHATSAPP_LANE_MAX_QUEUED', '10000'))  # Beyond this, jobs run in the webhook request
+WHATSAPP_URGENT_LANE_TTL = int(os.environ.get('WHATSAPP_URGENT_LANE_TTL', '1800'))  # Seconds
+
+# Images, voice notes and documents are recorded by the webhook and streamed to the
+# default file storage by manage.py download_media (run it on a schedule), stored once
+# per distinct SHA-256. On long-running servers a positive count downloads them in that
+# many background threads instead; not on serverless hosts (Vercel), which freeze after
+# the response and would leave downloads stuck until download_media retries them
+WHATSAPP_MEDIA_WORKERS = int(os.environ.get('WHATSAPP_MEDIA_WORKERS', '0'))
+WHATSAPP_MEDIA_CHUNK_SIZE = 64 * 1024  # Bytes held in memory per download
+WHATSAPP_MEDIA_MAX_BYTES = int(os.environ.get('WHATSAPP_MEDIA_MAX_BYTES', str(100 * 1024 * 1024)))
+WHATSAPP_GRAPH_API_URL = os.environ.get('WHATSAPP_GRAPH_API_URL', 'https://graph.facebook.com/v18.0')
+
+# Slow-request profiler for the webhook: requests slower than this many milliseconds are saved
+# with stack samples, their DB queries and outbound HTTP timings (0 disables the profiler);
+# list them with `manage.py slow_requests`
+WHATSAPP_PROFILE_SLOW_MS = int(os.environ.get('WHATSAPP_PROFILE_SLOW_MS', '0'))
+WHATSAPP_PROFILE_SAMPLE_RATE = float(os.environ.get('WHATSAPP_PROFILE_SAMPLE_RATE', '0'))  # Share also run under cProfile
+WHATSAPP_PROFILE_DIR = os.environ.get('WHATSAPP_PROFILE_DIR')  # Default: <tmp>/uniqbot-profiles
+WHATSAPP_PROFILE_MAX_FILES = int(os.environ.get('WHATSAPP_PROFILE_MAX_FILES', '200'))
+WHATSAPP_PROFILE_INTERVAL_MS = int(os.environ.get('WHATSAPP_PROFILE_INTERVAL_MS', '5'))  # Stack sampling period
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,6 +237,10 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Downloaded WhatsApp media (set DEFAULT_FILE_STORAGE for object storage)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Whitenoise configuration for serving static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
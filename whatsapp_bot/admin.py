@@ -1,20 +1,205 @@
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django import forms
 from django.contrib import admin
-from .models import UserSession, MessageLog
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from .bot_config import config_data, live_config, live_version
+from .db_router import pin_primary_reads, primary_reads_pinned, use_replica
+from .models import (Tenant, UserSession, MessageLog, Broadcast, ConversationRollup, ResponseTemplate, Handoff, BotConfig,
+                     MediaDownload, MediaFile, FollowUp)
+
+def replica_reads(request):
+    """Read from the replica for GET requests, unless this user changed something moments ago"""
+    if request.method != 'GET' or primary_reads_pinned(request):
+        return nullcontext()
+    return use_replica()
+
+class ReplicaListMixin:
+    """List views read from the replica; the user's own edits pin them to the primary while the replica catches up"""
+
+    def changelist_view(self, request, extra_context=None):
+        with replica_reads(request):
+            response = super().changelist_view(request, extra_context)
+            # The result list is only queried when the response renders
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        pin_primary_reads(request)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        pin_primary_reads(request)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        pin_primary_reads(request)
+
+class TenantForm(forms.ModelForm):
+    """The access token is write-only: it is never rendered back, and a blank field keeps the current one"""
+    access_token = forms.CharField(
+        widget=forms.PasswordInput(render_value=False), required=False,
+        help_text="Paste a new token to replace the current one; leave blank to keep it",
+    )
+
+    class Meta:
+        model = Tenant
+        fields = '__all__'
+
+    def clean_access_token(self):
+        token = self.cleaned_data['access_token'].strip()
+        if token:
+            return token
+        if self.instance.pk is None:
+            raise forms.ValidationError("A new tenant needs an access token")
+        return Tenant.objects.values_list('access_token', flat=True).get(pk=self.instance.pk)
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    form = TenantForm
+    list_display = ['name', 'phone_number_id', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'phone_number_id']
+    readonly_fields = ['current_access_token', 'created_at', 'updated_at']
+
+    def current_access_token(self, obj):
+        """Enough of the token to tell which one is set, never the token itself"""
+        if not obj.access_token:
+            return "-"
+        return f"\u2022\u2022\u2022\u2022{obj.access_token[-4:]}" if len(obj.access_token) > 12 else "\u2022\u2022\u2022\u2022"
+    current_access_token.short_description = "Current access token"
+
+@admin.register(BotConfig)
+class BotConfigAdmin(admin.ModelAdmin):
+    """Published versions are read-only; adding one starts from the live version and publishes the next"""
+    list_display = ['version', 'comment', 'created_at']
+    readonly_fields = ['version', 'created_at']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_changeform_initial_data(self, request):
+        config = live_config()
+        return config_data(config) if config else {}
+
+    def save_model(self, request, obj, form, change):
+        obj.version = (live_version() or 0) + 1
+        super().save_model(request, obj, form, change)
 
 @admin.register(UserSession)
-class UserSessionAdmin(admin.ModelAdmin):
-    list_display = ['phone_number', 'user_role', 'current_state', 'created_at', 'updated_at']
-    list_filter = ['user_role', 'current_state', 'created_at']
+class UserSessionAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['phone_number', 'phone_number_id', 'user_role', 'current_state', 'awaiting_agent', 'created_at', 'updated_at']
+    list_filter = ['phone_number_id', 'user_role', 'current_state', 'awaiting_agent', 'created_at']
     search_fields = ['phone_number']
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(MessageLog)
-class MessageLogAdmin(admin.ModelAdmin):
-    list_display = ['phone_number', 'message_type', 'timestamp', 'message_preview']
-    list_filter = ['message_type', 'timestamp']
-    search_fields = ['phone_number', 'message_content']
-    readonly_fields = ['timestamp']
+class MessageLogAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['phone_number', 'message_type', 'timestamp', 'delivery_status', 'message_preview']
+    list_filter = ['message_type', 'delivery_status', 'timestamp']
+    search_fields = ['phone_number', 'message_content', 'template__text']
+    readonly_fields = ['timestamp', 'wa_message_id', 'delivery_status', 'status_updated_at', 'template', 'text']
+    list_select_related = ['template']
     
     def message_preview(self, obj):
-        return obj.message_content[:50] + "..." if len(obj.message_content) > 50 else obj.message_content
+        return obj.text[:50] + "..." if len(obj.text) > 50 else obj.text
     message_preview.short_description = "Message Preview"
+
+@admin.register(ResponseTemplate)
+class ResponseTemplateAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['key', 'version', 'created_at']
+    search_fields = ['key', 'text']
+    readonly_fields = ['key', 'version', 'text', 'created_at']
+
+@admin.register(Handoff)
+class HandoffAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['phone_number', 'reason', 'status', 'agent', 'created_at', 'last_message_at']
+    list_filter = ['status', 'reason']
+    search_fields = ['phone_number']
+    readonly_fields = ['created_at', 'last_message_at', 'claimed_at', 'closed_at']
+
+@admin.register(MediaDownload)
+class MediaDownloadAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['phone_number', 'media_type', 'status', 'error', 'media_file', 'created_at']
+    list_filter = ['status', 'media_type']
+    search_fields = ['phone_number', 'caption', 'media_file__sha256']
+    list_select_related = ['media_file']
+    readonly_fields = ['wa_message_id', 'media_id', 'status', 'error', 'media_file',
+                       'created_at', 'started_at', 'finished_at']
+
+@admin.register(MediaFile)
+class MediaFileAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['sha256', 'mime_type', 'size', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'mime_type', 'size', 'file', 'created_at']
+
+@admin.register(FollowUp)
+class FollowUpAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['phone_number', 'step', 'status', 'due_at', 'sent_at']
+    list_filter = ['status', 'step']
+    search_fields = ['phone_number']
+    readonly_fields = ['status', 'wa_message_id', 'error', 'created_at', 'sent_at']
+
+@admin.register(Broadcast)
+class BroadcastAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['name', 'user_role', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at']
+    list_filter = ['status', 'user_role']
+    readonly_fields = ['status', 'last_session_id', 'sent_count', 'failed_count', 'failure_breakdown',
+                       'created_at', 'started_at', 'finished_at']
+
+@admin.register(ConversationRollup)
+class ConversationRollupAdmin(admin.ModelAdmin):
+    """Analytics dashboard that reads only the hourly rollups, never message_logs"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        with replica_reads(request):
+            return self._dashboard_view(request, extra_context)
+
+    def _dashboard_view(self, request, extra_context):
+        try:
+            days = max(1, min(int(request.GET.get('days', 30)), 365))
+        except ValueError:
+            days = 30
+        rollups = ConversationRollup.objects.filter(hour__gte=timezone.now() - timedelta(days=days))
+
+        per_day = list(
+            rollups.annotate(day=TruncDate('hour')).values('day', 'direction')
+            .annotate(total=Sum('count')).order_by('day', 'direction')
+        )
+        incoming = rollups.filter(direction='incoming')
+        intent_mix = list(incoming.values('intent').annotate(total=Sum('count')).order_by('-total'))
+        roles = list(incoming.exclude(role='').values('role').annotate(total=Sum('count')).order_by('-total'))
+
+        total_incoming = sum(row['total'] for row in intent_mix)
+        fallbacks = sum(row['total'] for row in intent_mix if row['intent'] == 'fallback')
+
+        days_table = {}
+        for row in per_day:
+            days_table.setdefault(row['day'], {'day': row['day'], 'incoming': 0, 'outgoing': 0})[row['direction']] = row['total']
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Conversation analytics",
+            'days': days,
+            'per_day': list(days_table.values()),
+            'intent_mix': intent_mix,
+            'roles': roles,
+            'total_incoming': total_incoming,
+            'fallback_rate': fallbacks / total_incoming * 100 if total_incoming else 0,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/whatsapp_bot/conversationrollup/dashboard.html', context)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class WhatsappBotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'whatsapp_bot'
+
+    def ready(self):
+        # Connect the tenant cache invalidation signals
+        from . import tenants  # noqa: F401
@@ -0,0 +1,74 @@
+import atexit
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class FlushBuffer:
+    """Thread-safe in-process buffer that is written to the database in batches
+
+    Items are merged into ``pending`` by ``_merge`` and written by ``_write``
+    once ``max_size`` items are waiting or ``interval`` seconds after the first
+    unflushed item arrived, whichever comes first. An interval of 0 writes on
+    every ``add``, inside the caller's request; the timer is a thread that
+    only runs while the process does, so a positive interval is for
+    long-running servers, not serverless hosts that freeze after responding.
+    """
+
+    def __init__(self, interval, max_size):
+        self.interval = interval
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending = self._empty()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def _empty(self):
+        return {}
+
+    def _merge(self, pending, items):
+        raise NotImplementedError
+
+    def _write(self, pending):
+        raise NotImplementedError
+
+    def add(self, items):
+        """Buffer items, flushing inline when the batch is full"""
+        with self._lock:
+            self._merge(self._pending, items)
+            full = len(self._pending) >= self.max_size or self.interval <= 0
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of items written"""
+        with self._lock:
+            pending, self._pending = self._pending, self._empty()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not pending:
+            return 0
+
+        try:
+            self._write(pending)
+        except Exception as e:
+            logger.error(f"Error flushing {type(self).__name__} ({len(pending)} items): {str(e)}")
+            return 0
+        return len(pending)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # Timer threads are short-lived, so don't leave their connections open
+            connections.close_all()
@@ -0,0 +1,44 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import BotConfig
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FIELDS = ['intent_patterns', 'intent_priorities', 'responses', 'smart_responses']
+
+
+def live_version():
+    """Version number of the live configuration, None when nothing has been published"""
+    return BotConfig.objects.aggregate(version=Max('version'))['version']
+
+
+def live_config():
+    return BotConfig.objects.order_by('-version').first()
+
+
+def publish_config(data, comment='', attempts=3):
+    """Validate ``data`` (a dict of CONFIG_FIELDS) and save it as the next version"""
+    config = BotConfig(comment=comment, **{field: data.get(field) or {} for field in CONFIG_FIELDS})
+    config.full_clean(exclude=['version'])
+
+    for attempt in range(attempts):
+        config.version = (live_version() or 0) + 1
+        try:
+            with transaction.atomic():
+                config.save(force_insert=True)
+        except IntegrityError:
+            # Another process published the same version number first
+            config.pk = None
+            if attempt == attempts - 1:
+                raise
+            continue
+        logger.info(f"Published bot configuration v{config.version}")
+        return config
+
+
+def config_data(config):
+    """The published fields of ``config`` as a dict, e.g. to dump as JSON for editing"""
+    return {field: getattr(config, field) for field in CONFIG_FIELDS}
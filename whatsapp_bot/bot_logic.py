@@ -1,16 +1,98 @@
 import requests
 import json
 import logging
-import re
+import threading
+import time
+from functools import lru_cache
 from django.conf import settings
-from .models import UserSession
+from requests.adapters import HTTPAdapter
+from .languages import (
+    ENGLISH, LANGUAGE_KEYWORDS, LANGUAGE_RESPONSES, language_identifier, language_patterns, language_responses
+)
+from .profiling import TimedHttpCall
+from .session_store import DatabaseSessionStore
+from .tokenizer import MAX_NGRAM, normalize, plain_text, tokenize
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) timeout for Graph API calls
+SEND_TIMEOUT = (5, 15)
+
+# Recent-turn memory kept on UserSession.recent_turns
+RECENT_TURNS_LIMIT = 5
+RECENT_TURNS_WINDOW = 30 * 60  # Seconds after which a turn no longer counts as context
+CONTEXT_BOOST = 0.2  # Score boost for the most recent intent, halved for the one before, ...
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def create_http_session(pool_size=10):
+    """Create a requests session with a keep-alive connection pool of ``pool_size``"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session():
+    """Process-wide pooled session shared by every WhatsAppBot"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = create_http_session()
+    return _http_session
+
+
+class _WatchedDict(dict):
+    """Dict that calls ``on_change`` whenever an entry is added, replaced or removed"""
+
+    def __init__(self, data, on_change):
+        super().__init__(data)
+        self._on_change = on_change
+
+    def _changed(method):
+        def wrapper(self, *args, **kwargs):
+            result = getattr(dict, method)(self, *args, **kwargs)
+            self._on_change()
+            return result
+        wrapper.__name__ = method
+        return wrapper
+
+    __setitem__ = _changed('__setitem__')
+    __delitem__ = _changed('__delitem__')
+    update = _changed('update')
+    pop = _changed('pop')
+    popitem = _changed('popitem')
+    setdefault = _changed('setdefault')
+    clear = _changed('clear')
+    del _changed
+
+
+def _normalize_keywords(keywords):
+    """Keywords normalized the same way as messages, e.g. what's up -> what s up"""
+    return tuple(normalize(keyword) for keyword in keywords)
+
+
 class SmartIntentRecognizer:
-    """Intelligent intent recognition for Uniqwrites educational services"""
+    """Intelligent intent recognition for Uniqwrites educational services
+
+    Keyword scores are memoised per normalized message in a bounded LRU
+    cache (most traffic is the same few phrases). The cache is cleared
+    whenever ``intent_patterns`` or ``intent_priorities`` change.
+    """
     
-    def __init__(self):
+    def __init__(self, intent_overrides=None, cache_size=None, priority_overrides=None, response_overrides=None,
+                 fold_marks=False, language=ENGLISH):
+        # Match against text with tone marks stripped, for languages whose users often leave them out
+        self.fold_marks = fold_marks
+        self.language = language
+        if cache_size is None:
+            cache_size = getattr(settings, 'WHATSAPP_INTENT_CACHE_SIZE', 1024)
+        self._cached_scores = lru_cache(maxsize=cache_size)(self._score_keywords)
+
         # Define intent patterns with keywords and phrases
         self.intent_patterns = {
             # Service-related intents
@@ -124,22 +206,115 @@ class SmartIntentRecognizer:
             'general_info': 2,
             'greeting': 1
         }
+        
+        # Published configuration and tenant keyword lists replace the built-in list for that intent
+        if intent_overrides:
+            self.intent_patterns.update(intent_overrides)
+        if priority_overrides:
+            self.intent_priorities.update(priority_overrides)
+
+        # Configured smart responses replace the built-in text per intent and role
+        self.smart_responses = SMART_RESPONSES
+        if response_overrides:
+            self.smart_responses = {
+                intent: {**SMART_RESPONSES.get(intent, {}), **response_overrides.get(intent, {})}
+                for intent in SMART_RESPONSES.keys() | response_overrides.keys()
+            }
+
+    @property
+    def intent_patterns(self):
+        return self._intent_patterns
+
+    @intent_patterns.setter
+    def intent_patterns(self, patterns):
+        # Keyword lists are stored normalized, as tuples so they can only change through the dict
+        self._intent_patterns = _WatchedDict(
+            {intent: _normalize_keywords(keywords) for intent, keywords in patterns.items()},
+            self._patterns_changed
+        )
+        self.clear_cache()
+
+    @property
+    def intent_priorities(self):
+        return self._intent_priorities
+
+    @intent_priorities.setter
+    def intent_priorities(self, priorities):
+        self._intent_priorities = _WatchedDict(priorities, self.clear_cache)
+        self.clear_cache()
+
+    def _patterns_changed(self):
+        for intent, keywords in self._intent_patterns.items():
+            if not isinstance(keywords, tuple):
+                dict.__setitem__(self._intent_patterns, intent, _normalize_keywords(keywords))
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Forget memoised scores, e.g. after the keyword tables change"""
+        self._cached_scores.cache_clear()
+
+    def cache_stats(self):
+        """Hits, misses, size and hit rate of the score cache"""
+        info = self._cached_scores.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+        }
 
-    def detect_intent(self, message):
-        """Detect user intent from message with confidence scoring"""
-        message_lower = message.lower().strip()
+    def detect_intent(self, message, recent_intents=()):
+        """Detect user intent from message with confidence scoring
+
+        ``message`` is text or the Tokens already produced for it.
+        ``recent_intents`` (oldest first) are intents from the user's recent
+        turns; they win close calls so a conversation stays on topic.
+        """
+        intent, confidence = self.match_intent(message, recent_intents)
+        if confidence:
+            logger.info(f"Intent detected: {intent} (confidence: {confidence:.2f})")
+        return intent, confidence
+
+    def match_intent(self, message, recent_intents=()):
+        """detect_intent without logging, for callers that only peek at the intent"""
+        tokens = tokenize(message)
+        intent_scores = dict(self._cached_scores(tokens))
         
-        # Remove punctuation and extra spaces
-        cleaned_message = re.sub(r'[^\w\s]', ' ', message_lower)
-        cleaned_message = re.sub(r'\s+', ' ', cleaned_message).strip()
+        # Boost intents the user mentioned recently, most recent first
+        for age, recent_intent in enumerate(reversed(recent_intents)):
+            if recent_intent in intent_scores:
+                intent_scores[recent_intent] *= 1 + CONTEXT_BOOST / (age + 1)
         
-        intent_scores = {}
+        # Return the highest scoring intent
+        if intent_scores:
+            best_intent = max(intent_scores, key=intent_scores.get)
+            confidence = min(intent_scores[best_intent] / 5.0, 1.0)  # Normalize to 0-1
+            return best_intent, confidence
         
+        return 'unknown', 0.0
+
+    def _score_keywords(self, tokens):
+        """Keyword scores for a tokenized message, as a tuple of (intent, score) pairs
+
+        A keyword matches whole words: it is looked up in the message's
+        n-grams (plus its words without a plural s, so 'tutors' finds
+        'tutor'), and only phrases longer than MAX_NGRAM words are searched
+        for in the text.
+        """
+        intent_scores = {}
+        ngrams, text = tokens.ngrams, tokens.text
+        ngrams = ngrams.union(word[:-1] for word in tokens.tokens if len(word) > 3 and word.endswith('s'))
+        if self.fold_marks:
+            ngrams, text = frozenset(plain_text(ngram) for ngram in ngrams), tokens.plain
+        text = f" {text} "
+
         # Score each intent based on keyword matches
         for intent, keywords in self.intent_patterns.items():
             score = 0
             for keyword in keywords:
-                if keyword in cleaned_message:
+                if keyword in ngrams or (keyword.count(' ') >= MAX_NGRAM and f" {keyword} " in text):
                     # Exact phrase match gets higher score
                     if len(keyword.split()) > 1:
                         score += 3
@@ -155,25 +330,51 @@ class SmartIntentRecognizer:
                 priority_weight = self.intent_priorities.get(intent, 1)
                 intent_scores[intent] = score * (priority_weight * 0.1 + 1)
         
-        # Return the highest scoring intent
-        if intent_scores:
-            best_intent = max(intent_scores, key=intent_scores.get)
-            confidence = min(intent_scores[best_intent] / 5.0, 1.0)  # Normalize to 0-1
-            
-            logger.info(f"Intent detected: {best_intent} (confidence: {confidence:.2f})")
-            return best_intent, confidence
-        
-        return 'unknown', 0.0
-
-    def get_contextual_response(self, intent, confidence, user_role=None):
+        return tuple(intent_scores.items())
+
+    def follow_up_topic(self, intent, recent_intents):
+        """Return the service a follow-up question like 'how much?' refers to, if any"""
+        if intent not in FOLLOW_UP_RESPONSES:
+            return None
+        for recent_intent in reversed(recent_intents):
+            if recent_intent in FOLLOW_UP_TOPICS:
+                return recent_intent
+        return None
+
+    def get_contextual_response(self, intent, confidence, user_role=None, topic=None):
         """Generate contextual response based on detected intent"""
         
         if confidence < 0.3:
             return None  # Low confidence, use default flow
         
-        responses = {
-            'tutoring_inquiry': {
-                '2': """🎓 Perfect! We offer comprehensive tutoring services:
+        # Answer follow-up questions about the service discussed in earlier turns
+        if topic in FOLLOW_UP_TOPICS and intent in FOLLOW_UP_RESPONSES:
+            label, link = FOLLOW_UP_TOPICS[topic]
+            return FOLLOW_UP_RESPONSES[intent].format(label=label, link=link)
+        
+        # Get role-specific response or default
+        intent_responses = self.smart_responses.get(intent, {})
+        response = intent_responses.get(user_role, intent_responses.get('default'))
+        
+        return response
+
+    def response_template(self, intent, user_role=None, topic=None):
+        """Template key of the text get_contextual_response picks, e.g. smart.greeting.default.yo
+
+        Text in this recognizer's own language gets the language suffix;
+        intents and roles it falls back to English for do not.
+        """
+        if topic in FOLLOW_UP_TOPICS and intent in FOLLOW_UP_RESPONSES:
+            return f"follow_up.{intent}.{topic}"
+        role = user_role if user_role in self.smart_responses.get(intent, {}) else 'default'
+        if role in LANGUAGE_RESPONSES.get(self.language, {}).get(intent, ()):
+            return f"smart.{intent}.{role}.{self.language}"
+        return f"smart.{intent}.{role}"
+
+# Smart intent responses by intent, then user role ('default' for any other role)
+SMART_RESPONSES = {
+    'tutoring_inquiry': {
+        '2': """🎓 Perfect! We offer comprehensive tutoring services:
                 
 ✨ One-on-One & Group Tutoring
 ✨ Virtual & Physical Lessons  
@@ -185,7 +386,7 @@ Ready to find the perfect tutor for your child?
 
 Or type 'menu' to see all our services.""",
 
-                'default': """🎓 Great! We provide excellent tutoring services:
+        'default': """🎓 Great! We provide excellent tutoring services:
 
 📚 Home Tutoring (One-on-One & Group)
 💻 Virtual & Physical Lessons
@@ -196,10 +397,10 @@ Are you a parent looking for a tutor? Type '2'
 Are you a student needing help? Type '3'
 
 Or visit: https://forms.gle/eTkf1N9qrKZyNJr4A"""
-            },
-            
-            'exam_prep': {
-                'default': """🎯 Excellent! We specialize in exam preparation:
+    },
+    
+    'exam_prep': {
+        'default': """🎯 Excellent! We specialize in exam preparation:
 
 📋 Supported Exams:
 • SAT, IGCSE, WAEC, NECO, JAMB
@@ -211,10 +412,10 @@ Ready to excel in your exams?
 👉 Request exam prep: https://forms.gle/eTkf1N9qrKZyNJr4A
 
 Type 'menu' for more options."""
-            },
-            
-            'teacher_recruitment': {
-                '6': """🏫 Perfect! We help schools find qualified teachers:
+    },
+    
+    'teacher_recruitment': {
+        '6': """🏫 Perfect! We help schools find qualified teachers:
 
 ✅ Trained professionals
 ✅ Easy hiring process  
@@ -229,17 +430,17 @@ We also offer:
 • School management systems
 • EdTech consultation""",
 
-                'default': """🏫 We help schools find qualified teachers!
+        'default': """🏫 We help schools find qualified teachers!
 
 Are you a school administrator? Type '6' 
 Are you a teacher looking for opportunities? Type '1'
 
 Or directly request teachers:
 👉 https://docs.google.com/forms/d/e/1FAIpQLSesPzdDEMUc_V5BXdZUjupEhSpgMaLMVQMz61TlD3CxyOFi6w/viewform?usp=sharing&ouid=116162016347061818487"""
-            },
-            
-            'pap_interest': {
-                'default': """🌟 Amazing! Purpose Action Point (PAP) is transformative:
+    },
+    
+    'pap_interest': {
+        'default': """🌟 Amazing! Purpose Action Point (PAP) is transformative:
 
 🎯 9-month life-shaping program for high school graduates
 
@@ -254,10 +455,10 @@ What you'll gain:
 
 Stay tuned for this life-changing opportunity.
 Type 'menu' to explore other services."""
-            },
-            
-            'volunteer_interest': {
-                'default': """🤝 Thank you for your heart of service!
+    },
+    
+    'volunteer_interest': {
+        'default': """🤝 Thank you for your heart of service!
 
 Join our impactful initiatives:
 📚 Literacy Immersion Outreach  
@@ -267,10 +468,10 @@ Make a difference in young lives today:
 👉 Volunteer here: https://docs.google.com/forms/d/e/1FAIpQLSeOp7MqoaTPE4Rvi_22VwLX_v4dbR62EIJcP8N3FtZWMk0leQ/viewform?usp=sharing&ouid=116162016347061818487
 
 Every child deserves a chance to learn! 💖"""
-            },
-            
-            'sponsor_interest': {
-                'default': """💎 Thank you for your generosity!
+    },
+    
+    'sponsor_interest': {
+        'default': """💎 Thank you for your generosity!
 
 Support our life-changing initiatives:
 📖 Literacy programs for struggling readers
@@ -281,10 +482,10 @@ Your sponsorship creates lasting impact:
 👉 Sponsor here: https://docs.google.com/forms/d/e/1FAIpQLSeX_9GAHJB22l_1-OAN08avlW_fxRR1HIlAO_SxvNH9HF4fWg/viewform?usp=sharing&ouid=116162016347061818487
 
 Together, we're changing lives! ✨"""
-            },
-            
-            'pricing_inquiry': {
-                'default': """💰 Great question! Our pricing is competitive and value-focused.
+    },
+    
+    'pricing_inquiry': {
+        'default': """💰 Great question! Our pricing is competitive and value-focused.
 
 For specific pricing information:
 🎓 Tutoring rates vary by subject and format
@@ -296,10 +497,10 @@ Get personalized pricing:
 👉 Schools: https://docs.google.com/forms/d/e/1FAIpQLSesPzdDEMUc_V5BXdZUjupEhSpgMaLMVQMz61TlD3CxyOFi6w/viewform?usp=sharing&ouid=116162016347061818487
 
 Or speak to a human agent - type '14'"""
-            },
-            
-            'complaint_concern': {
-                'default': """😔 I'm sorry to hear about your concern.
+    },
+    
+    'complaint_concern': {
+        'default': """😔 I'm sorry to hear about your concern.
 
 Your feedback is important to us. Let me connect you with a human agent who can address this properly.
 
@@ -308,14 +509,8 @@ Your feedback is important to us. Let me connect you with a human agent who can
 In the meantime, you can also:
 • Type 'menu' to explore our services
 • Share more details about your concern"""
-            }
-        }
-        
-        # Get role-specific response or default
-        intent_responses = responses.get(intent, {})
-        response = intent_responses.get(user_role, intent_responses.get('default'))
-        
-        return response
+    }
+}
 
 # Bot responses dictionary
 BOT_RESPONSES = {
@@ -433,119 +628,296 @@ Type 'back' to return to help menu or 'menu' for main menu
 Type 'back' to return to help menu or 'menu' for main menu
 """,
 
-    "14": """👨‍💼 A human agent will connect with you shortly. Please hold on…"""
+    "14": """👨‍💼 A human agent will connect with you shortly. Please hold on…""",
+
+    "media_received": """📎 Thank you, we have received your file.
+
+Our team will review it and get back to you. Add a message to tell us what it is about, or type 'menu' to see all our services.""",
+
+    "throttled": """⏳ You're sending messages faster than we can answer them.
+
+Please wait a moment, then send your message again.""",
+
+    "follow_up": """👋 Just checking in! Did you get a chance to fill in the form we sent?
+
+If you have any questions, reply here and we'll help, or type 'menu' to see all our services."""
+}
+
+# Analytics intent recorded for each menu response
+MENU_INTENTS = {
+    'greeting': 'main_menu',
+    '1': 'role_selection', '2': 'role_selection', '3': 'role_selection',
+    '4': 'role_selection', '5': 'role_selection', '6': 'role_selection',
+    '7': 'help_menu',
+    '11': 'about_us',
+    '12': 'initiatives',
+    '13': 'services',
+    '14': 'human_agent',
+    'media_received': 'media_received',
+    'throttled': 'throttled',
+    'follow_up': 'follow_up',
+}
+
+# Words that navigate the menus rather than ask a question
+NAVIGATION_COMMANDS = frozenset(['back', 'menu', 'start', 'main', 'help'])
+
+# Text alternatives to the numbered menu options
+TEXT_MAPPINGS = {
+    'teacher': '1',
+    'parent': '2', 'guardian': '2',
+    'student': '3',
+    'volunteer': '4',
+    'sponsor': '5',
+    'admin': '6', 'school admin': '6',
+    'mission': '11', 'vision': '11', 'values': '11',
+    'initiatives': '12',
+    'services': '13',
+    'human': '14', 'agent': '14'
+}
+
+# Replies that hand the conversation to a human agent
+HANDOFF_INTENTS = frozenset(['human_agent', 'complaint_concern'])
+
+class BotReply(str):
+    """Reply text that also records the intent and user role behind it, for analytics
+
+    ``template`` names the catalog entry the text came from, so message logs
+    can reference it instead of storing the text; it is None for dynamic text.
+    ``handed_back`` is True when the message took the conversation back from
+    a human agent, so the caller can close the handoff.
+    """
+
+    def __new__(cls, text, intent=None, role=None, template=None, handed_back=False):
+        reply = super().__new__(cls, text)
+        reply.intent = intent
+        reply.role = role
+        reply.template = template
+        reply.handed_back = handed_back
+        return reply
+
+# Follow-up questions answered in the context of the service discussed earlier
+FOLLOW_UP_TOPICS = {
+    'tutoring_inquiry': ("Tutoring", "https://forms.gle/eTkf1N9qrKZyNJr4A"),
+    'exam_prep': ("Exam preparation", "https://forms.gle/eTkf1N9qrKZyNJr4A"),
+    'homeschooling': ("Homeschooling", "https://forms.gle/eTkf1N9qrKZyNJr4A"),
+    'teacher_recruitment': ("Teacher recruitment", "https://docs.google.com/forms/d/e/1FAIpQLSesPzdDEMUc_V5BXdZUjupEhSpgMaLMVQMz61TlD3CxyOFi6w/viewform?usp=sharing&ouid=116162016347061818487"),
+    'school_services': ("Our school services", "https://docs.google.com/forms/d/e/1FAIpQLSesPzdDEMUc_V5BXdZUjupEhSpgMaLMVQMz61TlD3CxyOFi6w/viewform?usp=sharing&ouid=116162016347061818487"),
+}
+
+FOLLOW_UP_RESPONSES = {
+    'pricing_inquiry': """💰 {label} fees depend on the level, subjects and format you choose.
+
+Get a personalised quote:
+👉 {link}
+
+Or speak to a human agent - type '14'""",
+
+    'schedule_inquiry': """🗓 {label} sessions are scheduled around your availability.
+
+Tell us the days and times that work for you:
+👉 {link}
+
+Or speak to a human agent - type '14'""",
+
+    'location_inquiry': """📍 {label} is available virtually and physically, depending on your area.
+
+Share your location so we can match you:
+👉 {link}
+
+Or speak to a human agent - type '14'""",
 }
 
 class WhatsAppBot:
-    def __init__(self):
-        self.access_token = settings.WHATSAPP_ACCESS_TOKEN
-        self.phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
+    def __init__(self, session_store=None, http_session=None, tenant=None, config=None):
+        # ``config`` is the published BotConfig, if any; tenant overrides apply on top of it
+        intent_overrides = dict(config.intent_patterns) if config is not None else {}
+        response_overrides = dict(config.responses) if config is not None else {}
+        if tenant is not None:
+            # Each tenant gets its own credentials, catalog and connection pool
+            self.access_token = tenant.access_token
+            self.phone_number_id = tenant.phone_number_id
+            intent_overrides.update(tenant.intent_overrides)
+            response_overrides.update(tenant.response_overrides)
+            http_session = http_session or create_http_session()
+        else:
+            self.access_token = settings.WHATSAPP_ACCESS_TOKEN
+            self.phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
+        self.config_version = config.version if config is not None else None
+        priority_overrides = config.intent_priorities if config is not None else None
+        smart_overrides = config.smart_responses if config is not None else None
+        self.intent_recognizer = SmartIntentRecognizer(
+            intent_overrides, priority_overrides=priority_overrides, response_overrides=smart_overrides
+        )
+        # One compiled index per language, so matching cost does not grow with the number of languages
+        self.intent_recognizers = {ENGLISH: self.intent_recognizer}
+        for language in LANGUAGE_KEYWORDS:
+            self.intent_recognizers[language] = SmartIntentRecognizer(
+                language_patterns(self.intent_recognizer.intent_patterns, language),
+                priority_overrides=priority_overrides,
+                response_overrides=language_responses(smart_overrides, language),
+                fold_marks=True,
+                language=language,
+            )
+        self.responses = {**BOT_RESPONSES, **response_overrides} if response_overrides else BOT_RESPONSES
         self.api_url = f"https://graph.facebook.com/v18.0/{self.phone_number_id}/messages"
-        self.intent_recognizer = SmartIntentRecognizer()
+        self.session_store = session_store or DatabaseSessionStore(self.phone_number_id or '')
+        self.http = http_session or get_http_session()
 
     def process_message(self, phone_number, message):
         """Enhanced message processing with smart intent recognition"""
         try:
-            session, created = UserSession.objects.get_or_create(
-                phone_number=phone_number,
-                defaults={'current_state': 'greeting'}
-            )
+            session = self.session_store.get_or_create(phone_number)
         except Exception as db_error:
             logger.error(f"Database error, using stateless mode: {str(db_error)}")
             return self._process_message_stateless(phone_number, message)
         
-        message_lower = message.lower().strip()
-        
+        # Normalize once; every matching stage below reuses these tokens
+        tokens = tokenize(message)
+        message_lower = tokens.number or tokens.text
+
+        # While a human agent has the conversation the bot stays quiet, unless the user navigates away
+        handed_back = session.awaiting_agent
+        if handed_back:
+            if message_lower not in NAVIGATION_COMMANDS:
+                return BotReply('', 'agent_conversation', session.user_role)
+            session.awaiting_agent = False
+
+        reply = self._respond(session, tokens, message_lower)
+        if handed_back:
+            reply = BotReply(reply, reply.intent, reply.role, reply.template, handed_back=True)
+        if reply.intent in HANDOFF_INTENTS:
+            session.awaiting_agent = True
+            self.session_store.save(session)
+        return reply
+
+    def process_media(self, phone_number, caption=''):
+        """Reply to an image, voice note or document; a caption is answered like a text message"""
+        if caption:
+            return self.process_message(phone_number, caption)
+        try:
+            session = self.session_store.get_or_create(phone_number)
+        except Exception as db_error:
+            logger.error(f"Database error, using stateless mode: {str(db_error)}")
+            return self._menu_reply("media_received")
+        if session.awaiting_agent:
+            return BotReply('', 'agent_conversation', session.user_role)
+        return self._menu_reply("media_received", session.user_role)
+
+    def _respond(self, session, tokens, message_lower):
+        """Choose the reply to one normalized message, updating the session"""
         # First, check for smart intent recognition (unless it's a menu navigation)
-        if not message_lower.isdigit() and message_lower not in ['back', 'menu', 'start', 'main', 'help']:
-            intent, confidence = self.intent_recognizer.detect_intent(message)
+        if tokens.number is None and message_lower not in NAVIGATION_COMMANDS:
+            recent_intents = self._recent_intents(session)
+            language, recognizer = self.recognizer_for(tokens)
+            intent, confidence = recognizer.detect_intent(tokens, recent_intents)
             
             if confidence > 0.4:  # High confidence threshold
-                logger.info(f"Smart intent detected: {intent} (confidence: {confidence:.2f})")
+                logger.info(f"Smart intent detected: {intent} (confidence: {confidence:.2f}, language: {language})")
                 
                 # Get contextual response
-                smart_response = self.intent_recognizer.get_contextual_response(
-                    intent, confidence, session.user_role
+                topic = recognizer.follow_up_topic(intent, recent_intents)
+                smart_response = recognizer.get_contextual_response(
+                    intent, confidence, session.user_role, topic=topic
                 )
+                template = recognizer.response_template(intent, session.user_role, topic=topic)
                 
                 if smart_response:
                     # Update session with detected intent
                     session.last_intent = intent
                     session.intent_confidence = confidence
-                    session.save()
-                    return smart_response
+                    self._remember_turn(session, intent, confidence)
+                    self.session_store.save(session)
+                    return BotReply(smart_response, intent, session.user_role, template=template)
         
         # Handle back navigation
         if message_lower == 'back':
             if session.current_state == 'help_submenu':
                 session.current_state = 'help_menu'
-                session.save()
-                return BOT_RESPONSES["7"]
+                self.session_store.save(session)
+                return self._menu_reply("7", session.user_role)
             else:
                 session.current_state = 'greeting'
-                session.save()
-                return BOT_RESPONSES["greeting"]
+                self.session_store.save(session)
+                return self._menu_reply("greeting", session.user_role)
         
         # Handle menu navigation
         if message_lower in ['menu', 'start', 'main']:
             session.current_state = 'greeting'
-            session.save()
-            return BOT_RESPONSES["greeting"]
+            self.session_store.save(session)
+            return self._menu_reply("greeting", session.user_role)
         
         # Handle help commands
         if message_lower in ['help', '7']:
             session.current_state = 'help_menu'
-            session.save()
-            return BOT_RESPONSES["7"]
+            self.session_store.save(session)
+            return self._menu_reply("7", session.user_role)
         
         # Handle main menu options (1-6)
         if message_lower in ['1', '2', '3', '4', '5', '6']:
             session.current_state = 'role_selected'
             session.user_role = message_lower
-            session.save()
-            return BOT_RESPONSES[message_lower]
+            self.session_store.save(session)
+            return self._menu_reply(message_lower, session.user_role)
         
         # Handle help submenu options (11-14)
         if message_lower in ['11', '12', '13', '14']:
             session.current_state = 'help_submenu'
-            session.save()
-            return BOT_RESPONSES[message_lower]
+            self.session_store.save(session)
+            return self._menu_reply(message_lower, session.user_role)
         
         # Handle text alternatives
-        text_mappings = {
-            'teacher': '1',
-            'parent': '2', 'guardian': '2',
-            'student': '3',
-            'volunteer': '4',
-            'sponsor': '5',
-            'admin': '6', 'school admin': '6',
-            'mission': '11', 'vision': '11', 'values': '11',
-            'initiatives': '12',
-            'services': '13',
-            'human': '14', 'agent': '14'
-        }
-        
-        if message_lower in text_mappings:
-            mapped_option = text_mappings[message_lower]
+        if message_lower in TEXT_MAPPINGS:
+            mapped_option = TEXT_MAPPINGS[message_lower]
             if mapped_option in ['1', '2', '3', '4', '5', '6']:
                 session.current_state = 'role_selected'
                 session.user_role = mapped_option
-                session.save()
-                return BOT_RESPONSES[mapped_option]
+                self.session_store.save(session)
+                return self._menu_reply(mapped_option, session.user_role)
             else:
                 session.current_state = 'help_submenu'
-                session.save()
-                return BOT_RESPONSES[mapped_option]
+                self.session_store.save(session)
+                return self._menu_reply(mapped_option, session.user_role)
         
         # If no specific intent detected, show contextual response based on user role
         if session.user_role:
-            return self._get_role_specific_help(session.user_role)
+            return BotReply(
+                self._get_role_specific_help(session.user_role), 'fallback', session.user_role,
+                template=f"role_help.{session.user_role}"
+            )
         
         # Default: show greeting
         session.current_state = 'greeting'
-        session.save()
-        return BOT_RESPONSES["greeting"]
+        self.session_store.save(session)
+        return BotReply(self.responses["greeting"], 'fallback', template="menu.greeting")
     
+    def recognizer_for(self, tokens):
+        """The language of ``tokens`` and the intent recognizer compiled for it"""
+        language = language_identifier.identify(tokens)
+        return language, self.intent_recognizers.get(language, self.intent_recognizer)
+
+    def throttle_notice(self):
+        """Reply sent once to a sender who is over the inbound flood limit"""
+        return self._menu_reply("throttled")
+
+    def follow_up_reply(self):
+        """Nudge sent to a user who went quiet after being sent a form"""
+        return self._menu_reply("follow_up")
+
+    def _menu_reply(self, key, user_role=None):
+        """Menu response for ``key``, labelled with its analytics intent"""
+        return BotReply(self.responses[key], MENU_INTENTS[key], user_role, template=f"menu.{key}")
+
+    def _recent_intents(self, session):
+        """Intents from the session's recent turns that still count as context, oldest first"""
+        cutoff = time.time() - RECENT_TURNS_WINDOW
+        return [intent for intent, confidence, at in session.recent_turns or () if at >= cutoff]
+
+    def _remember_turn(self, session, intent, confidence):
+        """Append a turn to the session's bounded ring buffer of [intent, confidence, unix time]"""
+        turns = list(session.recent_turns or ())
+        turns.append([intent, round(confidence, 2), int(time.time())])
+        session.recent_turns = turns[-RECENT_TURNS_LIMIT:]
+
     def _get_role_specific_help(self, user_role):
         """Provide contextual help based on user role"""
         role_help = {
@@ -614,55 +986,52 @@ Ready to transform your school?
 👉 Request services: https://docs.google.com/forms/d/e/1FAIpQLSesPzdDEMUc_V5BXdZUjupEhSpgMaLMVQMz61TlD3CxyOFi6w/viewform?usp=sharing&ouid=116162016347061818487"""
         }
         
-        return role_help.get(user_role, BOT_RESPONSES["greeting"])
+        return role_help.get(user_role, self.responses["greeting"])
     
     def _process_message_stateless(self, phone_number, message):
         """Stateless fallback processing when database is unavailable"""
-        message_lower = message.lower().strip()
+        tokens = tokenize(message)
+        message_lower = tokens.number or tokens.text
         
         # Handle help commands
         if message_lower in ['help', '7']:
-            return BOT_RESPONSES["7"]
+            return self._menu_reply("7")
         
         # Handle main menu options (1-6)
         if message_lower in ['1', '2', '3', '4', '5', '6']:
-            return BOT_RESPONSES[message_lower]
+            return self._menu_reply(message_lower, message_lower)
         
         # Handle help submenu options (11-14)
         if message_lower in ['11', '12', '13', '14']:
-            return BOT_RESPONSES[message_lower]
+            return self._menu_reply(message_lower)
         
         # Handle back navigation - return to help menu
         if message_lower == 'back':
-            return BOT_RESPONSES["7"]
+            return self._menu_reply("7")
         
         # Handle menu navigation
         if message_lower in ['menu', 'start', 'main']:
-            return BOT_RESPONSES["greeting"]
+            return self._menu_reply("greeting")
         
         # Handle text alternatives
-        text_mappings = {
-            'teacher': '1',
-            'parent': '2', 'guardian': '2',
-            'student': '3',
-            'volunteer': '4',
-            'sponsor': '5',
-            'admin': '6', 'school admin': '6',
-            'mission': '11', 'vision': '11', 'values': '11',
-            'initiatives': '12',
-            'services': '13',
-            'human': '14', 'agent': '14'
-        }
-        
-        if message_lower in text_mappings:
-            mapped_option = text_mappings[message_lower]
-            return BOT_RESPONSES[mapped_option]
+        if message_lower in TEXT_MAPPINGS:
+            mapped_option = TEXT_MAPPINGS[message_lower]
+            return self._menu_reply(mapped_option)
         
         # Default: show greeting for any unrecognized input
-        return BOT_RESPONSES["greeting"]
+        return BotReply(self.responses["greeting"], 'fallback', template="menu.greeting")
 
     def send_message(self, phone_number, message):
-        """Send message via WhatsApp API"""
+        """Send message via WhatsApp API, returning the Graph API message id or None on failure"""
+        message_id, error = self.post_message(phone_number, message)
+        return message_id
+
+    def post_message(self, phone_number, message):
+        """Send message via WhatsApp API, returning (message_id, error)
+
+        ``error`` is None on success, otherwise a short failure reason such as
+        'http_429', 'timeout' or 'connection_error'.
+        """
         headers = {
             'Authorization': f'Bearer {self.access_token}',
             'Content-Type': 'application/json'
@@ -680,16 +1049,27 @@ Ready to transform your school?
             logger.info(f"Request URL: {self.api_url}")
             logger.info(f"Request data: {json.dumps(data, indent=2)}")
             
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                data=json.dumps(data)
-            )
+            with TimedHttpCall('POST', self.api_url) as call:
+                response = self.http.post(
+                    self.api_url,
+                    headers=headers,
+                    data=json.dumps(data),
+                    timeout=SEND_TIMEOUT
+                )
+                call.status = response.status_code
             
             logger.info(f"Response status: {response.status_code}")
             logger.info(f"Response body: {response.text}")
             
-            return response.status_code == 200
+            if response.status_code != 200:
+                return None, f"http_{response.status_code}"
+            return response.json()["messages"][0]["id"], None
+        except requests.Timeout:
+            logger.error(f"Timed out sending message to {phone_number}")
+            return None, "timeout"
+        except requests.ConnectionError as e:
+            logger.error(f"Connection error sending message: {str(e)}")
+            return None, "connection_error"
         except Exception as e:
             logger.error(f"Error sending message: {str(e)}", exc_info=True)
-            return False
+            return None, "error"
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .bot_logic import BotReply
+from .models import BroadcastRecipient, MessageLog, UserSession
+from .response_templates import outgoing_content
+from .rollups import record_message
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Blocking token bucket shared by the sender threads"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BroadcastReport:
+    """Throughput and failure counts for one broadcast run"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0  # Already claimed by an earlier run
+        self.failures = Counter()
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def sends_per_second(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+def iter_recipient_pages(broadcast, page_size):
+    """Yield pages of (session id, phone number) after the broadcast's checkpoint, by keyset pagination"""
+    queryset = UserSession.objects.filter(phone_number_id=broadcast.phone_number_id).order_by('id')
+    if broadcast.user_role:
+        queryset = queryset.filter(user_role=broadcast.user_role)
+
+    last_id = broadcast.last_session_id
+    while True:
+        page = list(queryset.filter(id__gt=last_id).values_list('id', 'phone_number')[:page_size])
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+
+
+def claim_recipients(broadcast, phone_numbers):
+    """Record recipients before sending so a resumed run never messages them twice
+
+    Returns only the phone numbers this call inserted, with one
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, so of two concurrent runs
+    over the same page each recipient goes to exactly one of them.
+    """
+    if not phone_numbers:
+        return []
+    connection = connections[router.db_for_write(BroadcastRecipient)]
+    qn = connection.ops.quote_name
+    table = qn(BroadcastRecipient._meta.db_table)
+
+    params = []
+    for phone_number in phone_numbers:
+        params.extend([broadcast.pk, phone_number, 'claimed'])
+    values = ", ".join(["(%s, %s, %s)"] * len(phone_numbers))
+    sql = (
+        f"INSERT INTO {table} ({qn('broadcast_id')}, {qn('phone_number')}, {qn('status')}) "
+        f"VALUES {values} "
+        f"ON CONFLICT ({qn('broadcast_id')}, {qn('phone_number')}) DO NOTHING "
+        f"RETURNING {qn('phone_number')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        claimed = {row[0] for row in cursor.fetchall()}
+    return [phone_number for phone_number in phone_numbers if phone_number in claimed]
+
+
+def run_broadcast(broadcast, bot, rate=20, concurrency=8, page_size=500, progress=None):
+    """Send a broadcast to every matching session, resuming from its checkpoint
+
+    Each page of recipients is claimed in broadcast_recipients before any
+    message goes out, and the checkpoint only advances once the whole page
+    has been sent and recorded. A crash therefore never double-sends: claimed
+    recipients whose send was interrupted stay 'claimed' and are skipped.
+    """
+    report = BroadcastReport()
+    limiter = RateLimiter(rate)
+
+    if broadcast.started_at is None:
+        broadcast.started_at = timezone.now()
+    broadcast.status = 'running'
+    broadcast.save(update_fields=['status', 'started_at'])
+
+    def send(phone_number):
+        limiter.acquire()
+        return phone_number, bot.post_message(phone_number, broadcast.message)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for page in iter_recipient_pages(broadcast, page_size):
+            phone_numbers = [phone for _, phone in page]
+            to_send = claim_recipients(broadcast, phone_numbers)
+            report.skipped += len(phone_numbers) - len(to_send)
+
+            results = list(executor.map(send, to_send))
+            _record_page(broadcast, page[-1][0], results, report)
+
+            if progress:
+                progress(report)
+
+    broadcast.status = 'completed'
+    broadcast.finished_at = timezone.now()
+    broadcast.save(update_fields=['status', 'finished_at'])
+    return report
+
+
+def _record_page(broadcast, last_session_id, results, report):
+    recipients = []
+    logs = []
+    page_failures = Counter()
+    # Every recipient gets the same text, so log it once as a template
+    content = outgoing_content(BotReply(broadcast.message, template=f"broadcast.{broadcast.pk}"))
+
+    for phone_number, (message_id, error) in results:
+        if error is None:
+            report.sent += 1
+            broadcast.sent_count += 1
+            logs.append(MessageLog(
+                phone_number_id=broadcast.phone_number_id,
+                phone_number=phone_number,
+                message_type="outgoing",
+                **content,
+                wa_message_id=message_id
+            ))
+        else:
+            report.failed += 1
+            broadcast.failed_count += 1
+            page_failures[error] += 1
+        recipients.append((phone_number, message_id, error))
+
+    report.failures.update(page_failures)
+    if logs:
+        record_message("outgoing", "broadcast", broadcast.user_role, count=len(logs))
+    for error, count in page_failures.items():
+        broadcast.failure_breakdown[error] = broadcast.failure_breakdown.get(error, 0) + count
+    broadcast.last_session_id = last_session_id
+
+    with transaction.atomic():
+        claimed = {
+            recipient.phone_number: recipient
+            for recipient in BroadcastRecipient.objects.filter(
+                broadcast=broadcast, phone_number__in=[phone_number for phone_number, _, _ in recipients]
+            )
+        }
+        for phone_number, message_id, error in recipients:
+            recipient = claimed[phone_number]
+            recipient.status = 'sent' if error is None else 'failed'
+            recipient.error = error
+            recipient.wa_message_id = message_id
+        BroadcastRecipient.objects.bulk_update(claimed.values(), ['status', 'error', 'wa_message_id'])
+        MessageLog.objects.bulk_create(logs)
+        broadcast.save(update_fields=['sent_count', 'failed_count', 'failure_breakdown', 'last_session_id'])
@@ -0,0 +1,179 @@
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .bot_logic import NAVIGATION_COMMANDS, TEXT_MAPPINGS
+from .tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def merge_messages(messages):
+    """One text message standing for several from the same sender, keeping the last one's id and time
+
+    The originals stay in ``parts`` so each is still logged as the user sent it.
+    """
+    last = messages[-1]
+    if len(messages) == 1:
+        return last
+    return last._replace(type='text', body=' '.join(message.body for message in messages if message.body),
+                         parts=tuple(messages))
+
+
+def stands_alone(message):
+    """True for a message that is a menu choice by itself ('2', 'parent', 'back'), which is never merged"""
+    if message.type != 'text':
+        return True
+    tokens = tokenize(message.body)
+    return tokens.number is not None or tokens.text in NAVIGATION_COMMANDS or tokens.text in TEXT_MAPPINGS
+
+
+def coalesce_batch(messages):
+    """Merge consecutive text messages from the same sender within one webhook delivery"""
+    merged = []
+    run = []
+    for message in messages:
+        alone = stands_alone(message)
+        if run and (alone or message.phone_number != run[-1].phone_number):
+            merged.append(merge_messages(run))
+            run = []
+        if alone:
+            merged.append(message)
+        else:
+            run.append(message)
+    if run:
+        merged.append(merge_messages(run))
+    return merged
+
+
+class _Burst:
+    __slots__ = ('last_at', 'pending', 'due')
+
+    def __init__(self, last_at):
+        self.last_at = last_at
+        self.pending = []
+        self.due = None
+
+
+class MessageCoalescer:
+    """Merges a sender's quick follow-up messages into one turn
+
+    The first text message from a sender is handled at once, so a single
+    message waits for nothing. Text messages arriving within ``window``
+    seconds of the sender's previous one are held, and once the sender has
+    been quiet for ``window`` seconds they are handed to ``handler`` as one
+    merged message: 'hi', 'I need', 'a maths tutor' cost two replies rather
+    than three. A burst is flushed early once it holds ``max_messages``, and
+    a menu choice such as '2' or 'back' flushes it and is handled as its own
+    turn, so it is never read as part of a sentence.
+
+    Held messages are flushed by a background thread, so this needs a
+    long-running process; with a ``window`` of 0 every message is handled
+    at once.
+    """
+
+    def __init__(self, window, handler, max_messages=10, max_senders=10000):
+        self.window = window
+        self.handler = handler
+        self.max_messages = max_messages
+        self.max_senders = max_senders
+        self._bursts = OrderedDict()  # (phone_number_id, phone number) -> _Burst
+        self._due = []  # Heap of (due, sequence, key); stale entries are skipped when popped
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def offer(self, phone_number_id, message):
+        """True when ``message`` should be handled now; False when it is held for a merged turn"""
+        if not self.window or message.type != 'text':
+            return True
+        key = (phone_number_id, message.phone_number)
+        now = time.monotonic()
+        flush = None
+        with self._condition:
+            burst = self._bursts.get(key)
+            handle_now = (burst is None or stands_alone(message)
+                          or (not burst.pending and now - burst.last_at > self.window))
+            if handle_now:
+                if burst is not None:
+                    # What the sender wrote before a menu choice goes first, as its own turn
+                    flush = burst.pending
+                    burst.pending, burst.due = [], None
+                self._bursts[key] = _Burst(now)
+                self._bursts.move_to_end(key)
+                self._evict()
+            else:
+                self._bursts.move_to_end(key)
+                burst.last_at = now
+                burst.pending.append(message)
+                if len(burst.pending) >= self.max_messages:
+                    flush, burst.pending, burst.due = burst.pending, [], None
+                else:
+                    burst.due = now + self.window
+                    self._sequence += 1
+                    heapq.heappush(self._due, (burst.due, self._sequence, key))
+                    self._start()
+                    self._condition.notify()
+        if flush:
+            self._handle(phone_number_id, flush)
+        return handle_now
+
+    def pending(self):
+        with self._condition:
+            return sum(len(burst.pending) for burst in self._bursts.values())
+
+    def _evict(self):
+        # Forget the least recently seen senders that have nothing held
+        while len(self._bursts) > self.max_senders:
+            key, burst = next(iter(self._bursts.items()))
+            if burst.pending:
+                self._bursts.move_to_end(key)
+                break
+            del self._bursts[key]
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='message-coalescer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due:
+                    self._condition.wait()
+                due, _, key = self._due[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._due)
+                burst = self._bursts.get(key)
+                if burst is None or burst.due != due or not burst.pending:
+                    continue
+                messages, burst.pending, burst.due = burst.pending, [], None
+                burst.last_at = time.monotonic()
+
+            close_old_connections()
+            try:
+                self._handle(key[0], messages)
+            finally:
+                close_old_connections()
+
+    def _handle(self, phone_number_id, messages):
+        try:
+            self.handler(phone_number_id, merge_messages(messages))
+        except Exception as handler_error:
+            logger.error(f"Error handling {len(messages)} coalesced message(s): {str(handler_error)}")
+
+
+def build_coalescer(handler):
+    return MessageCoalescer(
+        window=getattr(settings, 'WHATSAPP_COALESCE_WINDOW', 0),
+        handler=handler,
+        max_messages=getattr(settings, 'WHATSAPP_COALESCE_MAX_MESSAGES', 10),
+    )
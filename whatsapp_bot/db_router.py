@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+PRIMARY_READS_SESSION_KEY = 'whatsapp_bot_primary_reads_until'
+
+# Labels of the models written inside the current use_replica() block, or None outside one
+_replica_reads = ContextVar('replica_reads', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """Send reads inside this block (admin list views, exports, analytics) to the read replica
+
+    Writes still go to the primary, and once a model has been written inside
+    the block its reads go back to the primary too, so the block always reads
+    its own writes. Without a configured replica this changes nothing.
+    """
+    token = _replica_reads.set(set())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the primary unless a use_replica() block asks for the replica; writes always go to the primary
+
+    The webhook never enters use_replica(), so its session reads and writes
+    always see the primary's latest state.
+    """
+
+    def db_for_read(self, model, **hints):
+        written = _replica_reads.get()
+        if written is None or not replica_configured():
+            return None
+        if model._meta.label_lower in written:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        written = _replica_reads.get()
+        if written is not None:
+            written.add(model._meta.label_lower)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary's schema through replication
+        return db != REPLICA_DB_ALIAS
+
+
+def pin_primary_reads(request):
+    """After an admin write, keep this user's list views on the primary until the replica has caught up"""
+    lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+    if lag and hasattr(request, 'session'):
+        request.session[PRIMARY_READS_SESSION_KEY] = time.time() + lag
+
+
+def primary_reads_pinned(request):
+    return hasattr(request, 'session') and request.session.get(PRIMARY_READS_SESSION_KEY, 0) > time.time()
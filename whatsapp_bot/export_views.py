@@ -0,0 +1,36 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .exports import EXPORT_FORMATS, export_chunks, export_queryset, iter_messages, parse_day
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+
+@staff_member_required
+@require_GET
+@gzip_page
+def export_messages(request):
+    """Stream message logs as NDJSON or CSV, gzipped on the fly for clients that accept it
+
+    Query parameters: format (ndjson or csv), since and until (YYYY-MM-DD,
+    until is exclusive), phone (repeatable) and direction (incoming or outgoing).
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Invalid format, expected one of {', '.join(EXPORT_FORMATS)}")
+    try:
+        queryset = export_queryset(
+            since=parse_day(request.GET['since']) if request.GET.get('since') else None,
+            until=parse_day(request.GET['until']) if request.GET.get('until') else None,
+            phone_numbers=request.GET.getlist('phone'),
+            direction=request.GET.get('direction'),
+        )
+    except ValueError as filter_error:
+        return HttpResponseBadRequest(str(filter_error))
+
+    response = StreamingHttpResponse(export_chunks(iter_messages(queryset), export_format),
+                                     content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="messages.{export_format}"'
+    return response
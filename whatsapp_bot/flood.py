@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Decisions for one inbound message
+ALLOW, NOTIFY, DROP = 'allow', 'notify', 'drop'
+
+
+class FloodMetrics:
+    """Counts of allowed, throttled (notified) and dropped messages in this process"""
+
+    def __init__(self):
+        self._counts = {ALLOW: 0, NOTIFY: 0, DROP: 0}
+        self._lock = threading.Lock()
+
+    def record(self, decision):
+        with self._lock:
+            self._counts[decision] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'allowed': self._counts[ALLOW], 'throttled': self._counts[NOTIFY], 'dropped': self._counts[DROP]}
+
+
+class MemoryFloodLimiter:
+    """Token bucket per sender: ``burst`` messages at once, refilled at ``rate`` messages per second
+
+    Buckets live in an LRU dict of at most ``max_senders`` entries; the
+    least recently seen sender is forgotten first, and a forgotten bucket
+    would have refilled anyway. A sender who runs dry gets NOTIFY once and
+    DROP for every further message until the bucket has a token again.
+    """
+
+    def __init__(self, rate, burst, max_senders=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_senders = max_senders
+        self.metrics = FloodMetrics()
+        self._buckets = OrderedDict()  # sender -> [tokens, updated at, notified]
+        self._lock = threading.Lock()
+
+    def check(self, phone_number_id, phone_number):
+        if not self.rate:
+            return ALLOW
+        key = (phone_number_id, phone_number)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, False]
+                while len(self._buckets) > self.max_senders:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = False
+                decision = ALLOW
+            elif bucket[2]:
+                decision = DROP
+            else:
+                bucket[2] = True
+                decision = NOTIFY
+        self.metrics.record(decision)
+        return decision
+
+
+class CacheFloodLimiter:
+    """Sliding-window counter per sender in a shared Django cache, for deployments with several instances
+
+    Allows ``burst`` messages per ``burst / rate`` seconds, estimating the
+    sliding window from the current and previous fixed windows' counters.
+    Counters use the cache's atomic incr, and the single notice per window is
+    claimed with add, so two instances never both notify. A cache outage
+    lets messages through rather than dropping them.
+    """
+
+    def __init__(self, rate, burst, cache_alias):
+        self.rate = rate
+        self.burst = burst
+        self.window = burst / rate if rate else 0
+        self.cache = caches[cache_alias]
+        self.metrics = FloodMetrics()
+
+    def check(self, phone_number_id, phone_number):
+        if not self.rate:
+            return ALLOW
+        now = time.time()
+        index = int(now // self.window)
+        prefix = f"flood:{phone_number_id}:{phone_number}"
+        try:
+            current_key = f"{prefix}:{index}"
+            # Counters outlive their window so the next one can read them as "previous"
+            self.cache.add(current_key, 0, timeout=int(self.window * 2) + 1)
+            count = self.cache.incr(current_key)
+            previous = self.cache.get(f"{prefix}:{index - 1}", 0)
+            elapsed = now / self.window - index
+            estimate = previous * (1 - elapsed) + count
+            if estimate <= self.burst:
+                decision = ALLOW
+            elif self.cache.add(f"{prefix}:notified:{index}", 1, timeout=int(self.window) + 1):
+                decision = NOTIFY
+            else:
+                decision = DROP
+        except Exception as cache_error:
+            logger.error(f"Flood limiter cache error, allowing message: {str(cache_error)}")
+            decision = ALLOW
+        self.metrics.record(decision)
+        return decision
+
+
+def build_flood_limiter():
+    rate = getattr(settings, 'WHATSAPP_FLOOD_RATE', 0)
+    burst = getattr(settings, 'WHATSAPP_FLOOD_BURST', 10)
+    cache_alias = getattr(settings, 'WHATSAPP_FLOOD_CACHE', '')
+    if cache_alias:
+        return CacheFloodLimiter(rate, burst, cache_alias)
+    return MemoryFloodLimiter(rate, burst, max_senders=getattr(settings, 'WHATSAPP_FLOOD_MAX_SENDERS', 10000))
+
+
+flood_limiter = build_flood_limiter()
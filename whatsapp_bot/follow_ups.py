@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import FollowUp, MessageLog
+from .response_templates import outgoing_content
+from .rollups import record_message
+from .tenants import tenant_registry
+from .timing_wheel import TimingWheel
+
+logger = logging.getLogger(__name__)
+
+# Reply intents after which a user who goes quiet is nudged: each role reply sends a form link
+FOLLOW_UP_INTENTS = frozenset(['role_selection'])
+
+
+def claim_due(ids=None, limit=100, grace=None):
+    """Mark up to ``limit`` due pending follow-ups (of ``ids``, if given) as sending and return them
+
+    Rows locked by another dispatcher are skipped, so each follow-up is sent
+    once. Rows more than ``grace`` seconds overdue (WHATSAPP_FOLLOW_UP_GRACE)
+    are never claimed; recover_stale marks them expired.
+    """
+    grace = getattr(settings, 'WHATSAPP_FOLLOW_UP_GRACE', 21600) if grace is None else grace
+    now = timezone.now()
+    queryset = FollowUp.objects.filter(status='pending', due_at__lte=now, due_at__gte=now - timedelta(seconds=grace))
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    with transaction.atomic():
+        claimed = list(queryset.order_by('due_at').select_for_update(skip_locked=True)[:limit])
+        FollowUp.objects.filter(pk__in=[follow_up.pk for follow_up in claimed]).update(status='sending', claimed_at=now)
+    return claimed
+
+
+def recover_stale(lease=None, grace=None):
+    """Put follow-ups stuck in sending back to pending and expire those too late to send; returns the counts
+
+    A dispatcher that dies between claiming and sending leaves its rows in
+    sending, so rows claimed more than ``lease`` seconds ago
+    (WHATSAPP_FOLLOW_UP_LEASE) are claimed again by the next dispatch. Rows
+    more than ``grace`` seconds overdue are marked expired rather than sent.
+    """
+    lease = getattr(settings, 'WHATSAPP_FOLLOW_UP_LEASE', 300) if lease is None else lease
+    grace = getattr(settings, 'WHATSAPP_FOLLOW_UP_GRACE', 21600) if grace is None else grace
+    now = timezone.now()
+    recovered = FollowUp.objects.filter(status='sending').filter(
+        Q(claimed_at__lt=now - timedelta(seconds=lease)) | Q(claimed_at__isnull=True)
+    ).update(status='pending', claimed_at=None)
+    expired = FollowUp.objects.filter(status='pending', due_at__lt=now - timedelta(seconds=grace)).update(status='expired')
+    if recovered or expired:
+        logger.info(f"Follow-ups recovered from sending: {recovered}, expired: {expired}")
+    return Counter(recovered=recovered, expired=expired)
+
+
+def answered(follow_ups):
+    """Ids of the follow-ups whose user has written since the follow-up was scheduled"""
+    if not follow_ups:
+        return set()
+    last_incoming = dict(
+        ((row['phone_number_id'], row['phone_number']), row['last'])
+        for row in MessageLog.objects.filter(
+            message_type='incoming',
+            phone_number__in={follow_up.phone_number for follow_up in follow_ups},
+            timestamp__gte=min(follow_up.created_at for follow_up in follow_ups),
+        ).values('phone_number_id', 'phone_number').annotate(last=Max('timestamp'))
+    )
+    return {
+        follow_up.pk for follow_up in follow_ups
+        if last_incoming.get((follow_up.phone_number_id, follow_up.phone_number), follow_up.created_at) > follow_up.created_at
+    }
+
+
+def dispatch_follow_ups(ids=None, limit=100):
+    """Send one batch of due follow-ups through send_message; returns counts of sent, failed and cancelled
+
+    Whether the user has written since is checked again here, since the
+    message may have reached another process than the one holding the timer.
+    """
+    follow_ups = claim_due(ids, limit)
+    counts = Counter()
+    if not follow_ups:
+        return counts
+
+    cancelled = answered(follow_ups)
+    logs = []
+    sent_intents = Counter()
+    now = timezone.now()
+    for follow_up in follow_ups:
+        if follow_up.pk in cancelled:
+            follow_up.status = 'cancelled'
+        else:
+            bot = tenant_registry.get_bot(follow_up.phone_number_id)
+            reply = bot.follow_up_reply()
+            message_id = bot.send_message(follow_up.phone_number, reply)
+            follow_up.status = 'sent' if message_id else 'failed'
+            follow_up.wa_message_id, follow_up.error, follow_up.sent_at = message_id, None if message_id else 'send_failed', now
+            logs.append(MessageLog(
+                phone_number_id=follow_up.phone_number_id,
+                phone_number=follow_up.phone_number,
+                message_type="outgoing",
+                **outgoing_content(reply),
+                wa_message_id=message_id,
+                delivery_status=None if message_id else "failed",
+            ))
+            sent_intents[reply.intent] += 1
+        counts[follow_up.status] += 1
+
+    # One write for the batch's logs, one per intent for its rollup counts and one for its statuses
+    MessageLog.objects.bulk_create(logs)
+    for intent, count in sent_intents.items():
+        record_message("outgoing", intent, count=count)
+    FollowUp.objects.bulk_update(follow_ups, ['status', 'wa_message_id', 'error', 'sent_at'])
+    logger.info(f"Dispatched {len(follow_ups)} follow-up(s): {dict(counts)}")
+    return counts
+
+
+class FollowUpScheduler:
+    """Schedules follow-ups in the database and fires them from an in-process timing wheel
+
+    The follow_ups table is the source of truth; the wheel only holds this
+    process's timers, so scheduling and cancelling cost O(1) however many
+    are pending. A background thread advances the wheel every ``tick``
+    seconds and dispatches what expired in batches of ``batch_size``, and
+    every ``sweep_interval`` seconds also dispatches overdue rows whose timer
+    was lost (a restarted process, or one that scheduled them and exited),
+    after recover_stale. The thread starts on first use once delays are
+    configured. On serverless hosts, run ``manage.py send_follow_ups`` from
+    a scheduler instead.
+    """
+
+    def __init__(self, delays, tick=1.0, batch_size=100, sweep_interval=60):
+        self.delays = delays  # Seconds after the enquiry for each nudge
+        self.tick = tick
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.wheel = TimingWheel(tick=tick, now=time.time())
+        self._by_sender = {}  # (phone_number_id, phone number) -> {follow-up id}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, phone_number_id, phone_number):
+        """Schedule a nudge for each configured delay, replacing this user's pending ones"""
+        if not self.delays:
+            return []
+        self.cancel(phone_number_id, phone_number)
+        now = timezone.now()
+        follow_ups = FollowUp.objects.bulk_create([
+            FollowUp(phone_number_id=phone_number_id, phone_number=phone_number, step=step,
+                     due_at=now + timedelta(seconds=delay), created_at=now)
+            for step, delay in enumerate(self.delays, start=1)
+        ])
+        key = (phone_number_id, phone_number)
+        with self._lock:
+            for follow_up in follow_ups:
+                self.wheel.schedule(follow_up.pk, follow_up.due_at.timestamp(), key)
+                self._by_sender.setdefault(key, set()).add(follow_up.pk)
+            self._start()
+        return follow_ups
+
+    def cancel(self, phone_number_id, phone_number):
+        """Cancel a user's pending follow-ups; costs nothing for users this process holds no timers for"""
+        with self._lock:
+            ids = self._by_sender.pop((phone_number_id, phone_number), ())
+            for follow_up_id in ids:
+                self.wheel.cancel(follow_up_id)
+            if self.delays:
+                self._start()
+        if ids:
+            FollowUp.objects.filter(pk__in=ids, status='pending').update(status='cancelled')
+        return len(ids)
+
+    def pending(self):
+        with self._lock:
+            return len(self.wheel)
+
+    def run_once(self, now=None):
+        """Advance the wheel to ``now`` and dispatch what expired; returns the dispatch counts"""
+        with self._lock:
+            expired = self.wheel.advance(time.time() if now is None else now)
+            for follow_up_id, key in expired:
+                ids = self._by_sender.get(key)
+                if ids is not None:
+                    ids.discard(follow_up_id)
+                    if not ids:
+                        del self._by_sender[key]
+        counts = Counter()
+        for start in range(0, len(expired), self.batch_size):
+            counts.update(dispatch_follow_ups([follow_up_id for follow_up_id, _ in expired[start:start + self.batch_size]],
+                                              limit=self.batch_size))
+        return counts
+
+    def sweep(self):
+        """Recover stale follow-ups, then dispatch overdue ones that no wheel fired, a batch at a time"""
+        counts = +recover_stale()
+        while True:
+            batch = dispatch_follow_ups(limit=self.batch_size)
+            counts.update(batch)
+            if sum(batch.values()) < self.batch_size:
+                return counts
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='follow-up-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        swept_at = time.monotonic()
+        while True:
+            time.sleep(self.tick)
+            close_old_connections()
+            try:
+                self.run_once()
+                if time.monotonic() - swept_at >= self.sweep_interval:
+                    swept_at = time.monotonic()
+                    self.sweep()
+            except Exception as dispatch_error:
+                logger.error(f"Error dispatching follow-ups: {str(dispatch_error)}")
+            finally:
+                close_old_connections()
+
+
+follow_up_scheduler = FollowUpScheduler(
+    delays=getattr(settings, 'WHATSAPP_FOLLOW_UP_DELAYS', []),
+    tick=getattr(settings, 'WHATSAPP_FOLLOW_UP_TICK', 1.0),
+    batch_size=getattr(settings, 'WHATSAPP_FOLLOW_UP_BATCH_SIZE', 100),
+    sweep_interval=getattr(settings, 'WHATSAPP_FOLLOW_UP_SWEEP_INTERVAL', 60),
+)
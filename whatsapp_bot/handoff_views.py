@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from .handoffs import (
+    ACTIVE_STATUSES, HandoffFeed, active_handoffs, claim_handoff, close_handoff, encode_event, handoff_data,
+    reply_to_handoff,
+)
+from .models import Handoff
+
+logger = logging.getLogger(__name__)
+
+# Comment lines sent on idle streams so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+
+
+@staff_member_required
+@require_GET
+def handoff_list(request):
+    """Open and claimed handoffs, oldest first"""
+    return JsonResponse({'handoffs': [handoff_data(handoff) for handoff in active_handoffs()]})
+
+
+@staff_member_required
+@require_POST
+def handoff_claim(request, pk):
+    handoff = get_object_or_404(Handoff, pk=pk, status__in=ACTIVE_STATUSES)
+    claim_handoff(handoff, request.user)
+    return JsonResponse(handoff_data(handoff))
+
+
+@staff_member_required
+@require_POST
+def handoff_reply(request, pk):
+    """Send the agent's reply to the user with WhatsAppBot.send_message"""
+    handoff = get_object_or_404(Handoff, pk=pk, status__in=ACTIVE_STATUSES)
+    text = request.POST.get('text')
+    if text is None and request.content_type == 'application/json':
+        try:
+            text = json.loads(request.body).get('text')
+        except (ValueError, AttributeError):
+            return HttpResponseBadRequest("Invalid JSON")
+    if not text or not text.strip():
+        return HttpResponseBadRequest("Missing text")
+
+    if handoff.status == 'open':
+        claim_handoff(handoff, request.user)
+    message_id = reply_to_handoff(handoff, text.strip())
+    return JsonResponse({'sent': message_id is not None, 'wa_message_id': message_id}, status=200 if message_id else 502)
+
+
+@staff_member_required
+@require_POST
+def handoff_close(request, pk):
+    handoff = get_object_or_404(Handoff, pk=pk, status__in=ACTIVE_STATUSES)
+    close_handoff(handoff)
+    return JsonResponse(handoff_data(handoff))
+
+
+def _is_staff(request):
+    return request.user.is_active and request.user.is_staff
+
+
+def handoff_stream(request):
+    """Server-Sent Events feed for agents: a snapshot of the queue, then handoffs and messages as they happen
+
+    Events come from polling the database every WHATSAPP_HANDOFF_POLL_SECONDS
+    (see HandoffFeed), so they reach every stream whichever process handled
+    the webhook. The stream ends after WHATSAPP_HANDOFF_STREAM_SECONDS so it
+    never holds a worker for long; the browser's EventSource reconnects and
+    gets a fresh snapshot.
+    """
+    if not _is_staff(request):
+        return HttpResponseForbidden("Staff only")
+
+    poll_seconds = getattr(settings, 'WHATSAPP_HANDOFF_POLL_SECONDS', 2)
+    lifetime = getattr(settings, 'WHATSAPP_HANDOFF_STREAM_SECONDS', 25)
+    feed = HandoffFeed()
+    snapshot = feed.snapshot()
+
+    def events():
+        yield f"retry: {int(poll_seconds * 1000)}\n\n"
+        yield encode_event('snapshot', {'handoffs': snapshot})
+        deadline = time.monotonic() + lifetime
+        sent_at = time.monotonic()
+        while time.monotonic() + poll_seconds < deadline:
+            time.sleep(poll_seconds)
+            for event_type, data in feed.poll():
+                sent_at = time.monotonic()
+                yield encode_event(event_type, data)
+            if time.monotonic() - sent_at >= HEARTBEAT_SECONDS:
+                sent_at = time.monotonic()
+                yield ": keepalive\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
@@ -0,0 +1,225 @@
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Handoff, MessageLog, UserSession
+from .response_templates import message_text
+from .tenants import tenant_registry
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['open', 'claimed']
+
+
+def encode_event(event_type, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def handoff_data(handoff):
+    return {
+        'id': handoff.pk,
+        'phone_number_id': handoff.phone_number_id,
+        'phone_number': handoff.phone_number,
+        'reason': handoff.reason,
+        'status': handoff.status,
+        'agent': handoff.agent.get_username() if handoff.agent_id else None,
+        'last_message': handoff.last_message,
+        'created_at': handoff.created_at,
+        'last_message_at': handoff.last_message_at,
+    }
+
+
+def active_handoffs():
+    """Open and claimed handoffs, oldest first (served by handoffs_queue_idx)"""
+    return Handoff.objects.filter(status__in=ACTIVE_STATUSES).select_related('agent').order_by('created_at')
+
+
+class HandoffFeed:
+    """Agent events for one stream, read from the database so changes made by any process show up
+
+    Each ``poll`` reads the open and claimed handoffs and compares them with
+    the previous read: new handoffs, claims, inbound messages and closes
+    come from the differences, and agents' replies from the outgoing
+    message_logs of claimed conversations since the previous poll.
+    """
+
+    def __init__(self):
+        self._seen = {}  # handoff id -> handoff_data at the previous read
+        self._since = None
+
+    def snapshot(self):
+        """The active handoffs now; later polls report changes from this point"""
+        self._since = timezone.now()
+        handoffs = [handoff_data(handoff) for handoff in active_handoffs()]
+        self._seen = {item['id']: item for item in handoffs}
+        return handoffs
+
+    def poll(self):
+        """[(event type, data), ...] for what changed since the last snapshot or poll"""
+        since, self._since = self._since, timezone.now()
+        current = {item['id']: item for item in map(handoff_data, active_handoffs())}
+        events = []
+        for pk, item in current.items():
+            previous = self._seen.get(pk)
+            if previous is None:
+                events.append(('handoff', item))
+                continue
+            if (item['status'], item['agent']) != (previous['status'], previous['agent']):
+                events.append(('claimed', item))
+            if item['last_message_at'] != previous['last_message_at']:
+                events.append(('message', {
+                    'handoff': pk,
+                    'phone_number': item['phone_number'],
+                    'direction': 'incoming',
+                    'text': item['last_message'],
+                    'timestamp': item['last_message_at'],
+                }))
+
+        closed = [pk for pk in self._seen if pk not in current]
+        if closed:
+            events.extend(
+                ('closed', handoff_data(handoff))
+                for handoff in Handoff.objects.filter(pk__in=closed).select_related('agent').order_by('closed_at')
+            )
+
+        claimed = {(item['phone_number_id'], item['phone_number']): item
+                   for item in current.values() if item['status'] == 'claimed'}
+        if claimed:
+            replies = MessageLog.objects.filter(
+                message_type='outgoing', timestamp__gte=since, phone_number__in={key[1] for key in claimed},
+            ).annotate(text=message_text()).order_by('timestamp', 'id').values(
+                'phone_number_id', 'phone_number', 'text', 'wa_message_id', 'timestamp')
+            for reply in replies:
+                item = claimed.get((reply['phone_number_id'], reply['phone_number']))
+                if item is not None:
+                    events.append(('message', {
+                        'handoff': item['id'],
+                        'phone_number': reply['phone_number'],
+                        'direction': 'outgoing',
+                        'agent': item['agent'],
+                        'text': reply['text'],
+                        'sent': reply['wa_message_id'] is not None,
+                        'timestamp': reply['timestamp'],
+                    }))
+
+        self._seen = current
+        return events
+
+
+def open_handoff(phone_number_id, phone_number, reason, message):
+    """Queue a conversation for the agents; a conversation that already has one just gets the new message"""
+    try:
+        with transaction.atomic():
+            handoff = Handoff.objects.create(
+                phone_number_id=phone_number_id,
+                phone_number=phone_number,
+                reason=reason,
+                last_message=message,
+            )
+    except IntegrityError:
+        return record_inbound(phone_number_id, phone_number, message)
+
+    logger.info(f"Opened handoff #{handoff.pk} for {phone_number} ({reason})")
+    return handoff
+
+
+def record_inbound(phone_number_id, phone_number, message):
+    """Pass a message from a handed-off user on to the agents
+
+    A handoff no agent has claimed within WHATSAPP_HANDOFF_TIMEOUT is closed
+    instead, so the user's next message is answered by the bot again.
+    """
+    handoff = Handoff.objects.filter(
+        phone_number_id=phone_number_id, phone_number=phone_number, status__in=ACTIVE_STATUSES
+    ).first()
+    if handoff is None:
+        return None
+    cutoff = unclaimed_cutoff()
+    if handoff.status == 'open' and cutoff is not None and handoff.created_at < cutoff:
+        expire_handoff(handoff)
+        return None
+
+    handoff.last_message = message
+    handoff.last_message_at = timezone.now()
+    Handoff.objects.filter(pk=handoff.pk).update(
+        last_message=handoff.last_message, last_message_at=handoff.last_message_at
+    )
+    return handoff
+
+
+def claim_handoff(handoff, agent):
+    handoff.status = 'claimed'
+    handoff.agent = agent
+    handoff.claimed_at = timezone.now()
+    handoff.save(update_fields=['status', 'agent', 'claimed_at'])
+
+
+def reply_to_handoff(handoff, text):
+    """Send an agent's reply through the tenant's bot and log it; returns the Graph API message id or None"""
+    bot = tenant_registry.get_bot(handoff.phone_number_id)
+    message_id = bot.send_message(handoff.phone_number, text)
+    MessageLog.objects.create(
+        phone_number_id=handoff.phone_number_id,
+        phone_number=handoff.phone_number,
+        message_type='outgoing',
+        message_content=text,
+        wa_message_id=message_id,
+        delivery_status=None if message_id else 'failed',
+    )
+    return message_id
+
+
+def close_handoff(handoff):
+    """Close the handoff and hand the conversation back to the bot"""
+    with transaction.atomic():
+        handoff.status = 'closed'
+        handoff.closed_at = timezone.now()
+        handoff.save(update_fields=['status', 'closed_at'])
+        UserSession.objects.filter(
+            phone_number_id=handoff.phone_number_id, phone_number=handoff.phone_number
+        ).update(awaiting_agent=False)
+
+
+def release_handoff(phone_number_id, phone_number):
+    """Close a user's active handoff after they navigated back to the bot, so agents stop replying"""
+    handoff = Handoff.objects.filter(
+        phone_number_id=phone_number_id, phone_number=phone_number, status__in=ACTIVE_STATUSES
+    ).select_related('agent').first()
+    if handoff is None:
+        return None
+    close_handoff(handoff)
+    logger.info(f"Closed handoff #{handoff.pk}: {phone_number} went back to the bot")
+    return handoff
+
+
+def unclaimed_cutoff(timeout=None):
+    """Handoffs opened before this and still unclaimed have timed out (None when the timeout is 0)"""
+    timeout = getattr(settings, 'WHATSAPP_HANDOFF_TIMEOUT', 14400) if timeout is None else timeout
+    return timezone.now() - timedelta(seconds=timeout) if timeout else None
+
+
+def expire_handoff(handoff):
+    """Close a handoff no agent claimed in time and hand the user back to the bot; False if an agent just claimed it"""
+    with transaction.atomic():
+        if not Handoff.objects.filter(pk=handoff.pk, status='open').update(status='closed', closed_at=timezone.now()):
+            return False
+        UserSession.objects.filter(
+            phone_number_id=handoff.phone_number_id, phone_number=handoff.phone_number
+        ).update(awaiting_agent=False)
+    logger.info(f"Closed handoff #{handoff.pk}: no agent claimed it in time, {handoff.phone_number} is back with the bot")
+    return True
+
+
+def expire_unclaimed_handoffs(timeout=None):
+    """Close every handoff left unclaimed for longer than ``timeout`` seconds; returns how many were closed"""
+    cutoff = unclaimed_cutoff(timeout)
+    if cutoff is None:
+        return 0
+    stale = Handoff.objects.filter(status='open', created_at__lt=cutoff).order_by('created_at')
+    return sum(expire_handoff(handoff) for handoff in stale)
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+
+from .exports import keyset_after
+from .models import MessageLog, UserSession
+from .response_templates import message_text
+from .session_store import session_expired
+
+HISTORY_FIELDS = ('id', 'phone_number_id', 'message_type', 'text', 'timestamp', 'wa_message_id', 'delivery_status')
+
+
+def encode_cursor(timestamp, message_id):
+    """Opaque cursor pointing just after the message at (timestamp, id)"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp.isoformat(), message_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); raises ValueError for anything else"""
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def history_page(phone_number, cursor=None, limit=50, phone_number_id=None):
+    """One page of a user's messages, oldest first, and the cursor for the next page (None on the last)
+
+    The (timestamp, id) keyset walks message_logs_history_idx, so a page
+    deep into years of history costs the same as the first one.
+    """
+    queryset = MessageLog.objects.filter(phone_number=phone_number)
+    if phone_number_id is not None:
+        queryset = queryset.filter(phone_number_id=phone_number_id)
+    if cursor:
+        queryset = keyset_after(queryset, *decode_cursor(cursor))
+    # One extra row tells whether another page follows without a COUNT
+    rows = list(queryset.annotate(text=message_text()).order_by('timestamp', 'id').values(*HISTORY_FIELDS)[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+
+
+def session_data(session):
+    return {
+        'phone_number_id': session.phone_number_id,
+        'current_state': session.current_state,
+        'user_role': session.user_role,
+        'last_intent': session.last_intent,
+        'intent_confidence': session.intent_confidence,
+        'awaiting_agent': session.awaiting_agent,
+        # An expired session restarts from the greeting on the user's next message
+        'expired': session_expired(session, getattr(settings, 'WHATSAPP_SESSION_TTL', 0)),
+        'created_at': session.created_at,
+        'updated_at': session.updated_at,
+    }
+
+
+def user_sessions(phone_number, phone_number_id=None):
+    sessions = UserSession.objects.filter(phone_number=phone_number)
+    if phone_number_id is not None:
+        sessions = sessions.filter(phone_number_id=phone_number_id)
+    return [session_data(session) for session in sessions.order_by('phone_number_id')]
@@ -0,0 +1,33 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .history import history_page, user_sessions
+
+MAX_PAGE_SIZE = 500
+
+
+@staff_member_required
+@require_GET
+def conversation_history(request, phone_number):
+    """A user's session state and one page of their messages, oldest first
+
+    Query parameters: cursor (the previous page's next_cursor), limit
+    (default 50) and phone_number_id to restrict to one tenant.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 50)), MAX_PAGE_SIZE))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit")
+    phone_number_id = request.GET.get('phone_number_id')
+    try:
+        messages, next_cursor = history_page(phone_number, request.GET.get('cursor'), limit, phone_number_id)
+    except ValueError as cursor_error:
+        return HttpResponseBadRequest(str(cursor_error))
+
+    return JsonResponse({
+        'phone_number': phone_number,
+        'sessions': user_sessions(phone_number, phone_number_id),
+        'messages': messages,
+        'next_cursor': next_cursor,
+    })
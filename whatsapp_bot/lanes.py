@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .bot_logic import HANDOFF_INTENTS, TEXT_MAPPINGS
+from .tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+URGENT, NORMAL, LOW = 'urgent', 'normal', 'low'
+LANES = (URGENT, NORMAL, LOW)  # Highest priority first
+
+# Reply intents that put the user's following messages in the urgent lane
+URGENT_INTENTS = HANDOFF_INTENTS
+HANDOFF_REQUESTS = frozenset(['14'] + [alias for alias, option in TEXT_MAPPINGS.items() if option == '14'])
+
+
+class UrgentConversations:
+    """Phone numbers recently handed to a human or complaining, kept in the urgent lane for ``ttl`` seconds"""
+
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._marked = OrderedDict()  # phone number -> marked at
+        self._lock = threading.Lock()
+
+    def mark(self, phone_number):
+        with self._lock:
+            self._marked[phone_number] = time.monotonic()
+            self._marked.move_to_end(phone_number)
+            while len(self._marked) > self.max_size:
+                self._marked.popitem(last=False)
+
+    def is_urgent(self, phone_number):
+        marked_at = self._marked.get(phone_number)
+        return marked_at is not None and time.monotonic() - marked_at < self.ttl
+
+
+def lane_for(bot, message, urgent_conversations):
+    """Lane for an inbound message, from its intent and the conversation's recent state"""
+    if message.type != 'text':
+        # Reactions, stickers and media only get the generic reply
+        return URGENT if urgent_conversations.is_urgent(message.phone_number) else LOW
+    if urgent_conversations.is_urgent(message.phone_number):
+        return URGENT
+
+    tokens = tokenize(message.body)
+    if (tokens.number or tokens.text) in HANDOFF_REQUESTS:
+        return URGENT
+    # Any complaint wins the lane, even below the bot's reply threshold; a false alarm only costs a queue slot
+    intent = bot.recognizer_for(tokens)[1].match_intent(tokens)[0]
+    if intent in URGENT_INTENTS:
+        return URGENT
+    return NORMAL
+
+
+class LaneMetrics:
+    """Per-lane counts and queue-wait / end-to-end latency over the last ``window`` jobs"""
+
+    def __init__(self, window=1000):
+        self._samples = {lane: deque(maxlen=window) for lane in LANES}
+        self._processed = dict.fromkeys(LANES, 0)
+        self._promoted = dict.fromkeys(LANES, 0)
+        self._lock = threading.Lock()
+
+    def record(self, lane, waited, total, promoted=False):
+        with self._lock:
+            self._samples[lane].append((waited, total))
+            self._processed[lane] += 1
+            if promoted:
+                self._promoted[lane] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = {lane: list(values) for lane, values in self._samples.items()}
+            processed = dict(self._processed)
+            promoted = dict(self._promoted)
+
+        stats = {}
+        for lane in LANES:
+            waits = sorted(sample[0] for sample in samples[lane])
+            totals = sorted(sample[1] for sample in samples[lane])
+            stats[lane] = {
+                'processed': processed[lane],
+                'promoted': promoted[lane],
+                'wait_p50_ms': _percentile(waits, 0.5),
+                'wait_p95_ms': _percentile(waits, 0.95),
+                'wait_max_ms': _percentile(waits, 1.0),
+                'total_p50_ms': _percentile(totals, 0.5),
+                'total_p95_ms': _percentile(totals, 0.95),
+            }
+        return stats
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 1)
+
+
+class LaneScheduler:
+    """Runs jobs from the urgent lane before normal, and normal before low
+
+    With ``workers`` > 0 jobs are queued and run by that many daemon
+    threads; with 0 (the default, for deployments that must finish all work
+    inside the request) ``submit`` runs the job immediately and callers
+    order a batch with ``LANES`` themselves. A job that has waited
+    ``starvation_after`` seconds is run next whatever its lane, so a steady
+    stream of urgent work cannot starve the lower lanes. When more than
+    ``max_queued`` jobs are waiting, new jobs run in the submitting thread.
+
+    Jobs submitted with the same ``key`` (a sender) run one at a time in
+    submission order: while one is queued or running, the next waits in
+    that key's backlog and is handed on when it finishes, so two turns for
+    one user never race on their session.
+    """
+
+    def __init__(self, workers=0, starvation_after=2.0, max_queued=10000):
+        self.workers = workers
+        self.starvation_after = starvation_after
+        self.max_queued = max_queued
+        self.metrics = LaneMetrics()
+        self._queues = {lane: deque() for lane in LANES}
+        self._queued = 0
+        self._backlogs = {}  # key -> deque of (lane, job) waiting behind that key's queued or running job
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def submit(self, lane, fn, *args, key=None):
+        job = (time.monotonic(), fn, args, key)
+        with self._condition:
+            if key is not None:
+                backlog = self._backlogs.get(key)
+                if backlog is not None:
+                    backlog.append((lane, job))
+                    return
+                self._backlogs[key] = deque()
+            if self._enqueue(lane, job):
+                return
+        self._run_inline(lane, job)
+
+    def queued(self):
+        with self._condition:
+            queued = {lane: len(queue) for lane, queue in self._queues.items()}
+            for backlog in self._backlogs.values():
+                for lane, _ in backlog:
+                    queued[lane] += 1
+        return queued
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        for lane, count in self.queued().items():
+            stats[lane]['queued'] = count
+        return stats
+
+    def _enqueue(self, lane, job):
+        """Queue a job for the workers, called with the condition held; False when the caller must run it"""
+        if self.workers <= 0 or self._queued >= self.max_queued:
+            return False
+        self._start_workers()
+        self._queues[lane].append(job)
+        self._queued += 1
+        self._condition.notify()
+        return True
+
+    def _release(self, key):
+        """Hand a finished key's next job on; returns it when the caller must run it"""
+        if key is None:
+            return None
+        with self._condition:
+            backlog = self._backlogs[key]
+            if not backlog:
+                del self._backlogs[key]
+                return None
+            lane, job = backlog.popleft()
+            return None if self._enqueue(lane, job) else (lane, job)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"lane-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        """Pop the next job; called with the condition held and at least one job queued"""
+        now = time.monotonic()
+        waiting = [lane for lane in LANES if self._queues[lane]]
+        oldest = min(waiting, key=lambda lane: self._queues[lane][0][0])
+        if now - self._queues[oldest][0][0] >= self.starvation_after:
+            lane = oldest
+        else:
+            lane = waiting[0]
+        self._queued -= 1
+        return lane, self._queues[lane].popleft(), lane != waiting[0]
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queued:
+                    self._condition.wait()
+                lane, job, promoted = self._next_job()
+
+            close_old_connections()
+            try:
+                self._run_inline(lane, job, promoted)
+            finally:
+                close_old_connections()
+
+    def _run_inline(self, lane, job, promoted=False):
+        """Run a job, then any of its key's backlog that cannot be queued"""
+        while job is not None:
+            self._run(lane, job, promoted)
+            promoted = False
+            lane, job = self._release(job[3]) or (lane, None)
+
+    def _run(self, lane, job, promoted=False):
+        enqueued_at, fn, args, _ = job
+        started = time.monotonic()
+        try:
+            fn(*args)
+        except Exception as job_error:
+            logger.error(f"Error running {lane} lane job: {str(job_error)}")
+        finally:
+            self.metrics.record(lane, started - enqueued_at, time.monotonic() - enqueued_at, promoted)
+
+
+urgent_conversations = UrgentConversations(ttl=getattr(settings, 'WHATSAPP_URGENT_LANE_TTL', 1800))
+
+lane_scheduler = LaneScheduler(
+    workers=getattr(settings, 'WHATSAPP_LANE_WORKERS', 0),
+    starvation_after=getattr(settings, 'WHATSAPP_LANE_STARVATION_AFTER', 2.0),
+    max_queued=getattr(settings, 'WHATSAPP_LANE_MAX_QUEUED', 10000),
+)
@@ -0,0 +1,332 @@
+import math
+from functools import lru_cache
+from itertools import repeat
+
+from .tokenizer import normalize, plain_text, tokenize
+
+ENGLISH = 'en'
+
+MAX_TRIGRAMS = 80  # The start of a long message is enough to tell its language
+
+LANGUAGE_NAMES = {
+    'en': "English",
+    'pcm': "Nigerian Pidgin",
+    'yo': "Yoruba",
+    'ig': "Igbo",
+    'ha': "Hausa",
+}
+
+# Text the language identifier learns character trigrams from: the kind of
+# thing users write to the bot, typed with and without tone marks
+LANGUAGE_SAMPLES = {
+    'en': """
+        hello good morning i need a tutor for my child please how much do you charge for home tutoring
+        my son is preparing for his exams and needs help with mathematics and english
+        where are you located what time are the classes can i speak to someone
+        i want to volunteer with your literacy programme and i would like to sponsor a child
+        thank you very much what are your prices is it available online or physical
+        we are a school looking for qualified teachers and a management system
+        my daughter is struggling with reading can you help her this weekend
+    """,
+    'pcm': """
+        how far abeg i wan get lesson teacher for my pikin how much una dey collect
+        wetin dey happen my pikin dey write waec this year e need help for maths
+        una dey where abeg which time una dey open make i come see una
+        i no understand wetin una dey talk e no dey work since yesterday na wahala be this
+        how you dey i dey find work as teacher abeg wetin i go do
+        dem don tell me say una get better teachers na why i dey ask
+        abeg make una help me sharp sharp na my pikin exam be next week
+        wetin be the price for the lesson abeg talk true
+    """,
+    'yo': """
+        bawo ni e kaaro mo fe oluko fun omo mi elo ni e n gba fun eko ile
+        ẹ kú àárọ̀ ṣé ẹ ní olùkọ́ fún ìdánwò waec ọmọ mi nílò ìrànlọ́wọ́
+        nibo ni e wa aago melo ni kilaasi yin bere
+        mo fe ran yin lowo mo si fe se iranlowo fun awon omode
+        e jowo mi o ye mi isoro wa ko sise rara
+        e se pupo mo dupe ese o omo mi ko le ka iwe daadaa
+        se daadaa ni e nle o iye owo melo ni fun osu kan
+        a n wa awon oluko to peye fun ile iwe wa
+    """,
+    'ig': """
+        kedu ndewo achoro m onye nkuzi maka nwa m ego ole ka unu na-ana maka nkuzi n'ulo
+        ụtụtụ ọma biko nwa m choro enyemaka maka ule waec
+        ebee ka unu no oge ole ka klas unu na-amalite
+        achoro m inye aka ma kwado umuaka nwere nsogbu n'agu akwukwo
+        biko aghotaghi m o naghi aru oru ma ihe a bu nsogbu
+        daalụ nke ukwuu nwa m enweghi ike igu akwukwo nke oma
+        kedu ka i mere nnoo ego ole ka o ga-eri kwa onwa
+        anyi na-acho ndi nkuzi tozuru etozu maka ulo akwukwo anyi
+    """,
+    'ha': """
+        sannu ina kwana ina son malami don dana nawa ne kudin karatun gida
+        barka da safiya don allah ina bukatar taimako don jarrabawar waec ta ɗana
+        ina kuke a ina ofishinku yake wane lokaci ne ake fara aji
+        ina son taimakawa da shirin karatu kuma ina so in dauki nauyin yaro
+        don allah ban gane ba akwai matsala baya aiki ko kadan
+        na gode sosai yata ba ta iya karatu da kyau ba
+        yaya dai ina wuni farashi nawa ne a wata
+        muna neman kwararrun malamai don makarantarmu
+    """,
+}
+
+# Keywords per language, added to the English keywords of that language's index
+# (most users mix in English words) and matched with tone marks stripped
+LANGUAGE_KEYWORDS = {
+    'pcm': {
+        'greeting': ['how far', 'how you dey', 'how body', 'wetin dey happen', 'good morning o'],
+        'tutoring_inquiry': ['lesson teacher', 'home lesson', 'extra lesson', 'teacher for my pikin', 'my pikin'],
+        'exam_prep': ['prepare for exam', 'pass exam', 'pass my exam'],
+        'pricing_inquiry': ['how much una dey collect', 'wetin be the price', 'how much e be', 'how much e cost'],
+        'schedule_inquiry': ['which time', 'wetin time'],
+        'location_inquiry': ['una dey where', 'where una dey'],
+        'volunteer_interest': ['i wan help', 'i fit help', 'i wan volunteer'],
+        'complaint_concern': ['wahala', 'e no dey work', 'i vex', 'no dey work'],
+    },
+    'yo': {
+        'greeting': ['bawo ni', 'ẹ kú àárọ̀', 'ẹ kú ìrọ̀lẹ́', 'ẹ n lẹ', 'ẹ nlẹ', 'ṣé dáadáa ni'],
+        'tutoring_inquiry': ['olùkọ́', 'olùkọ́ni', 'ẹ̀kọ́ ilé', 'olùkọ́ fún ọmọ mi', 'mo fẹ́ olùkọ́'],
+        'exam_prep': ['ìdánwò', 'ìgbaradì ìdánwò'],
+        'pricing_inquiry': ['elo ni', 'ẹ̀lò ni', 'owó mélòó', 'iye owó'],
+        'schedule_inquiry': ['aago mélòó', 'ìgbà wo'],
+        'location_inquiry': ['níbo ni', 'ibo ni ẹ wà'],
+        'volunteer_interest': ['mo fẹ́ ràn yín lọ́wọ́', 'ìrànlọ́wọ́'],
+        'complaint_concern': ['ìṣòro', 'kò ṣiṣẹ́', 'ẹ̀dùn'],
+    },
+    'ig': {
+        'greeting': ['kedu', 'ndewo', 'ụtụtụ ọma', 'nnọọ'],
+        'tutoring_inquiry': ['onye nkuzi', 'nkuzi', 'nkuzi n ụlọ', 'achọrọ m onye nkuzi'],
+        'exam_prep': ['nkwadebe ule', 'ule waec', 'ule jamb'],
+        'pricing_inquiry': ['ego ole', 'ọ ga eri ego ole', 'ọnụahịa'],
+        'schedule_inquiry': ['oge ole', 'mgbe ole'],
+        'location_inquiry': ['ebee ka unu nọ', 'ebee'],
+        'volunteer_interest': ['inye aka', 'achọrọ m inye aka'],
+        'complaint_concern': ['nsogbu', 'ọ naghị arụ ọrụ', 'mkpesa'],
+    },
+    'ha': {
+        'greeting': ['sannu', 'ina kwana', 'ina wuni', 'barka da safiya', 'barka da yamma', 'yaya dai'],
+        'tutoring_inquiry': ['malami', 'malamin gida', 'karatun gida', 'ina son malami'],
+        'exam_prep': ['jarrabawa', 'shirin jarrabawa'],
+        'pricing_inquiry': ['nawa ne', 'kuɗin', 'farashi', 'nawa ake biya'],
+        'schedule_inquiry': ['wane lokaci', 'yaushe'],
+        'location_inquiry': ['ina kuke', 'ofishinku'],
+        'volunteer_interest': ['taimakawa', 'ina son taimakawa'],
+        'complaint_concern': ['matsala', 'baya aiki', 'koke'],
+    },
+}
+
+_TUTOR_FORM = "https://forms.gle/eTkf1N9qrKZyNJr4A"
+
+# Smart responses per language, intent and user role ('default' for any other role);
+# intents a language does not list are answered in English
+LANGUAGE_RESPONSES = {
+    'pcm': {
+        'greeting': {'default': """👋 How far! Welcome to Uniqwrites.
+We dey help with home lesson, exam preparation and teacher support.
+
+Type 'menu' to see everything we dey do."""},
+        'tutoring_inquiry': {'default': f"""🎓 No wahala! We get better teachers for home lesson and online lesson, for all subjects.
+
+Fill this form make we find teacher for your pikin:
+👉 {_TUTOR_FORM}
+
+Or type 'menu' to see everything we dey do."""},
+        'exam_prep': {'default': f"""🎯 We dey prepare students for WAEC, NECO, JAMB, IGCSE and SAT.
+
+Register here:
+👉 {_TUTOR_FORM}
+
+Or type 'menu' to see everything we dey do."""},
+        'pricing_inquiry': {'default': f"""💰 Our price depend on the class, the subjects and how you want the lesson.
+
+Fill this form make we send you correct price:
+👉 {_TUTOR_FORM}
+
+Or type '14' to talk to person."""},
+        'complaint_concern': {'default': """😔 Sorry for the wahala.
+
+Make I connect you with one of our people wey go sort am out.
+
+👨‍💼 Person go talk to you soon. Abeg hold on..."""},
+    },
+    'yo': {
+        'greeting': {'default': """👋 Ẹ kú àbọ̀ sí Uniqwrites!
+A ń ṣe ìrànlọ́wọ́ pẹ̀lú ẹ̀kọ́ ilé, ìgbaradì ìdánwò àti àtìlẹ́yìn fún olùkọ́.
+
+Ẹ tẹ 'menu' láti rí gbogbo iṣẹ́ wa."""},
+        'tutoring_inquiry': {'default': f"""🎓 Ó dáa! A ní àwọn olùkọ́ tó péye fún ẹ̀kọ́ ilé àti ẹ̀kọ́ orí ayélujára, fún gbogbo ìwé.
+
+Ẹ fọwọ́sí fọ́ọ̀mù yìí:
+👉 {_TUTOR_FORM}
+
+Tàbí ẹ tẹ 'menu' láti rí gbogbo iṣẹ́ wa."""},
+        'exam_prep': {'default': f"""🎯 A ń múra àwọn akẹ́kọ̀ọ́ sílẹ̀ fún WAEC, NECO, JAMB, IGCSE àti SAT.
+
+Ẹ forúkọ sílẹ̀ níbí:
+👉 {_TUTOR_FORM}
+
+Tàbí ẹ tẹ 'menu' láti rí gbogbo iṣẹ́ wa."""},
+        'pricing_inquiry': {'default': f"""💰 Iye owó wa dá lórí kíláàsì, àwọn ìwé àti irú ẹ̀kọ́ tí ẹ fẹ́.
+
+Ẹ fọwọ́sí fọ́ọ̀mù yìí láti gba iye owó:
+👉 {_TUTOR_FORM}
+
+Tàbí ẹ tẹ '14' láti bá ènìyàn sọ̀rọ̀."""},
+        'complaint_concern': {'default': """😔 Ẹ má bínú fún ìṣòro náà.
+
+Ẹ jẹ́ kí n so yín pọ̀ mọ́ ọ̀kan lára àwọn òṣìṣẹ́ wa.
+
+👨‍💼 Ẹnìkan yóò bá yín sọ̀rọ̀ láìpẹ́. Ẹ jọ̀wọ́ ẹ dúró..."""},
+    },
+    'ig': {
+        'greeting': {'default': """👋 Nnọọ na Uniqwrites!
+Anyị na-enye aka na nkuzi n'ụlọ, nkwadebe ule na nkwado ndị nkuzi.
+
+Pịa 'menu' ka ị hụ ọrụ anyị niile."""},
+        'tutoring_inquiry': {'default': f"""🎓 Ọ dị mma! Anyị nwere ndị nkuzi tozuru etozu maka nkuzi n'ụlọ na n'ịntanetị, maka isiokwu niile.
+
+Dejupụta fọm a:
+👉 {_TUTOR_FORM}
+
+Ma ọ bụ pịa 'menu' ka ị hụ ọrụ anyị niile."""},
+        'exam_prep': {'default': f"""🎯 Anyị na-akwadebe ụmụ akwụkwọ maka WAEC, NECO, JAMB, IGCSE na SAT.
+
+Debanye aha ebe a:
+👉 {_TUTOR_FORM}
+
+Ma ọ bụ pịa 'menu' ka ị hụ ọrụ anyị niile."""},
+        'pricing_inquiry': {'default': f"""💰 Ego anyị na-ana dabere na klas, isiokwu na ụdị nkuzi ị chọrọ.
+
+Dejupụta fọm a ka anyị zitere gị ọnụahịa:
+👉 {_TUTOR_FORM}
+
+Ma ọ bụ pịa '14' ka gị na mmadụ kparịta."""},
+        'complaint_concern': {'default': """😔 Ndo maka nsogbu a.
+
+Ka m jikọọ gị na otu n'ime ndị ọrụ anyị.
+
+👨‍💼 Mmadụ ga-agwa gị okwu n'oge na-adịghị anya. Biko chere..."""},
+    },
+    'ha': {
+        'greeting': {'default': """👋 Barka da zuwa Uniqwrites!
+Muna taimakawa da karatun gida, shirin jarrabawa da tallafa wa malamai.
+
+Rubuta 'menu' don ganin dukkan ayyukanmu."""},
+        'tutoring_inquiry': {'default': f"""🎓 To! Muna da ƙwararrun malamai don karatun gida da na intanet, a kowane fanni.
+
+Cike wannan fom:
+👉 {_TUTOR_FORM}
+
+Ko rubuta 'menu' don ganin dukkan ayyukanmu."""},
+        'exam_prep': {'default': f"""🎯 Muna shirya ɗalibai don WAEC, NECO, JAMB, IGCSE da SAT.
+
+Yi rajista a nan:
+👉 {_TUTOR_FORM}
+
+Ko rubuta 'menu' don ganin dukkan ayyukanmu."""},
+        'pricing_inquiry': {'default': f"""💰 Kuɗinmu ya dogara da aji, darussa da irin karatun da kuke so.
+
+Cike wannan fom don samun farashi:
+👉 {_TUTOR_FORM}
+
+Ko rubuta '14' don magana da mutum."""},
+        'complaint_concern': {'default': """😔 Muna ba da haƙuri kan matsalar.
+
+Bari in haɗa ka da ɗaya daga cikin ma'aikatanmu.
+
+👨‍💼 Wani zai yi magana da kai ba da jimawa ba. Don Allah ka jira..."""},
+    },
+}
+
+
+def _trigrams(text, limit=None):
+    """Character trigrams of each word of mark-stripped text, padded so word edges count"""
+    grams = []
+    for word in text.split():
+        if word.isdecimal():
+            continue
+        padded = f" {word} "
+        grams.extend(padded[start:start + 3] for start in range(len(padded) - 2))
+        if limit is not None and len(grams) >= limit:
+            return grams[:limit]
+    return grams
+
+
+class LanguageIdentifier:
+    """Character trigram language identifier, trained on LANGUAGE_SAMPLES
+
+    Each language is a smoothed trigram log-probability table; scoring a
+    message is one C-level pass of dict lookups per language over at most
+    MAX_TRIGRAMS trigrams. Messages too short to tell, or not clearly
+    more likely in another language, are ``default`` (English): a wrong
+    guess there costs nothing, since every language index also knows the
+    English keywords. Results are memoised per text like intent scores.
+    """
+
+    def __init__(self, samples, default=ENGLISH, min_letters=4, margin=0.6, cache_size=1024):
+        self.languages = tuple(samples)
+        self.default = default
+        self.min_letters = min_letters
+        self.margin = margin  # Mean log-probability lead per trigram another language needs over the default
+
+        counts = {}
+        for language in self.languages:
+            grams = counts[language] = {}
+            for gram in _trigrams(plain_text(tokenize(samples[language]).text)):
+                grams[gram] = grams.get(gram, 0) + 1
+        vocabulary = {gram for grams in counts.values() for gram in grams}
+        totals = [sum(counts[language].values()) + len(vocabulary) for language in self.languages]
+
+        # Per language: (trigram -> log probability, log probability of an unseen trigram)
+        self._tables = [
+            ({gram: math.log((count + 1) / total) for gram, count in counts[language].items()}, math.log(1 / total))
+            for language, total in zip(self.languages, totals)
+        ]
+        self._default_index = self.languages.index(default)
+        self._cached_identify = lru_cache(maxsize=cache_size)(self._identify)
+
+    def identify(self, message):
+        """Language code of ``message`` (text or Tokens)"""
+        return self._cached_identify(tokenize(message).plain)
+
+    def scores(self, message):
+        """Mean log-probability per trigram for each language, for tuning and debugging"""
+        grams = _trigrams(tokenize(message).plain, MAX_TRIGRAMS)
+        totals = self._score(grams)
+        return {language: total / max(len(grams), 1) for language, total in zip(self.languages, totals)}
+
+    def _score(self, grams):
+        return [sum(map(table.get, grams, repeat(unseen))) for table, unseen in self._tables]
+
+    def _identify(self, text):
+        if sum(char.isalpha() for char in text) < self.min_letters:
+            return self.default
+        grams = _trigrams(text, MAX_TRIGRAMS)
+        totals = self._score(grams)
+        best = max(range(len(totals)), key=totals.__getitem__)
+        if best == self._default_index or (totals[best] - totals[self._default_index]) / len(grams) < self.margin:
+            return self.default
+        return self.languages[best]
+
+
+language_identifier = LanguageIdentifier(LANGUAGE_SAMPLES)
+
+
+def language_patterns(patterns, language):
+    """Keyword lists for one language's index: ``patterns`` (already normalized) plus its own keywords"""
+    extra = {
+        intent: tuple(plain_text(normalize(keyword)) for keyword in keywords)
+        for intent, keywords in LANGUAGE_KEYWORDS[language].items()
+    }
+    merged = {intent: tuple(keywords) + extra.get(intent, ()) for intent, keywords in patterns.items()}
+    for intent in extra.keys() - patterns.keys():
+        merged[intent] = extra[intent]
+    return merged
+
+
+def language_responses(response_overrides, language):
+    """Smart response overrides for one language: ``response_overrides`` with the language's own text on top"""
+    merged = {intent: dict(roles) for intent, roles in (response_overrides or {}).items()}
+    for intent, roles in LANGUAGE_RESPONSES[language].items():
+        merged.setdefault(intent, {}).update(roles)
+    return merged
@@ -0,0 +1,95 @@
+import logging
+from collections import Counter
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from whatsapp_bot.db_router import use_replica
+from whatsapp_bot.models import ConversationRollup, MessageLog
+from whatsapp_bot.replay import ReplayBot
+from whatsapp_bot.rollups import hour_of, upsert_rollups
+from whatsapp_bot.session_store import InMemorySessionStore
+
+
+class Command(BaseCommand):
+    help = "Rebuild hourly conversation rollups from MessageLog history, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD, default: all history)")
+        parser.add_argument('--until', help="Rebuild hours before this day (YYYY-MM-DD, default: the current hour)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Messages read per chunk (default 5000)")
+        parser.add_argument('--max-sessions', type=int, default=50000,
+                            help="Conversations kept in memory for context (default 50000)")
+
+    def handle(self, *args, **options):
+        # Reads the whole history, so keep it off the primary that serves the webhook
+        with use_replica():
+            self._handle(options)
+
+    def _handle(self, options):
+        since = self._parse_date(options['since']) if options['since'] else None
+        # Live counters keep accumulating into the current hour, so never rebuild it
+        until = self._parse_date(options['until']) if options['until'] else hour_of(timezone.now())
+
+        messages = MessageLog.objects.filter(timestamp__lt=until)
+        rollups = ConversationRollup.objects.filter(hour__lt=until)
+        if since:
+            messages = messages.filter(timestamp__gte=since)
+            rollups = rollups.filter(hour__gte=hour_of(since))
+
+        deleted, _ = rollups.delete()
+        self.stdout.write(f"Removed {deleted} existing rollup row(s) in range")
+
+        # Historical intents are not stored, so re-derive them by replaying each
+        # user's messages through the bot with in-memory sessions
+        if options['verbosity'] < 2:
+            logging.getLogger('whatsapp_bot.bot_logic').setLevel(logging.WARNING)
+        store = InMemorySessionStore()
+        bot = ReplayBot(session_store=store)
+        last_reply = {}  # phone number -> (intent, role) of the last incoming message
+
+        last_id = 0
+        total = 0
+        while True:
+            chunk = list(
+                messages.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'phone_number', 'message_type', 'message_content', 'timestamp')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+
+            counts = Counter()
+            for message_id, phone_number, message_type, content, timestamp in chunk:
+                if message_type == 'incoming':
+                    reply = bot.process_message(phone_number, content)
+                    labels = (getattr(reply, 'intent', None) or '', getattr(reply, 'role', None) or '')
+                    last_reply[phone_number] = labels
+                    self._evict(store, last_reply, options['max_sessions'])
+                else:
+                    labels = last_reply.get(phone_number, ('', ''))
+                counts[(hour_of(timestamp), labels[0], labels[1], message_type)] += 1
+
+            rows = list(counts.items())
+            for start in range(0, len(rows), 1000):
+                upsert_rollups(rows[start:start + 1000])
+
+            last_id = chunk[-1][0]
+            total += len(chunk)
+            self.stdout.write(f"  {total} message(s) processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups from {total} message(s)"))
+
+    def _evict(self, store, last_reply, max_sessions):
+        # Drop the least recently started conversations once over the limit
+        while len(store.sessions) > max_sessions:
+            phone_number = next(iter(store.sessions))
+            del store.sessions[phone_number]
+            last_reply.pop(phone_number, None)
+
+    def _parse_date(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, dt_time.min), dt_timezone.utc)
@@ -0,0 +1,74 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from whatsapp_bot.models import UserSession
+
+
+class Command(BaseCommand):
+    help = "Delete (optionally archiving) sessions idle for a long time, in small batches so the webhook never waits on locks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, default=90,
+                            help="Remove sessions not updated for this many days (default 90)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Sessions removed per transaction (default 500)")
+        parser.add_argument('--pause', type=float, default=0.5, help="Seconds to sleep between batches (default 0.5)")
+        parser.add_argument('--archive', help="Append removed sessions to this JSON lines file (gzipped if it ends in .gz)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the sessions that would be removed")
+
+    def handle(self, *args, **options):
+        if options['idle_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--idle-days and --batch-size must be at least 1")
+        cutoff = timezone.now() - timedelta(days=options['idle_days'])
+        # Sessions handed to an agent stay until the handoff is closed
+        idle = UserSession.objects.filter(updated_at__lt=cutoff, awaiting_agent=False)
+
+        if options['dry_run']:
+            self.stdout.write(f"{idle.count()} session(s) idle since before {cutoff:%Y-%m-%d} would be removed")
+            return
+
+        archive = None
+        if options['archive']:
+            opener = gzip.open if options['archive'].endswith('.gz') else open
+            archive = opener(options['archive'], 'at', encoding='utf-8')
+
+        fields = [field.attname for field in UserSession._meta.concrete_fields]
+        last_pk = 0
+        total = 0
+        try:
+            while True:
+                # Walk the primary key so each batch is a short index range scan; rows the
+                # webhook is writing right now are skipped rather than waited for
+                with transaction.atomic():
+                    batch = list(
+                        idle.filter(pk__gt=last_pk).order_by('pk')
+                        .select_for_update(skip_locked=True).values(*fields)[:options['batch_size']]
+                    )
+                    if not batch:
+                        break
+                    if archive is not None:
+                        for row in batch:
+                            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                        archive.flush()
+                    UserSession.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+
+                last_pk = batch[-1]['id']
+                total += len(batch)
+                self.stdout.write(f"  {total} session(s) removed")
+                if len(batch) < options['batch_size']:
+                    break
+                time.sleep(options['pause'])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {total} session(s) idle since before {cutoff:%Y-%m-%d}"
+            + (f", archived to {options['archive']}" if archive is not None else "")
+        ))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from whatsapp_bot.media import download_media
+from whatsapp_bot.models import MediaDownload
+
+
+class Command(BaseCommand):
+    help = "Download pending WhatsApp media, and retry stalled or failed downloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help="Downloads to process (default 500)")
+        parser.add_argument('--stalled-after', type=int, default=10,
+                            help="Minutes after which an unfinished download is retried (default 10)")
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry failed downloads")
+
+    def handle(self, *args, **options):
+        stalled = Q(status='downloading', started_at__lt=timezone.now() - timedelta(minutes=options['stalled_after']))
+        retry = Q(status='pending') | stalled
+        if options['retry_failed']:
+            retry |= Q(status='failed')
+
+        # Stalled and failed downloads go back to pending so download_media can claim them
+        ids = list(MediaDownload.objects.filter(retry).order_by('created_at').values_list('pk', flat=True)[:options['limit']])
+        MediaDownload.objects.filter(pk__in=ids).exclude(status='pending').update(status='pending', error=None)
+
+        counts = {'done': 0, 'failed': 0}
+        for download_id in ids:
+            download = download_media(download_id)
+            if download is not None:
+                counts[download.status] += 1
+        self.stdout.write(f"Processed {len(ids)} download(s): {counts['done']} done, {counts['failed']} failed")
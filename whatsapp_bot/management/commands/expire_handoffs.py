@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from whatsapp_bot.handoffs import expire_unclaimed_handoffs
+
+
+class Command(BaseCommand):
+    help = "Close handoffs no agent claimed in time, handing their users back to the bot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int,
+                            help="Seconds a handoff may wait unclaimed (default WHATSAPP_HANDOFF_TIMEOUT)")
+
+    def handle(self, *args, **options):
+        if options['timeout'] is not None and options['timeout'] < 1:
+            raise CommandError("--timeout must be at least 1")
+        closed = expire_unclaimed_handoffs(options['timeout'])
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} unclaimed handoff(s)"))
@@ -0,0 +1,44 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from whatsapp_bot.exports import DIRECTIONS, EXPORT_FORMATS, export_chunks, export_queryset, iter_messages, parse_day
+
+
+class Command(BaseCommand):
+    help = "Stream message logs to a file (or stdout) as NDJSON or CSV, in keyset-paginated chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help="Output format (default ndjson)")
+        parser.add_argument('--since', help="First day to export (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Export messages before this day (YYYY-MM-DD)")
+        parser.add_argument('--phone', action='append', help="Only export this phone number (repeatable)")
+        parser.add_argument('--direction', choices=DIRECTIONS, help="Only export incoming or outgoing messages")
+        parser.add_argument('--output', help="File to write (gzipped if it ends in .gz); default stdout")
+        parser.add_argument('--page-size', type=int, default=5000, help="Rows per keyset page (default 5000)")
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(
+                since=parse_day(options['since']) if options['since'] else None,
+                until=parse_day(options['until']) if options['until'] else None,
+                phone_numbers=options['phone'],
+                direction=options['direction'],
+            )
+        except ValueError as filter_error:
+            raise CommandError(str(filter_error))
+
+        chunks = export_chunks(iter_messages(queryset, page_size=options['page_size']), options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                # Chunks always end on a line boundary, so they decode on their own
+                self.stdout.write(chunk.decode(), ending='')
+            return
+
+        opener = gzip.open if options['output'].endswith('.gz') else open
+        size = 0
+        with opener(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        self.stderr.write(f"Exported {size} byte(s) to {options['output']}")
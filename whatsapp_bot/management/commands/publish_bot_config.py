@@ -0,0 +1,37 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from whatsapp_bot.bot_config import CONFIG_FIELDS, config_data, live_config, publish_config
+
+
+class Command(BaseCommand):
+    help = "Publish intents and responses from a JSON file as the next bot configuration version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help=f"JSON object with any of: {', '.join(CONFIG_FIELDS)}")
+        parser.add_argument('--comment', default='', help="Note stored with the version")
+        parser.add_argument('--dump', action='store_true', help="Print the live configuration as JSON instead")
+
+    def handle(self, *args, **options):
+        if options['dump']:
+            config = live_config()
+            self.stdout.write(json.dumps(config_data(config) if config else {}, indent=2, ensure_ascii=False))
+            return
+        if not options['path']:
+            raise CommandError("Give the path of a JSON configuration file, or --dump")
+
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as load_error:
+            raise CommandError(f"Could not read {options['path']}: {load_error}")
+        if not isinstance(data, dict) or not data.keys() <= set(CONFIG_FIELDS):
+            raise CommandError(f"Expected a JSON object with only these keys: {', '.join(CONFIG_FIELDS)}")
+
+        try:
+            config = publish_config(data, comment=options['comment'])
+        except ValidationError as invalid:
+            raise CommandError(f"Invalid configuration: {invalid.message_dict}")
+        self.stdout.write(self.style.SUCCESS(f"Published bot configuration v{config.version}"))
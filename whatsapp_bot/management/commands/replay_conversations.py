@@ -0,0 +1,71 @@
+import logging
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from whatsapp_bot.db_router import use_replica
+from whatsapp_bot.models import MessageLog
+from whatsapp_bot.replay import replay_conversations
+
+
+class Command(BaseCommand):
+    help = "Replay logged conversations through the current bot logic and report changed replies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', action='append', help="Only replay this phone number (repeatable)")
+        parser.add_argument('--since', help="Only replay messages on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Only replay messages before this date (YYYY-MM-DD)")
+        parser.add_argument('--max-diffs', type=int, default=20, help="Number of differing turns to print")
+        parser.add_argument('--full', action='store_true', help="Print full replies instead of the first line")
+        parser.add_argument('--fail-on-diff', action='store_true', help="Exit with an error if any reply changed")
+
+    def handle(self, *args, **options):
+        # Reads the whole history, so keep it off the primary that serves the webhook
+        with use_replica():
+            self._handle(options)
+
+    def _handle(self, options):
+        queryset = MessageLog.objects.all()
+        if options['phone']:
+            queryset = queryset.filter(phone_number__in=options['phone'])
+        if options['since']:
+            queryset = queryset.filter(timestamp__gte=self._parse_date(options['since']))
+        if options['until']:
+            queryset = queryset.filter(timestamp__lt=self._parse_date(options['until']))
+
+        # Intent detection logs every message at INFO, which would swamp the report
+        if options['verbosity'] < 2:
+            logging.getLogger('whatsapp_bot.bot_logic').setLevel(logging.WARNING)
+
+        result = replay_conversations(queryset, max_diffs=options['max_diffs'])
+
+        for diff in result.diffs:
+            self.stdout.write(f"\n{diff.phone_number} turn {diff.turn}: {diff.message!r}")
+            self.stdout.write(self.style.ERROR(f"- {self._format(diff.actual, options['full'])}"))
+            self.stdout.write(self.style.SUCCESS(f"+ {self._format(diff.replayed or '', options['full'])}"))
+
+        self.stdout.write("")
+        self.stdout.write(f"Users replayed:      {result.users}")
+        self.stdout.write(f"Turns replayed:      {result.turns}")
+        self.stdout.write(f"Turns without reply: {result.unanswered}")
+        self.stdout.write(f"Changed replies:     {result.diff_count}")
+        self.stdout.write(f"Bot throughput:      {result.turns_per_second:,.0f} turns/s")
+        self.stdout.write(f"Replay throughput:   {result.wall_turns_per_second:,.0f} turns/s (including DB reads)")
+
+        if options['fail_on_diff'] and result.diff_count:
+            raise CommandError(f"{result.diff_count} replies changed")
+
+    def _parse_date(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+    def _format(self, text, full):
+        text = text.strip()
+        if full:
+            return text
+        first_line = text.splitlines()[0] if text else ""
+        return first_line + (" …" if len(text) > len(first_line) else "")
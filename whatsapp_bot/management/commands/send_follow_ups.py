@@ -0,0 +1,25 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from whatsapp_bot.follow_ups import dispatch_follow_ups, recover_stale
+
+
+class Command(BaseCommand):
+    help = "Send due follow-ups in batches (for hosts where the in-process scheduler cannot run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Follow-ups claimed per batch (default 100)")
+        parser.add_argument('--limit', type=int, default=10000, help="Stop after this many follow-ups (default 10000)")
+
+    def handle(self, *args, **options):
+        stale = recover_stale()
+        counts = Counter()
+        while sum(counts.values()) < options['limit']:
+            batch = dispatch_follow_ups(limit=min(options['batch_size'], options['limit'] - sum(counts.values())))
+            counts.update(batch)
+            if not batch:
+                break
+        self.stdout.write(f"Processed {sum(counts.values())} follow-up(s): {counts['sent']} sent, "
+                          f"{counts['failed']} failed, {counts['cancelled']} cancelled; "
+                          f"{stale['expired']} expired, {stale['recovered']} retried after a stalled send")
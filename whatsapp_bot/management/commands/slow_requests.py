@@ -0,0 +1,95 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from whatsapp_bot.profiling import default_profile_dir, load_profiles
+
+
+class Command(BaseCommand):
+    help = "List and summarise the slow webhook requests captured by the profiler middleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Profile directory (default: WHATSAPP_PROFILE_DIR)")
+        parser.add_argument('--limit', type=int, default=20, help="Profiles to list, newest first (default 20)")
+        parser.add_argument('--show', metavar='FILE', help="Print the details of one profile")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'WHATSAPP_PROFILE_DIR', None) or default_profile_dir()
+        profiles = load_profiles(directory)
+        if options['show']:
+            return self._show(profiles, options['show'])
+        if not profiles:
+            self.stdout.write(f"No profiles in {directory}")
+            return
+
+        self.stdout.write(f"{len(profiles)} slow request(s) in {directory}\n")
+        self.stdout.write(f"{'file':<40} {'total ms':>9} {'queries':>8} {'db ms':>8} {'http ms':>8}  hottest frame")
+        for name, profile in reversed(profiles[-options['limit']:]):
+            http_ms = sum(call['ms'] for call in profile['http_calls'])
+            self.stdout.write(
+                f"{name:<40} {profile['duration_ms']:>9.0f} {profile['query_count']:>8} "
+                f"{profile['query_ms']:>8.0f} {http_ms:>8.0f}  {_hottest_frame(profile) or '-'}"
+            )
+
+        self._summarise([profile for _, profile in profiles])
+
+    def _summarise(self, profiles):
+        durations = sorted(profile['duration_ms'] for profile in profiles)
+        db_ms = sum(profile['query_ms'] for profile in profiles)
+        http_ms = sum(call['ms'] for profile in profiles for call in profile['http_calls'])
+        total_ms = sum(durations)
+
+        self.stdout.write("\nSummary")
+        self.stdout.write(
+            f"  duration: median {durations[len(durations) // 2]:.0f} ms, "
+            f"p95 {durations[min(len(durations) - 1, int(len(durations) * 0.95))]:.0f} ms, max {durations[-1]:.0f} ms"
+        )
+        self.stdout.write(f"  time in database queries: {db_ms / total_ms:.0%}, in outbound HTTP: {http_ms / total_ms:.0%}")
+
+        frames = Counter()
+        for profile in profiles:
+            for stack, count in profile['stack_samples'].items():
+                frames[stack.rsplit(';', 1)[-1]] += count
+        if frames:
+            self.stdout.write("  hottest frames (stack samples):")
+            for frame, count in frames.most_common(5):
+                self.stdout.write(f"    {count:>6}  {frame}")
+
+        queries = Counter()
+        for profile in profiles:
+            for query in profile['queries']:
+                queries[query['sql'][:120]] += query['ms']
+        if queries:
+            self.stdout.write("  slowest statements (total ms):")
+            for sql, ms in queries.most_common(5):
+                self.stdout.write(f"    {ms:>8.0f}  {sql}")
+
+    def _show(self, profiles, name):
+        profile = dict(profiles).get(name)
+        if profile is None:
+            raise CommandError(f"No profile named {name}")
+
+        self.stdout.write(
+            f"{profile['method']} {profile['path']} -> {profile['status']} in {profile['duration_ms']:.0f} ms "
+            f"at {profile['time']}"
+        )
+        self.stdout.write(f"\n{profile['query_count']} queries, {profile['query_ms']:.0f} ms:")
+        for query in profile['queries']:
+            self.stdout.write(f"  {query['ms']:>8.1f}  [{query['alias']}] {query['sql'][:200]}")
+        self.stdout.write("\nOutbound HTTP:")
+        for call in profile['http_calls']:
+            self.stdout.write(f"  {call['ms']:>8.1f}  {call['method']} {call['url']} -> {call['status']}")
+        self.stdout.write("\nStack samples (collapsed, most frequent first):")
+        for stack, count in list(profile['stack_samples'].items())[:10]:
+            self.stdout.write(f"  {count:>6}  {stack}")
+        if profile['cprofile']:
+            self.stdout.write("\ncProfile:")
+            self.stdout.write(profile['cprofile'])
+
+
+def _hottest_frame(profile):
+    if not profile['stack_samples']:
+        return None
+    stack = max(profile['stack_samples'], key=profile['stack_samples'].get)
+    return stack.rsplit(';', 1)[-1]
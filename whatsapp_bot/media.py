@@ -0,0 +1,206 @@
+import base64
+import binascii
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import MediaDownload, MediaFile
+from .profiling import TimedHttpCall
+from .tenants import tenant_registry
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_URL = "https://graph.facebook.com/v18.0"
+DOWNLOAD_TIMEOUT = (5, 30)  # Connect, and between received chunks
+
+
+class MediaError(Exception):
+    """A download that failed for a reason worth recording, e.g. 'http_404' or 'too_large'"""
+
+
+def _hex_digest(value):
+    """The Graph API's SHA-256 (hex or base64) as a hex digest, or '' when absent or malformed"""
+    if not value:
+        return ''
+    if len(value) == 64:
+        try:
+            bytes.fromhex(value)
+            return value.lower()
+        except ValueError:
+            pass
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return ''
+    return digest.hex() if len(digest) == 32 else ''
+
+
+def queue_media(phone_number_id, message):
+    """Record an inbound media message for download, handing it to the background downloader if there is one"""
+    download = MediaDownload.objects.create(
+        phone_number_id=phone_number_id,
+        phone_number=message.phone_number,
+        wa_message_id=message.message_id,
+        media_id=message.media.media_id,
+        media_type=message.type,
+        mime_type=message.media.mime_type,
+        filename=message.media.filename,
+        caption=message.body,
+    )
+    media_downloader.submit(download.pk, expected_sha256=message.media.sha256)
+    return download
+
+
+def resolve_media(http, access_token, media_id):
+    """Look up a media id; returns the Graph API's {'url', 'mime_type', 'sha256', 'file_size', ...}"""
+    url = f"{getattr(settings, 'WHATSAPP_GRAPH_API_URL', GRAPH_API_URL)}/{media_id}"
+    with TimedHttpCall('GET', url) as call:
+        response = http.get(url, headers={'Authorization': f'Bearer {access_token}'}, timeout=DOWNLOAD_TIMEOUT)
+        call.status = response.status_code
+    if response.status_code != 200:
+        raise MediaError(f"http_{response.status_code}")
+    return response.json()
+
+
+def stream_to_file(http, access_token, url, destination, chunk_size, max_bytes):
+    """Stream ``url`` into the open file ``destination`` chunk by chunk; returns (hex SHA-256, size)
+
+    Only one chunk is held in memory at a time, whatever the file size.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with TimedHttpCall('GET', url) as call:
+        with http.get(url, headers={'Authorization': f'Bearer {access_token}'}, stream=True,
+                      timeout=DOWNLOAD_TIMEOUT) as response:
+            call.status = response.status_code
+            if response.status_code != 200:
+                raise MediaError(f"http_{response.status_code}")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise MediaError("too_large")
+                digest.update(chunk)
+                destination.write(chunk)
+    return digest.hexdigest(), size
+
+
+def store_media_file(sha256, mime_type, size, content, filename=''):
+    """Save downloaded content under its hash, or return the MediaFile that already has it"""
+    existing = MediaFile.objects.filter(sha256=sha256).first()
+    if existing is not None:
+        return existing
+
+    extension = os.path.splitext(filename)[1] or mimetypes.guess_extension(mime_type.split(';')[0].strip()) or ''
+    name = default_storage.save(f"whatsapp_media/{sha256[:2]}/{sha256}{extension.lower()}", File(content))
+    try:
+        with transaction.atomic():
+            return MediaFile.objects.create(sha256=sha256, mime_type=mime_type, size=size, file=name)
+    except IntegrityError:
+        # Another download of the same content finished first; keep its copy
+        default_storage.delete(name)
+        return MediaFile.objects.get(sha256=sha256)
+
+
+def download_media(download_id, expected_sha256=''):
+    """Fetch one MediaDownload: resolve its media id, stream it to storage and link the (deduplicated) MediaFile
+
+    Returns the download, or None when another worker already claimed it.
+    """
+    claimed = MediaDownload.objects.filter(pk=download_id, status='pending').update(
+        status='downloading', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    download = MediaDownload.objects.get(pk=download_id)
+
+    try:
+        # Content we already have is linked without downloading it again
+        known = _hex_digest(expected_sha256)
+        media_file = MediaFile.objects.filter(sha256=known).first() if known else None
+        if media_file is None:
+            media_file = _fetch(download, known)
+    except (MediaError, requests.RequestException, OSError, ValueError, KeyError) as download_error:
+        error = str(download_error) if isinstance(download_error, MediaError) else type(download_error).__name__
+        logger.warning(f"Media download #{download.pk} ({download.media_type}) failed: {error}")
+        download.status = 'failed'
+        download.error = error[:50]
+    else:
+        download.status = 'done'
+        download.error = None
+        download.media_file = media_file
+    download.finished_at = timezone.now()
+    download.save(update_fields=['status', 'error', 'media_file', 'mime_type', 'finished_at'])
+    return download
+
+
+def _fetch(download, expected_sha256):
+    bot = tenant_registry.get_bot(download.phone_number_id)
+    info = resolve_media(bot.http, bot.access_token, download.media_id)
+    download.mime_type = info.get('mime_type') or download.mime_type
+    expected_sha256 = expected_sha256 or _hex_digest(info.get('sha256'))
+    existing = MediaFile.objects.filter(sha256=expected_sha256).first() if expected_sha256 else None
+    if existing is not None:
+        return existing
+
+    max_bytes = getattr(settings, 'WHATSAPP_MEDIA_MAX_BYTES', 100 * 1024 * 1024)
+    if int(info.get('file_size') or 0) > max_bytes:
+        raise MediaError("too_large")
+
+    with tempfile.TemporaryFile() as content:
+        sha256, size = stream_to_file(
+            bot.http, bot.access_token, info['url'], content,
+            chunk_size=getattr(settings, 'WHATSAPP_MEDIA_CHUNK_SIZE', 64 * 1024),
+            max_bytes=max_bytes,
+        )
+        if expected_sha256 and sha256 != expected_sha256:
+            raise MediaError("checksum_mismatch")
+        content.seek(0)
+        media_file = store_media_file(sha256, download.mime_type, size, content, download.filename)
+    logger.info(f"Downloaded {download.media_type} #{download.pk}: {size} bytes, sha256 {sha256[:12]}")
+    return media_file
+
+
+class MediaDownloader:
+    """Optional background threads that fetch media so the webhook only records it
+
+    With no workers (the default), downloads stay pending for
+    ``manage.py download_media``; threads are only for long-running servers,
+    since on serverless hosts they do not outlive the response.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, download_id, expected_sha256=''):
+        if not self.workers:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media-download')
+        self._executor.submit(self._run, download_id, expected_sha256)
+
+    @staticmethod
+    def _run(download_id, expected_sha256):
+        close_old_connections()
+        try:
+            download_media(download_id, expected_sha256)
+        except Exception as download_error:
+            logger.error(f"Error downloading media #{download_id}: {str(download_error)}")
+        finally:
+            close_old_connections()
+
+
+media_downloader = MediaDownloader(workers=getattr(settings, 'WHATSAPP_MEDIA_WORKERS', 0))
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0002_usersession_intent_confidence_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagelog',
+            name='delivery_status',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='messagelog',
+            name='status_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='messagelog',
+            name='wa_message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=128, null=True),
+        ),
+    ]
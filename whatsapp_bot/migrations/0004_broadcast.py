@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0003_messagelog_delivery_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('user_role', models.CharField(blank=True, max_length=20, null=True)),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('last_session_id', models.BigIntegerField(default=0)),
+                ('sent_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('failure_breakdown', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'broadcasts',
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=20)),
+                ('status', models.CharField(default='claimed', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=50, null=True)),
+                ('wa_message_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='whatsapp_bot.broadcast')),
+            ],
+            options={
+                'db_table': 'broadcast_recipients',
+                'unique_together': {('broadcast', 'phone_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def assign_default_tenant(apps, schema_editor):
+    # Existing rows belong to the number configured in settings
+    phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID or ''
+    if phone_number_id:
+        apps.get_model('whatsapp_bot', 'UserSession').objects.update(phone_number_id=phone_number_id)
+        apps.get_model('whatsapp_bot', 'MessageLog').objects.update(phone_number_id=phone_number_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0004_broadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number_id', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('access_token', models.TextField()),
+                ('intent_overrides', models.JSONField(blank=True, default=dict)),
+                ('response_overrides', models.JSONField(blank=True, default=dict)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'tenants',
+            },
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='phone_number_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='messagelog',
+            name='phone_number_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='usersession',
+            name='phone_number_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='usersession',
+            name='phone_number',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usersession',
+            unique_together={('phone_number_id', 'phone_number')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0005_tenants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='recent_turns',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0006_usersession_recent_turns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('intent', models.CharField(blank=True, default='', max_length=50)),
+                ('role', models.CharField(blank=True, default='', max_length=20)),
+                ('direction', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'conversation_rollups',
+                'unique_together': {('hour', 'intent', 'role', 'direction')},
+            },
+        ),
+    ]
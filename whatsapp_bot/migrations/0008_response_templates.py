@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0007_conversation_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='messagelog',
+            name='message_content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='ResponseTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('version', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'response_templates',
+                'unique_together': {('key', 'version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='messagelog',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='messages', to='whatsapp_bot.responsetemplate'),
+        ),
+    ]
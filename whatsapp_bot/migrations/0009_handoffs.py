@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('whatsapp_bot', '0008_response_templates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='awaiting_agent',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='Handoff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number_id', models.CharField(blank=True, default='', max_length=32)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('reason', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('claimed', 'Claimed'), ('closed', 'Closed')], default='open', max_length=20)),
+                ('last_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'handoffs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='handoffs_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='handoff',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['open', 'claimed'])), fields=('phone_number_id', 'phone_number'), name='handoffs_one_active_per_conversation'),
+        ),
+    ]
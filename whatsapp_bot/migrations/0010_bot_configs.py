@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0009_handoffs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(unique=True)),
+                ('intent_patterns', models.JSONField(blank=True, default=dict)),
+                ('intent_priorities', models.JSONField(blank=True, default=dict)),
+                ('responses', models.JSONField(blank=True, default=dict)),
+                ('smart_responses', models.JSONField(blank=True, default=dict)),
+                ('comment', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'bot_configs',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0010_bot_configs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.BigIntegerField()),
+                ('file', models.FileField(max_length=255, upload_to='whatsapp_media/')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'media_files',
+            },
+        ),
+        migrations.CreateModel(
+            name='MediaDownload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number_id', models.CharField(blank=True, default='', max_length=32)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('wa_message_id', models.CharField(blank=True, max_length=128)),
+                ('media_id', models.CharField(max_length=128)),
+                ('media_type', models.CharField(max_length=20)),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('caption', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('downloading', 'Downloading'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('media_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='downloads', to='whatsapp_bot.mediafile')),
+            ],
+            options={
+                'db_table': 'media_downloads',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='media_downloads_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0011_media_downloads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagelog',
+            index=models.Index(fields=['timestamp', 'id'], name='message_logs_export_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0012_message_logs_export_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagelog',
+            index=models.Index(fields=['phone_number', 'timestamp', 'id'], name='message_logs_history_idx'),
+        ),
+    ]
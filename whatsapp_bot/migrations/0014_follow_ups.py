@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_bot', '0013_message_logs_history_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowUp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number_id', models.CharField(blank=True, default='', max_length=32)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('step', models.PositiveSmallIntegerField(default=1)),
+                ('due_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('wa_message_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('error', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'follow_ups',
+                'indexes': [models.Index(fields=['status', 'due_at'], name='follow_ups_due_idx'), models.Index(fields=['phone_number', 'status'], name='follow_ups_phone_idx')],
+            },
+        ),
+    ]
@@ -1,23 +1,274 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
+class Tenant(models.Model):
+    """A WhatsApp business number served by this deployment"""
+    phone_number_id = models.CharField(max_length=32, unique=True)  # Graph API phone_number_id from webhook metadata
+    name = models.CharField(max_length=100)
+    access_token = models.TextField()
+    intent_overrides = models.JSONField(default=dict, blank=True)  # intent -> keyword list
+    response_overrides = models.JSONField(default=dict, blank=True)  # BOT_RESPONSES key -> text
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'tenants'
+
+    def __str__(self):
+        return f"{self.name} ({self.phone_number_id})"
+
+class BotConfig(models.Model):
+    """A published version of the intent keywords and bot responses; the newest version is live
+
+    Each field overrides the built-in tables in bot_logic entry by entry.
+    Versions are never edited: publishing a change adds the next version.
+    """
+    version = models.PositiveIntegerField(unique=True)
+    intent_patterns = models.JSONField(default=dict, blank=True)  # intent -> keyword list
+    intent_priorities = models.JSONField(default=dict, blank=True)  # intent -> priority (higher wins close calls)
+    responses = models.JSONField(default=dict, blank=True)  # BOT_RESPONSES key -> text
+    smart_responses = models.JSONField(default=dict, blank=True)  # intent -> {user role or 'default' -> text}
+    comment = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'bot_configs'
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    def clean(self):
+        errors = {}
+        if not _is_mapping_of(self.intent_patterns, lambda keywords: isinstance(keywords, list) and all(
+                isinstance(keyword, str) for keyword in keywords)):
+            errors['intent_patterns'] = "Expected an object mapping each intent to a list of keywords"
+        if not _is_mapping_of(self.intent_priorities, lambda priority: isinstance(priority, (int, float))):
+            errors['intent_priorities'] = "Expected an object mapping each intent to a number"
+        if not _is_mapping_of(self.responses, lambda text: isinstance(text, str)):
+            errors['responses'] = "Expected an object mapping each response key to its text"
+        if not _is_mapping_of(self.smart_responses, lambda roles: _is_mapping_of(roles, lambda text: isinstance(text, str))):
+            errors['smart_responses'] = "Expected an object mapping each intent to an object of role -> text"
+        if errors:
+            raise ValidationError(errors)
+
+def _is_mapping_of(value, check):
+    return isinstance(value, dict) and all(isinstance(key, str) and check(item) for key, item in value.items())
+
 class UserSession(models.Model):
-    phone_number = models.CharField(max_length=20, unique=True)
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)  # Tenant the session belongs to
+    phone_number = models.CharField(max_length=20)
     current_state = models.CharField(max_length=50, default='greeting')
     user_role = models.CharField(max_length=20, null=True, blank=True)
     last_intent = models.CharField(max_length=50, null=True, blank=True)  # Store detected intent
     intent_confidence = models.FloatField(null=True, blank=True)  # Store confidence score
+    recent_turns = models.JSONField(default=list, blank=True)  # Ring buffer of [intent, confidence, unix time]
+    awaiting_agent = models.BooleanField(default=False)  # Handed to a human; the bot stays quiet until released
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'user_sessions'
+        unique_together = [('phone_number_id', 'phone_number')]
+
+class ResponseTemplate(models.Model):
+    """A version of a fixed bot response, referenced by outgoing message logs instead of repeating the text"""
+    key = models.CharField(max_length=100)  # e.g. menu.7, role_help.2, smart.pricing_inquiry.default
+    version = models.PositiveIntegerField()  # Bumped whenever the text for the key changes
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'response_templates'
+        unique_together = [('key', 'version')]
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
 
 class MessageLog(models.Model):
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)  # Tenant the message belongs to
     phone_number = models.CharField(max_length=20)
     message_type = models.CharField(max_length=20)  # incoming/outgoing
-    message_content = models.TextField()
+    message_content = models.TextField(blank=True)  # Empty when the text comes from the template
+    template = models.ForeignKey(ResponseTemplate, null=True, blank=True, on_delete=models.PROTECT, related_name='messages')
     timestamp = models.DateTimeField(default=timezone.now)
+    wa_message_id = models.CharField(max_length=128, null=True, blank=True, db_index=True)  # Graph API id of the message
+    delivery_status = models.CharField(max_length=20, null=True, blank=True)  # sent/delivered/read/failed
+    status_updated_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'message_logs'
+        indexes = [
+            # Keyset pagination for exports walks messages in (timestamp, id) order
+            models.Index(fields=['timestamp', 'id'], name='message_logs_export_idx'),
+            # One user's conversation history, paged the same way
+            models.Index(fields=['phone_number', 'timestamp', 'id'], name='message_logs_history_idx'),
+        ]
+
+    @property
+    def text(self):
+        """Message text, rebuilt from the template for catalog replies"""
+        if self.template_id is not None:
+            return self.template.text
+        return self.message_content
+
+class Broadcast(models.Model):
+    name = models.CharField(max_length=100)
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)  # Tenant to send from
+    message = models.TextField()
+    user_role = models.CharField(max_length=20, null=True, blank=True)  # Only send to this role if set
+    status = models.CharField(max_length=20, default='pending')  # pending/running/completed
+    last_session_id = models.BigIntegerField(default=0)  # Checkpoint: every session up to this id is done
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    failure_breakdown = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'broadcasts'
+
+class BroadcastRecipient(models.Model):
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='recipients')
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, default='claimed')  # claimed/sent/failed
+    error = models.CharField(max_length=50, null=True, blank=True)
+    wa_message_id = models.CharField(max_length=128, null=True, blank=True)
+
+    class Meta:
+        db_table = 'broadcast_recipients'
+        unique_together = [('broadcast', 'phone_number')]
+
+class ConversationRollup(models.Model):
+    """Hourly message counts, maintained incrementally so analytics never scan message_logs"""
+    hour = models.DateTimeField()  # Start of the UTC hour
+    intent = models.CharField(max_length=50, default='', blank=True)
+    role = models.CharField(max_length=20, default='', blank=True)
+    direction = models.CharField(max_length=20)  # incoming/outgoing
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'conversation_rollups'
+        unique_together = [('hour', 'intent', 'role', 'direction')]
+
+class Handoff(models.Model):
+    """A conversation waiting for, or being handled by, a human agent"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('claimed', 'Claimed'),
+        ('closed', 'Closed'),
+    ]
+
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)
+    phone_number = models.CharField(max_length=20)
+    reason = models.CharField(max_length=50)  # Intent that triggered it, e.g. human_agent or complaint_concern
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    agent = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    last_message = models.TextField(blank=True)  # Latest inbound text, for the inbox list
+    created_at = models.DateTimeField(default=timezone.now)
+    last_message_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'handoffs'
+        indexes = [
+            # The agent inbox: open and claimed handoffs, oldest first
+            models.Index(fields=['status', 'created_at'], name='handoffs_queue_idx'),
+        ]
+        constraints = [
+            # At most one active handoff per conversation; also the lookup index for inbound messages
+            models.UniqueConstraint(
+                fields=['phone_number_id', 'phone_number'],
+                condition=models.Q(status__in=['open', 'claimed']),
+                name='handoffs_one_active_per_conversation',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.phone_number} ({self.status})"
+
+class MediaFile(models.Model):
+    """Downloaded media content, stored once per distinct SHA-256"""
+    sha256 = models.CharField(max_length=64, unique=True)  # Hex digest of the content
+    mime_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField()  # Bytes
+    file = models.FileField(upload_to='whatsapp_media/', max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'media_files'
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.mime_type}, {self.size} bytes)"
+
+class MediaDownload(models.Model):
+    """An image, voice note or document a user sent, and the state of fetching it from the Graph API"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('downloading', 'Downloading'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)
+    phone_number = models.CharField(max_length=20)
+    wa_message_id = models.CharField(max_length=128, blank=True)  # Graph API id of the inbound message
+    media_id = models.CharField(max_length=128)  # Graph API media id, resolved to a short-lived download URL
+    media_type = models.CharField(max_length=20)  # image/audio/document/video
+    mime_type = models.CharField(max_length=100, blank=True)
+    filename = models.CharField(max_length=255, blank=True)  # Documents only
+    caption = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.CharField(max_length=50, null=True, blank=True)  # e.g. http_404, too_large, checksum_mismatch
+    media_file = models.ForeignKey(MediaFile, null=True, blank=True, on_delete=models.PROTECT, related_name='downloads')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'media_downloads'
+        indexes = [
+            # Pending and stalled downloads, oldest first
+            models.Index(fields=['status', 'created_at'], name='media_downloads_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.media_type} from {self.phone_number} ({self.status})"
+
+class FollowUp(models.Model):
+    """A nudge scheduled for a user who went quiet after an enquiry, e.g. after being sent a form link"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),  # The user wrote again before it was due
+        ('expired', 'Expired'),  # Not sent in time; a late nudge would be out of context
+    ]
+
+    phone_number_id = models.CharField(max_length=32, default='', blank=True)
+    phone_number = models.CharField(max_length=20)
+    step = models.PositiveSmallIntegerField(default=1)  # 1 for the first nudge after the enquiry, 2 for the next...
+    due_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    wa_message_id = models.CharField(max_length=128, null=True, blank=True)
+    error = models.CharField(max_length=50, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When a dispatcher marked it as sending
+
+    class Meta:
+        db_table = 'follow_ups'
+        indexes = [
+            # Due follow-ups, earliest first
+            models.Index(fields=['status', 'due_at'], name='follow_ups_due_idx'),
+            # A user's pending follow-ups, cancelled when they write again
+            models.Index(fields=['phone_number', 'status'], name='follow_ups_phone_idx'),
+        ]
+
+    def __str__(self):
+        return f"Follow-up {self.step} for {self.phone_number} ({self.status})"
@@ -0,0 +1,111 @@
+import json
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+# Message types whose content is a file fetched separately from the Graph API
+MEDIA_TYPES = frozenset(['image', 'audio', 'document', 'video'])
+
+
+class MediaRef(NamedTuple):
+    """The file attached to an image, audio, document or video message"""
+    media_id: str
+    mime_type: str
+    sha256: str  # Base64 SHA-256 of the file as reported by WhatsApp, may be empty
+    filename: str
+
+
+class InboundMessage(NamedTuple):
+    """A single user message from a webhook change; ``body`` is the caption of media messages
+
+    A message standing for a coalesced burst lists the messages it merges in ``parts``.
+    """
+    message_id: str
+    phone_number: str
+    timestamp: str
+    type: str
+    body: str
+    media: Optional[MediaRef] = None
+    parts: Tuple['InboundMessage', ...] = ()
+
+
+class StatusUpdate(NamedTuple):
+    """A sent/delivered/read/failed callback for one of our outgoing messages"""
+    message_id: str
+    status: str
+    recipient: str
+    timestamp: str
+    error_code: Optional[int]
+
+
+class ChangeValue(NamedTuple):
+    """The decoded ``value`` of a ``messages`` webhook change"""
+    phone_number_id: str
+    messages: Tuple[InboundMessage, ...]
+    statuses: Tuple[StatusUpdate, ...]
+
+
+def loads(body):
+    """Decode JSON straight from request bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def decode_webhook(body):
+    """Decode a webhook body into a list of ChangeValue records"""
+    data = loads(body)
+    changes = []
+
+    for entry in data.get("entry") or ():
+        for change in entry.get("changes") or ():
+            if change.get("field") != "messages":
+                continue
+            value = change.get("value") or {}
+            metadata = value.get("metadata") or {}
+            changes.append(ChangeValue(
+                phone_number_id=metadata.get("phone_number_id", ""),
+                messages=tuple(_decode_message(m) for m in value.get("messages") or ()),
+                statuses=tuple(_decode_status(s) for s in value.get("statuses") or ()),
+            ))
+
+    return changes
+
+
+def _decode_message(message):
+    message_type = message.get("type", "text")
+    media = None
+    if message_type in MEDIA_TYPES:
+        content = message.get(message_type) or {}
+        body = content.get("caption") or ""
+        if content.get("id"):
+            media = MediaRef(
+                media_id=content["id"],
+                mime_type=content.get("mime_type", ""),
+                sha256=content.get("sha256", ""),
+                filename=content.get("filename", ""),
+            )
+    else:
+        body = (message.get("text") or {}).get("body") or ""
+    return InboundMessage(
+        message_id=message.get("id", ""),
+        phone_number=message["from"],
+        timestamp=message.get("timestamp", ""),
+        type=message_type,
+        body=body.strip(),
+        media=media,
+    )
+
+
+def _decode_status(status):
+    errors = status.get("errors") or ()
+    return StatusUpdate(
+        message_id=status.get("id", ""),
+        status=status.get("status", ""),
+        recipient=status.get("recipient_id", ""),
+        timestamp=status.get("timestamp", ""),
+        error_code=errors[0].get("code") if errors else None,
+    )
@@ -0,0 +1,257 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+# Outbound HTTP calls of the request being profiled, None when nothing is recording
+_http_calls = ContextVar('profiled_http_calls', default=None)
+
+MAX_QUERIES = 200  # Queries kept per profile; the totals still count every query
+MAX_STACK_DEPTH = 60
+
+
+class TimedHttpCall:
+    """Times an outbound HTTP call for the slow-request profiler; free when nothing is recording
+
+    Set ``status`` inside the block; an exception is recorded by its type name.
+    """
+
+    __slots__ = ('method', 'url', 'status', 'started', 'calls')
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.status = None
+        self.calls = _http_calls.get()
+
+    def __enter__(self):
+        if self.calls is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.calls is not None:
+            self.calls.append({
+                'method': self.method,
+                'url': self.url,
+                'status': self.status if exc_type is None else exc_type.__name__,
+                'ms': round((time.perf_counter() - self.started) * 1000, 2),
+            })
+        return False
+
+
+class QueryLog:
+    """Database execute wrapper that records each query's SQL and duration"""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'ms': round(elapsed * 1000, 2),
+                })
+
+
+class StackSampler:
+    """One daemon thread that samples the stacks of requests running past their threshold
+
+    Requests register on entry and unregister on exit (a dict update under
+    a lock). The thread sleeps until some request crosses ``threshold``
+    seconds, then records that request's stack every ``interval`` seconds,
+    so fast requests never pay for sampling.
+    """
+
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self._active = {}  # thread id -> [started, Counter of collapsed stacks]
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, thread_id):
+        record = [time.monotonic(), Counter()]
+        with self._condition:
+            self._active[thread_id] = record
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return record
+
+    def stop(self, thread_id):
+        with self._condition:
+            self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._active:
+                    self._condition.wait()
+                now = time.monotonic()
+                due = [(thread_id, record) for thread_id, record in self._active.items() if now - record[0] >= self.threshold]
+                next_due = min(record[0] for record in self._active.values()) + self.threshold
+
+            if not due:
+                time.sleep(max(next_due - now, self.interval))
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, record in due:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    record[1][_collapse(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _collapse(frame):
+    """A stack in collapsed 'outer;...;inner' form, as used by flame graph tools"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfilerMiddleware:
+    """Saves a profile of webhook requests slower than WHATSAPP_PROFILE_SLOW_MS
+
+    Opt-in: unused unless WHATSAPP_PROFILE_SLOW_MS is set. Every webhook
+    request records its database queries and outbound HTTP timings (a few
+    microseconds each) and is watched by the stack sampler; a request that
+    ends over the threshold is written as JSON to WHATSAPP_PROFILE_DIR,
+    which keeps the newest WHATSAPP_PROFILE_MAX_FILES profiles. A
+    WHATSAPP_PROFILE_SAMPLE_RATE fraction of requests also runs under
+    cProfile for a deterministic call profile when it turns out slow.
+    """
+
+    def __init__(self, get_response):
+        threshold_ms = getattr(settings, 'WHATSAPP_PROFILE_SLOW_MS', 0)
+        if not threshold_ms:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = getattr(settings, 'WHATSAPP_PROFILE_SAMPLE_RATE', 0.0)
+        self.directory = getattr(settings, 'WHATSAPP_PROFILE_DIR', None) or default_profile_dir()
+        self.max_files = getattr(settings, 'WHATSAPP_PROFILE_MAX_FILES', 200)
+        self.sampler = StackSampler(self.threshold, interval=getattr(settings, 'WHATSAPP_PROFILE_INTERVAL_MS', 5) / 1000)
+        webhook_path = reverse('webhook')
+        self.paths = {webhook_path, webhook_path.rstrip('/')}
+
+    def __call__(self, request):
+        if request.path_info not in self.paths:
+            return self.get_response(request)
+
+        queries = QueryLog()
+        http_calls = []
+        token = _http_calls.set(http_calls)
+        profiler = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+        thread_id = threading.get_ident()
+        record = self.sampler.start(thread_id)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sampler.stop(thread_id)
+            _http_calls.reset(token)
+
+        if elapsed >= self.threshold:
+            try:
+                self._save(request, response, elapsed, queries, http_calls, record[1], profiler)
+            except Exception as save_error:
+                logger.error(f"Error saving slow request profile: {str(save_error)}")
+        return response
+
+    def _save(self, request, response, elapsed, queries, http_calls, stacks, profiler):
+        now = datetime.now(dt_timezone.utc)
+        profile = {
+            'time': now.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'threshold_ms': round(self.threshold * 1000, 1),
+            'query_count': queries.count,
+            'query_ms': round(queries.total * 1000, 1),
+            'queries': queries.queries,
+            'http_calls': http_calls,
+            'stack_samples': dict(stacks.most_common()),
+            'cprofile': _format_stats(profiler) if profiler is not None else None,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{now.strftime('%Y%m%dT%H%M%S.%f')}-{profile['duration_ms']:.0f}ms.json"
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=1)
+        logger.warning(f"Slow webhook request ({profile['duration_ms']:.0f} ms) profiled to {name}")
+        self._rotate()
+
+    def _rotate(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _format_stats(profiler, limit=40):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def default_profile_dir():
+    return os.path.join(tempfile.gettempdir(), 'uniqbot-profiles')
+
+
+def load_profiles(directory):
+    """Saved profiles, oldest first, as (file name, profile) pairs"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                profiles.append((name, json.load(f)))
+    return profiles
@@ -0,0 +1,113 @@
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple, Optional
+
+from .bot_logic import WhatsAppBot
+from .models import MessageLog, Tenant
+from .response_templates import message_text
+from .session_store import InMemorySessionStore
+
+
+class TurnDiff(NamedTuple):
+    """A turn where the current bot answers differently from what was sent"""
+    phone_number: str
+    turn: int
+    message: str
+    actual: str
+    replayed: Optional[str]
+
+
+class ReplayResult:
+    """Counters and diffs collected while replaying conversations"""
+
+    def __init__(self, max_diffs):
+        self.max_diffs = max_diffs
+        self.users = 0
+        self.turns = 0
+        self.unanswered = 0  # Incoming messages with no logged reply to compare against
+        self.diff_count = 0
+        self.diffs = []
+        self.bot_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def add_diff(self, diff):
+        self.diff_count += 1
+        if len(self.diffs) < self.max_diffs:
+            self.diffs.append(diff)
+
+    @property
+    def turns_per_second(self):
+        return self.turns / self.bot_seconds if self.bot_seconds else 0.0
+
+    @property
+    def wall_turns_per_second(self):
+        return self.turns / self.wall_seconds if self.wall_seconds else 0.0
+
+
+class ReplayBot(WhatsAppBot):
+    """WhatsAppBot with sends stubbed out, for replaying history"""
+
+    def post_message(self, phone_number, message):
+        return None, None
+
+
+def iter_turns(rows):
+    """Pair each incoming message with the outgoing text logged after it
+
+    ``rows`` are (message_type, message_content) tuples for one phone number
+    in time order. Yields (message, actual_reply) where actual_reply is None
+    when nothing was logged before the next incoming message.
+    """
+    message = None
+    replies = []
+    for message_type, content in rows:
+        if message_type == "incoming":
+            if message is not None:
+                yield message, "\n".join(replies) if replies else None
+            message, replies = content, []
+        elif message is not None:
+            replies.append(content)
+
+    if message is not None:
+        yield message, "\n".join(replies) if replies else None
+
+
+def replay_conversations(queryset=None, max_diffs=50, chunk_size=2000):
+    """Replay logged conversations through a fresh bot with in-memory sessions"""
+    if queryset is None:
+        queryset = MessageLog.objects.all()
+
+    rows = (
+        queryset.order_by('phone_number_id', 'phone_number', 'timestamp', 'id')
+        .values_list('phone_number_id', 'phone_number', 'message_type', message_text())
+        .iterator(chunk_size=chunk_size)
+    )
+
+    bots = {}
+    result = ReplayResult(max_diffs)
+    wall_start = time.perf_counter()
+
+    for (phone_number_id, phone_number), group in groupby(rows, key=itemgetter(0, 1)):
+        bot = bots.get(phone_number_id)
+        if bot is None:
+            tenant = Tenant.objects.filter(phone_number_id=phone_number_id, is_active=True).first()
+            bot = bots[phone_number_id] = ReplayBot(session_store=InMemorySessionStore(phone_number_id), tenant=tenant)
+
+        result.users += 1
+        for turn, (message, actual) in enumerate(iter_turns(row[2:] for row in group), start=1):
+            started = time.perf_counter()
+            replayed = bot.process_message(phone_number, message)
+            result.bot_seconds += time.perf_counter() - started
+            result.turns += 1
+
+            if actual is None:
+                result.unanswered += 1
+            elif (replayed or "").strip() != actual.strip():
+                result.add_diff(TurnDiff(phone_number, turn, message, actual, replayed))
+
+        # Sessions are only needed while replaying one user's history
+        bot.session_store.sessions.pop(phone_number, None)
+
+    result.wall_seconds = time.perf_counter() - wall_start
+    return result
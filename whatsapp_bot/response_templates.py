@@ -0,0 +1,72 @@
+import logging
+import threading
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Case, F, When
+
+from .models import ResponseTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCatalog:
+    """Resolves (key, text) pairs to persisted ResponseTemplate versions
+
+    The first time a process sees a text for a key it looks up the stored
+    versions, adding a new version if the text changed (for example after a
+    copy edit or under a tenant's response overrides). Resolved templates are
+    cached, so steady-state lookups never touch the database.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, key, text):
+        template = self._templates.get((key, text))
+        if template is None:
+            with self._lock:
+                template = self._templates.get((key, text))
+                if template is None:
+                    template = self._templates[(key, text)] = self._load_or_create(key, text)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def _load_or_create(self, key, text):
+        using = router.db_for_write(ResponseTemplate)
+        for attempt in range(2):
+            versions = list(ResponseTemplate.objects.using(using).filter(key=key).order_by('-version'))
+            for template in versions:
+                if template.text == text:
+                    return template
+            try:
+                with transaction.atomic(using=using):
+                    return ResponseTemplate.objects.using(using).create(
+                        key=key, version=versions[0].version + 1 if versions else 1, text=text
+                    )
+            except IntegrityError:
+                # Another process added a version concurrently; look again
+                if attempt:
+                    raise
+
+
+template_catalog = TemplateCatalog()
+
+
+def outgoing_content(reply):
+    """MessageLog fields for an outgoing reply: a template reference for catalog text, else the full text"""
+    key = getattr(reply, 'template', None)
+    if key is not None:
+        try:
+            return {'message_content': '', 'template': template_catalog.resolve(key, str(reply))}
+        except Exception as db_error:
+            logger.error(f"Error resolving response template {key}: {str(db_error)}")
+    return {'message_content': str(reply), 'template': None}
+
+
+def message_text():
+    """Query expression rebuilding each MessageLog's text, for values() and exports"""
+    return Case(When(template__isnull=False, then=F('template__text')), default=F('message_content'))
@@ -0,0 +1,89 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .batching import FlushBuffer
+from .models import ConversationRollup
+
+logger = logging.getLogger(__name__)
+
+# Counter collecting the counts of the conversation turn in progress (see SessionTurn)
+pending_rollups = ContextVar('pending_rollups', default=None)
+
+
+def hour_of(moment):
+    """Truncate a datetime to the start of its UTC hour"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class RollupBuffer(FlushBuffer):
+    """Accumulates message counts in memory and upserts them into conversation_rollups in batches"""
+
+    def _empty(self):
+        return Counter()
+
+    def _merge(self, pending, items):
+        for key, count in items:
+            pending[key] += count
+
+    def _write(self, pending):
+        rows = list(pending.items())
+        for start in range(0, len(rows), self.max_size):
+            upsert_rollups(rows[start:start + self.max_size])
+        logger.info(f"Upserted {len(rows)} rollup counter(s)")
+
+
+def upsert_rollups(rows, using=None):
+    """Add [((hour, intent, role, direction), count), ...] to the rollup table with one upsert"""
+    if not rows:
+        return
+
+    connection = connections[using or router.db_for_write(ConversationRollup)]
+    sql, params = rollup_upsert_sql(connection, rows)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rollup_upsert_sql(connection, rows):
+    """The upsert statement and its params for ``rows``, for running alone or inside a larger statement"""
+    qn = connection.ops.quote_name
+    table = qn(ConversationRollup._meta.db_table)
+
+    params = []
+    for (hour, intent, role, direction), count in rows:
+        params.extend([connection.ops.adapt_datetimefield_value(hour), intent, role, direction, count])
+
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    sql = (
+        f"INSERT INTO {table} ({qn('hour')}, {qn('intent')}, {qn('role')}, {qn('direction')}, {qn('count')}) "
+        f"VALUES {values} "
+        f"ON CONFLICT ({qn('hour')}, {qn('intent')}, {qn('role')}, {qn('direction')}) "
+        f"DO UPDATE SET {qn('count')} = {table}.{qn('count')} + EXCLUDED.{qn('count')}"
+    )
+    return sql, params
+
+
+rollup_buffer = RollupBuffer(
+    interval=getattr(settings, 'WHATSAPP_ROLLUP_FLUSH_INTERVAL', 0),
+    max_size=getattr(settings, 'WHATSAPP_ROLLUP_BATCH_SIZE', 1000),
+)
+
+
+def record_message(direction, intent=None, role=None, count=1, at=None):
+    """Count messages towards the current hour's rollup
+
+    Inside a conversation turn the count is held and written with the
+    turn's other writes; otherwise it is written now, or at the next flush
+    when buffering is on.
+    """
+    key = (hour_of(at or timezone.now()), intent or '', role or '', direction)
+    counts = pending_rollups.get()
+    if counts is not None:
+        counts[key] += count
+    else:
+        rollup_buffer.add([(key, count)])
@@ -0,0 +1,204 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import MessageLog, UserSession
+from .rollups import pending_rollups, rollup_upsert_sql, upsert_rollups
+
+logger = logging.getLogger(__name__)
+
+_current_turn = ContextVar('session_turn', default=None)
+
+# Conversation state that an idle session forgets; awaiting_agent belongs to the open handoff
+EXPIRING_FIELDS = ('current_state', 'user_role', 'last_intent', 'intent_confidence', 'recent_turns')
+
+
+def session_expired(session, ttl):
+    """Whether a session has been idle for longer than ``ttl`` seconds (0 never expires)"""
+    return bool(ttl) and session.updated_at < timezone.now() - timedelta(seconds=ttl)
+
+
+def expire_session(session):
+    """Reset an idle session's conversation state to a new session's defaults"""
+    for name in EXPIRING_FIELDS:
+        setattr(session, name, UserSession._meta.get_field(name).get_default())
+    return session
+
+
+class DatabaseSessionStore:
+    """Loads and saves UserSession rows
+
+    Sessions are partitioned by the WhatsApp phone_number_id of the tenant
+    the user is talking to. Inside a SessionTurn, saves are deferred and
+    written together with the turn's message logs. A session untouched for
+    longer than ``ttl`` seconds (WHATSAPP_SESSION_TTL; 0 never expires) is
+    read back as a fresh one.
+    """
+
+    def __init__(self, phone_number_id='', ttl=None):
+        self.phone_number_id = phone_number_id
+        self.ttl = getattr(settings, 'WHATSAPP_SESSION_TTL', 0) if ttl is None else ttl
+
+    def get_or_create(self, phone_number):
+        """Load or create the session with one INSERT ... ON CONFLICT DO UPDATE ... RETURNING"""
+        using = router.db_for_write(UserSession)
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(UserSession._meta.db_table)
+
+        # Build the row from model defaults so new columns are always covered
+        new_session = UserSession(phone_number_id=self.phone_number_id, phone_number=phone_number)
+        fields = [field for field in UserSession._meta.concrete_fields if not field.primary_key]
+        params = [field.get_db_prep_save(field.pre_save(new_session, True), connection) for field in fields]
+
+        # The no-op DO UPDATE makes RETURNING yield the existing row on conflict
+        sql = (
+            f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))}) "
+            f"ON CONFLICT ({qn('phone_number_id')}, {qn('phone_number')}) "
+            f"DO UPDATE SET {qn('updated_at')} = {table}.{qn('updated_at')} "
+            f"RETURNING {', '.join(qn(field.column) for field in UserSession._meta.concrete_fields)}"
+        )
+        session = next(iter(UserSession.objects.db_manager(using).raw(sql, params)))
+        expired = session_expired(session, self.ttl)
+        if expired:
+            logger.info(f"Session for {phone_number} expired (idle since {session.updated_at:%Y-%m-%d %H:%M}), starting afresh")
+            expire_session(session)
+        turn = _current_turn.get()
+        if turn is not None:
+            # Even a turn that changes nothing marks the user as active when it commits;
+            # an expired one is written whole so the old state is not revived
+            if expired:
+                turn.session = session
+            else:
+                turn.loaded = session
+        return session
+
+    def save(self, session):
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.session = session
+        else:
+            session.save()
+
+
+class InMemorySessionStore:
+    """Keeps sessions in a dict so the bot can run without touching the database"""
+
+    def __init__(self, phone_number_id=''):
+        self.phone_number_id = phone_number_id
+        self.sessions = {}
+
+    def get_or_create(self, phone_number):
+        session = self.sessions.get(phone_number)
+        if session is None:
+            session = UserSession(
+                phone_number_id=self.phone_number_id,
+                phone_number=phone_number,
+                current_state='greeting'
+            )
+            self.sessions[phone_number] = session
+        return session
+
+    def save(self, session):
+        pass
+
+
+class SessionTurn:
+    """Collects the writes of one conversation turn and commits them together
+
+    Used as a context manager around processing one inbound message: session
+    saves made through DatabaseSessionStore, the message logs added with
+    ``log`` and the analytics counts recorded with record_message are
+    committed in a single transaction on exit. On PostgreSQL this is one
+    writable-CTE statement, so with the session upsert a whole turn takes
+    two round trips. A session that was loaded but not saved still
+    has its updated_at bumped, so an active user's session never looks idle.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.loaded = None
+        self.logs = []
+        self.rollups = Counter()
+        self._token = None
+        self._rollup_token = None
+
+    def __enter__(self):
+        self._token = _current_turn.set(self)
+        self._rollup_token = pending_rollups.set(self.rollups)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_turn.reset(self._token)
+        pending_rollups.reset(self._rollup_token)
+        try:
+            self.commit()
+        except Exception as db_error:
+            logger.error(f"Error saving conversation turn: {str(db_error)}")
+        return False
+
+    def log(self, **fields):
+        self.logs.append(MessageLog(**fields))
+
+    def commit(self):
+        session, logs, rollups = self.session, self.logs, list(self.rollups.items())
+        update_fields = None
+        if session is None and self.loaded is not None:
+            session, update_fields = self.loaded, ['updated_at']
+        self.session, self.loaded, self.logs = None, None, []
+        self.rollups.clear()
+        if session is None and not logs and not rollups:
+            return
+
+        using = router.db_for_write(MessageLog)
+        connection = connections[using]
+        if session is not None and logs and connection.vendor == 'postgresql':
+            _write_turn_statement(connection, session, logs, update_fields, rollups)
+            return
+
+        with transaction.atomic(using=using):
+            if session is not None:
+                session.save(using=using, update_fields=update_fields)
+            if logs:
+                MessageLog.objects.using(using).bulk_create(logs)
+            upsert_rollups(rollups, using=using)
+
+
+def _write_turn_statement(connection, session, logs, update_fields=None, rollups=()):
+    """UPDATE the session (only ``update_fields``, if given), upsert the rollups and INSERT the logs in one statement"""
+    qn = connection.ops.quote_name
+
+    session_fields = [
+        field for field in UserSession._meta.concrete_fields
+        if not field.primary_key and (update_fields is None or field.name in update_fields)
+    ]
+    assignments = ", ".join(f"{qn(field.column)} = %s" for field in session_fields)
+    params = [field.get_db_prep_save(field.pre_save(session, False), connection) for field in session_fields]
+    params.append(session.pk)
+
+    rollup_update = ""
+    if rollups:
+        rollup_sql, rollup_params = rollup_upsert_sql(connection, rollups)
+        rollup_update = f", rollup_update AS ({rollup_sql}) "
+        params.extend(rollup_params)
+
+    log_fields = [field for field in MessageLog._meta.concrete_fields if not field.primary_key]
+    row = f"({', '.join(['%s'] * len(log_fields))})"
+    for log in logs:
+        params.extend(field.get_db_prep_save(field.pre_save(log, True), connection) for field in log_fields)
+
+    sql = (
+        f"WITH session_update AS ("
+        f"UPDATE {qn(UserSession._meta.db_table)} SET {assignments} WHERE {qn(UserSession._meta.pk.column)} = %s)"
+        f"{rollup_update or ' '}"
+        f"INSERT INTO {qn(MessageLog._meta.db_table)} ({', '.join(qn(field.column) for field in log_fields)}) "
+        f"VALUES {', '.join([row] * len(logs))}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+
+from .batching import FlushBuffer
+from .models import MessageLog
+
+logger = logging.getLogger(__name__)
+
+# Statuses only ever move forward, so a late "delivered" never overwrites "read"
+STATUS_RANKS = {
+    'sent': 1,
+    'delivered': 2,
+    'read': 3,
+    'failed': 4,
+}
+
+
+class StatusBuffer(FlushBuffer):
+    """Collects delivery status callbacks and applies them in one UPDATE per flush"""
+
+    def _merge(self, pending, updates):
+        for update in updates:
+            rank = STATUS_RANKS.get(update.status)
+            if rank is None or not update.message_id:
+                continue
+            current = pending.get(update.message_id)
+            if current is None or rank > current[0]:
+                pending[update.message_id] = (rank, update.status, _parse_timestamp(update.timestamp))
+
+    def _write(self, pending):
+        rows = list(pending.items())
+        for start in range(0, len(rows), self.max_size):
+            chunk = rows[start:start + self.max_size]
+            updated = apply_status_updates(chunk)
+            logger.info(f"Applied {len(chunk)} status update(s), {updated} row(s) changed")
+
+
+def apply_status_updates(rows):
+    """Apply [(wa_message_id, (rank, status, timestamp)), ...] with a single UPDATE ... FROM (VALUES ...)"""
+    if not rows:
+        return 0
+
+    table = connection.ops.quote_name(MessageLog._meta.db_table)
+    params = []
+    for message_id, (rank, status, timestamp) in rows:
+        params.extend([message_id, status, connection.ops.adapt_datetimefield_value(timestamp), rank])
+
+    # VALUES columns are addressed as column1..column4, which PostgreSQL and SQLite both support
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    rank_case = " ".join(f"WHEN '{status}' THEN {rank}" for status, rank in STATUS_RANKS.items())
+    sql = (
+        f"UPDATE {table} SET delivery_status = v.column2, status_updated_at = v.column3 "
+        f"FROM (VALUES {values}) AS v "
+        f"WHERE {table}.wa_message_id = v.column1 "
+        f"AND v.column4 > CASE {table}.delivery_status {rank_case} ELSE 0 END"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+    except (TypeError, ValueError):
+        return datetime.now(tz=timezone.utc)
+
+
+status_buffer = StatusBuffer(
+    interval=getattr(settings, 'WHATSAPP_STATUS_FLUSH_INTERVAL', 0),
+    max_size=getattr(settings, 'WHATSAPP_STATUS_BATCH_SIZE', 500),
+)
+
+
+def record_statuses(updates):
+    """Apply status updates from a webhook, or queue them for the next flush when buffering is on"""
+    if updates:
+        status_buffer.add(updates)
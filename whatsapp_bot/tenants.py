@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bot_config import live_config, live_version
+from .bot_logic import WhatsAppBot
+from .models import BotConfig, Tenant
+
+logger = logging.getLogger(__name__)
+
+
+class TenantRegistry:
+    """Process-wide cache of one WhatsAppBot per tenant, keyed by phone_number_id
+
+    Bots are built once per tenant and reused, so each tenant keeps its own
+    intent recognizer, response catalog and pooled HTTP client. Entries are
+    re-checked against the database after ``ttl`` seconds (a cheap lookup
+    that only rebuilds the bot when the tenant's updated_at changed), and
+    dropped immediately when a Tenant is saved or deleted in this process.
+    Numbers without an active Tenant row are served by the settings-based bot.
+
+    Every bot is built from the live BotConfig. At most every
+    ``config_poll`` seconds a background thread checks for a newer version;
+    when there is one it builds a complete new set of bots and swaps them
+    in with a single assignment. Messages already being handled finish
+    with the bot they started with, and the webhook never waits for a
+    rebuild. A ``config_poll`` of 0 turns reloading off.
+    """
+
+    def __init__(self, ttl, config_poll=0):
+        self.ttl = ttl
+        self.config_poll = config_poll
+        self._entries = {}  # phone_number_id -> (checked_at, updated_at, bot)
+        self._default_bot = None
+        self._config = None  # BotConfig the bots are built from, None for the built-in tables
+        self._config_checked = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+
+    def get_bot(self, phone_number_id):
+        """Return the bot serving ``phone_number_id``"""
+        now = time.monotonic()
+        if self.config_poll and self._default_bot is not None and now - self._config_checked >= self.config_poll:
+            self._refresh_in_background(now)
+        if not phone_number_id:
+            return self.default_bot()
+
+        entry = self._entries.get(phone_number_id)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[2]
+
+        tenant = Tenant.objects.filter(phone_number_id=phone_number_id, is_active=True).first()
+        if tenant is None:
+            logger.warning(f"No active tenant for phone_number_id {phone_number_id}, using default configuration")
+            bot = self.default_bot()
+            updated_at = None
+        elif entry is not None and entry[1] == tenant.updated_at:
+            bot = entry[2]
+            updated_at = tenant.updated_at
+        else:
+            logger.info(f"Loading configuration for tenant {tenant}")
+            bot = WhatsAppBot(tenant=tenant, config=self._config)
+            updated_at = tenant.updated_at
+
+        with self._lock:
+            self._entries[phone_number_id] = (now, updated_at, bot)
+        return bot
+
+    def default_bot(self):
+        if self._default_bot is None:
+            # A cold process loads the live configuration before its first message
+            with self._lock:
+                if self._default_bot is None:
+                    self._config = self._load_config()
+                    self._config_checked = time.monotonic()
+                    self._default_bot = WhatsAppBot(config=self._config)
+        return self._default_bot
+
+    def _load_config(self):
+        try:
+            return live_config()
+        except Exception as db_error:
+            logger.error(f"Error loading bot configuration, using built-in intents and responses: {str(db_error)}")
+            return None
+
+    def _refresh_in_background(self, now):
+        """Start a configuration check unless one is already running"""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        self._config_checked = now
+
+        def refresh():
+            try:
+                self.refresh_config()
+            except Exception as refresh_error:
+                logger.error(f"Error reloading bot configuration: {str(refresh_error)}")
+            finally:
+                self._refreshing.release()
+                close_old_connections()
+
+        threading.Thread(target=refresh, name='bot-config-refresh', daemon=True).start()
+
+    def refresh_config(self):
+        """Rebuild every bot if a new configuration version was published; True when it swapped"""
+        current = self._config.version if self._config is not None else None
+        if live_version() == current:
+            return False
+        config = live_config()
+
+        # Build the complete new set first; nothing is visible until the swap
+        default_bot = WhatsAppBot(config=config)
+        entries = dict(self._entries)
+        tenants = {
+            tenant.phone_number_id: tenant
+            for tenant in Tenant.objects.filter(phone_number_id__in=list(entries), is_active=True)
+        }
+        rebuilt = {}
+        for phone_number_id, (checked_at, updated_at, bot) in entries.items():
+            tenant = tenants.get(phone_number_id)
+            if tenant is None:
+                rebuilt[phone_number_id] = (checked_at, None, default_bot)
+            elif tenant.updated_at == updated_at:
+                rebuilt[phone_number_id] = (checked_at, updated_at, WhatsAppBot(tenant=tenant, config=config, http_session=bot.http))
+
+        with self._lock:
+            # Entries cached while we were building still use the old configuration; rebuild those on demand
+            self._entries = {key: entry for key, entry in rebuilt.items() if key in self._entries}
+            self._config = config
+            self._default_bot = default_bot
+        logger.info(f"Swapped in bot configuration {f'v{config.version}' if config else 'built-in'}")
+        return True
+
+    def reload_config(self):
+        """Check for a new configuration on the next message instead of waiting for the poll"""
+        self._config_checked = 0.0
+
+    def invalidate(self, phone_number_id=None):
+        """Forget one tenant's cached bot, or every cached bot"""
+        with self._lock:
+            if phone_number_id is None:
+                self._entries.clear()
+                self._default_bot = None
+            else:
+                self._entries.pop(phone_number_id, None)
+
+
+tenant_registry = TenantRegistry(
+    ttl=getattr(settings, 'WHATSAPP_TENANT_CACHE_TTL', 60),
+    config_poll=getattr(settings, 'WHATSAPP_BOT_CONFIG_POLL', 0),
+)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant(sender, instance, **kwargs):
+    tenant_registry.invalidate(instance.phone_number_id)
+
+
+@receiver(post_save, sender=BotConfig)
+def reload_bot_config(sender, instance, **kwargs):
+    tenant_registry.reload_config()
@@ -0,0 +1,82 @@
+import math
+
+
+class TimingWheel:
+    """Hierarchical timing wheel: O(1) schedule and cancel, however many timers are pending
+
+    Time is cut into ticks of ``tick`` seconds. Level 0 has one slot per
+    tick for the next ``wheel_size`` ticks, and each level above has slots
+    ``wheel_size`` times wider, so ``levels`` levels cover
+    ``wheel_size ** levels`` ticks. Timers further out wait in an overflow
+    slot. When the clock reaches a higher-level slot, its timers are
+    spread into the finer levels below, so each timer moves at most
+    ``levels`` times before it expires. Not thread-safe; callers lock.
+    """
+
+    def __init__(self, tick=1.0, wheel_size=64, levels=4, now=0.0):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self._wheels = [[{} for _ in range(wheel_size)] for _ in range(levels)]
+        self._overflow = {}
+        self._slots = {}  # timer key -> the slot dict holding it
+        self._current = int(now // tick)  # Last tick processed
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def schedule(self, key, deadline, value=None):
+        """Fire ``key`` (with ``value``) at the first tick at or after ``deadline``, replacing any earlier timer"""
+        self.cancel(key)
+        due = max(math.ceil(deadline / self.tick), self._current + 1)
+        self._place(key, due, value)
+
+    def cancel(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        del slot[key]
+        return True
+
+    def advance(self, now):
+        """Move the clock to ``now``; returns [(key, value), ...] of the timers that expired, earliest first"""
+        target = int(now // self.tick)
+        expired = []
+        while self._current < target:
+            self._current += 1
+            # Cascade from the widest level whose slot starts at this tick
+            for level in range(self.levels, 0, -1):
+                span = self.wheel_size ** level
+                if self._current % span == 0:
+                    if level == self.levels:
+                        self._cascade(self._overflow)
+                    else:
+                        self._cascade(self._wheels[level][(self._current // span) % self.wheel_size])
+            slot = self._wheels[0][self._current % self.wheel_size]
+            if slot:
+                for key, (due, value) in slot.items():
+                    del self._slots[key]
+                    expired.append((key, value))
+                slot.clear()
+        return expired
+
+    def _place(self, key, due, value):
+        delta = due - self._current
+        for level in range(self.levels):
+            span = self.wheel_size ** level
+            if delta < span * self.wheel_size:
+                slot = self._wheels[level][(due // span) % self.wheel_size]
+                break
+        else:
+            slot = self._overflow
+        slot[key] = (due, value)
+        self._slots[key] = slot
+
+    def _cascade(self, slot):
+        timers = list(slot.items())
+        slot.clear()
+        for key, (due, value) in timers:
+            self._place(key, due, value)
@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+# Words (letters, digits, underscore and combining accents, so Yoruba tone marks stay
+# inside their word) or single emoji; everything else is a separator
+_TOKEN = re.compile(
+    r"([\w\u0300-\u036f\u1dc0-\u1dff]+)"
+    r"|([\U0001F000-\U0001FAFF\u2600-\u27bf\u2b00-\u2bff])"
+)
+
+MAX_NGRAM = 5  # Longest catalog keyword phrase (in any language), in words
+
+# Hausa hooked letters, which many phones cannot type
+_PLAIN_LETTERS = str.maketrans('\u0253\u0257\u0199\u01b4', 'bdky')
+
+
+class Tokens:
+    """One message, normalized once and shared by every matching stage
+
+    ``text`` is the case-folded message with punctuation and emoji replaced
+    by single spaces, ``tokens`` its words and ``emoji`` the emoji it
+    contained. ``ngrams`` (every run of 1 to MAX_NGRAM words) and ``plain``
+    are built on first use. Tokens compare and hash by ``text``, so they can
+    key caches of anything computed from the normalized message.
+    """
+
+    __slots__ = ('raw', 'text', 'tokens', 'emoji', '_ngrams', '_plain')
+
+    def __init__(self, raw, tokens, emoji):
+        self.raw = raw
+        self.tokens = tokens
+        self.text = ' '.join(tokens)
+        self.emoji = emoji
+        self._ngrams = None
+        self._plain = None
+
+    @property
+    def ngrams(self):
+        if self._ngrams is None:
+            tokens = self.tokens
+            self._ngrams = frozenset(
+                ' '.join(tokens[start:start + size])
+                for size in range(1, MAX_NGRAM + 1)
+                for start in range(len(tokens) - size + 1)
+            )
+        return self._ngrams
+
+    @property
+    def plain(self):
+        """``text`` without tone marks, dots below or hooked letters (ẹ -> e, ɗ -> d), the way most users type"""
+        if self._plain is None:
+            self._plain = plain_text(self.text)
+        return self._plain
+
+    @property
+    def number(self):
+        """The message as a menu number like '7' or '12', or None"""
+        if len(self.tokens) == 1 and self.text.isdecimal():
+            return str(int(self.text))
+        return None
+
+    def __eq__(self, other):
+        return isinstance(other, Tokens) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return f"Tokens({self.text!r})"
+
+
+def tokenize(message):
+    """Normalize ``message`` in one pass; Tokens are returned unchanged"""
+    if isinstance(message, Tokens):
+        return message
+    folded = unicodedata.normalize('NFC', message).casefold()
+    tokens = []
+    emoji = []
+    for word, symbol in _TOKEN.findall(folded):
+        if word:
+            tokens.append(word)
+        else:
+            emoji.append(symbol)
+    return Tokens(message, tuple(tokens), tuple(emoji))
+
+
+def normalize(phrase):
+    """Normalize a catalog keyword or alias the same way as messages"""
+    return tokenize(phrase).text
+
+
+def plain_text(text):
+    """Strip combining marks and hooked letters from already normalized text"""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).translate(_PLAIN_LETTERS)
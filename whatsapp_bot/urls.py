@@ -1,6 +1,15 @@
 from django.urls import path, re_path
-from . import views
+from . import export_views, handoff_views, history_views, views
 
 urlpatterns = [
     re_path(r'^$', views.webhook, name='webhook'),  # Matches both /webhook and /webhook/
+    path('metrics/lanes/', views.lane_metrics, name='lane_metrics'),
+    path('metrics/flood/', views.flood_metrics, name='flood_metrics'),
+    path('export/messages/', export_views.export_messages, name='export_messages'),
+    path('history/<str:phone_number>/', history_views.conversation_history, name='conversation_history'),
+    path('handoffs/', handoff_views.handoff_list, name='handoff_list'),
+    path('handoffs/stream/', handoff_views.handoff_stream, name='handoff_stream'),
+    path('handoffs/<int:pk>/claim/', handoff_views.handoff_claim, name='handoff_claim'),
+    path('handoffs/<int:pk>/reply/', handoff_views.handoff_reply, name='handoff_reply'),
+    path('handoffs/<int:pk>/close/', handoff_views.handoff_close, name='handoff_close'),
 ]
@@ -1,11 +1,23 @@
-import json
 import logging
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
-from .models import UserSession, MessageLog
-from .bot_logic import WhatsAppBot
+from .bot_logic import HANDOFF_INTENTS, WhatsAppBot
+from .coalescing import build_coalescer, coalesce_batch
+from .flood import ALLOW, NOTIFY, flood_limiter
+from .follow_ups import FOLLOW_UP_INTENTS, follow_up_scheduler
+from .handoffs import open_handoff, record_inbound, release_handoff
+from .lanes import LANES, LOW, NORMAL, URGENT_INTENTS, lane_for, lane_scheduler, urgent_conversations
+from .media import queue_media
+from .models import MessageLog
+from .payloads import decode_webhook
+from .response_templates import outgoing_content
+from .rollups import record_message
+from .session_store import SessionTurn
+from .status_tracking import record_statuses
+from .tenants import tenant_registry
 
 logger = logging.getLogger(__name__)
 
@@ -49,18 +61,21 @@ def verify_webhook(request):
 def handle_webhook(request):
     """Handle incoming WhatsApp messages"""
     try:
-        data = json.loads(request.body)
-        
-        # Process webhook data
-        if "entry" in data:
-            for entry in data["entry"]:
-                if "changes" in entry:
-                    for change in entry["changes"]:
-                        if change.get("field") == "messages":
-                            process_message(change["value"])
-        
+        body = request.body
+
+        changes = decode_webhook(body)
+        record_statuses([status for change in changes for status in change.statuses])
+
+        # Delivery/read callbacks carry no user messages, so skip the message pipeline
+        if not any(change.messages for change in changes):
+            logger.debug("Received status-only webhook")
+            return HttpResponse("OK")
+
+        for change in changes:
+            process_message(change)
+
         return HttpResponse("OK")
-    
+
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
         return HttpResponseBadRequest("Error processing webhook")
@@ -68,67 +83,212 @@ def handle_webhook(request):
 def process_message(message_data):
     """Process incoming message and generate response"""
     try:
-        logger.info(f"Processing message data: {json.dumps(message_data, indent=2)}")
-        
-        if "messages" in message_data:
-            for message in message_data["messages"]:
-                logger.info(f"Processing individual message: {json.dumps(message, indent=2)}")
-                phone_number = message["from"]
-                message_body = message.get("text", {}).get("body", "").strip()
-                
-                logger.info(f"Extracted phone: {phone_number}, message: {message_body}")
-                
-                # Log incoming message (continue even if database fails)
-                try:
-                    MessageLog.objects.create(
-                        phone_number=phone_number,
-                        message_type="incoming",
-                        message_content=message_body
-                    )
-                    logger.info("Incoming message logged successfully")
-                except Exception as db_error:
-                    logger.error(f"Error logging incoming message: {str(db_error)}")
-                    logger.info("Continuing without database logging...")
-                
-                # Process with bot logic (this should work regardless of database issues)
-                try:
-                    bot = WhatsAppBot()
-                    logger.info("Created WhatsAppBot instance")
-                    
-                    response = bot.process_message(phone_number, message_body)
-                    logger.info(f"Bot generated response: {response}")
-                    
-                    if response:
-                        logger.info(f"Attempting to send message to {phone_number}")
-                        send_result = bot.send_message(phone_number, response)
-                        logger.info(f"Send message result: {send_result}")
-                        
-                        # Log outgoing message (continue even if this fails)
-                        try:
-                            MessageLog.objects.create(
-                                phone_number=phone_number,
-                                message_type="outgoing",
-                                message_content=response
-                            )
-                            logger.info("Outgoing message logged successfully")
-                        except Exception as db_error:
-                            logger.error(f"Error logging outgoing message: {str(db_error)}")
-                            logger.info("Message sent successfully despite logging error")
-                    else:
-                        logger.warning("Bot did not generate a response")
-                        
-                except Exception as bot_error:
-                    logger.error(f"Error in bot processing: {str(bot_error)}")
-                    # Try to send a fallback message
-                    try:
-                        bot = WhatsAppBot()
-                        fallback_response = "Sorry, I'm experiencing some technical difficulties. Please try again later."
-                        bot.send_message(phone_number, fallback_response)
-                        logger.info("Sent fallback message due to bot processing error")
-                    except Exception as fallback_error:
-                        logger.error(f"Failed to send fallback message: {str(fallback_error)}")
-                else:
-                    logger.warning("Bot did not generate a response")
-    
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing message data: {message_data!r}")
+
+        if message_data.messages:
+            messages, throttled = admit_messages(message_data.phone_number_id, message_data.messages)
+            if message_coalescer.window:
+                # Quick follow-ups are merged into one turn; the first message of a burst is never held
+                messages = [message for message in coalesce_batch(messages)
+                            if message_coalescer.offer(message_data.phone_number_id, message)]
+            for lane, sender_messages in sender_lanes(message_data.phone_number_id, messages):
+                for message in sender_messages:
+                    lane_scheduler.submit(lane, handle_message, message_data.phone_number_id, message,
+                                          key=(message_data.phone_number_id, message.phone_number))
+            # Notices follow the replies to the messages that were let through
+            for phone_number in throttled:
+                lane_scheduler.submit(LOW, send_throttle_notice, message_data.phone_number_id, phone_number,
+                                      key=(message_data.phone_number_id, phone_number))
+
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
+
+def sender_lanes(phone_number_id, messages):
+    """Group a batch by sender: [(lane, messages in arrival order), ...], highest lane first
+
+    Priority is per sender, not per message, so a user's messages are never
+    reordered: a sender is put in the highest lane of any of their messages.
+    The sort is stable, so senders in the same lane keep arrival order.
+    """
+    by_sender = {}
+    for message in messages:
+        by_sender.setdefault(message.phone_number, []).append(message)
+    lanes = [
+        (min((message_lane(phone_number_id, message) for message in sender_messages), key=LANES.index), sender_messages)
+        for sender_messages in by_sender.values()
+    ]
+    lanes.sort(key=lambda item: LANES.index(item[0]))
+    return lanes
+
+def admit_messages(phone_number_id, messages):
+    """Split a batch by the flood limit: (messages to process, senders that just went over it)
+
+    Runs before any database or network work; messages from senders already
+    over the limit are dropped here.
+    """
+    admitted, throttled = [], []
+    for message in messages:
+        decision = flood_limiter.check(phone_number_id, message.phone_number)
+        if decision == ALLOW:
+            admitted.append(message)
+        elif decision == NOTIFY:
+            logger.warning(f"Throttling {message.phone_number}: over the inbound message limit")
+            throttled.append(message.phone_number)
+    return admitted, throttled
+
+def send_throttle_notice(phone_number_id, phone_number):
+    """Ask a flooding sender to slow down; their further messages are dropped until they do"""
+    bot = tenant_registry.get_bot(phone_number_id)
+    notice = bot.throttle_notice()
+    try:
+        send_result = bot.send_message(phone_number, notice)
+    except Exception as send_error:
+        logger.error(f"Error sending throttle notice: {str(send_error)}")
+        send_result = None
+    MessageLog.objects.create(
+        phone_number_id=phone_number_id,
+        phone_number=phone_number,
+        message_type="outgoing",
+        **outgoing_content(notice),
+        wa_message_id=send_result,
+        delivery_status=None if send_result else "failed"
+    )
+    record_message("outgoing", notice.intent)
+
+def dispatch_message(phone_number_id, message):
+    """Queue one (possibly merged) message in its lane"""
+    lane_scheduler.submit(message_lane(phone_number_id, message), handle_message, phone_number_id, message,
+                          key=(phone_number_id, message.phone_number))
+
+message_coalescer = build_coalescer(dispatch_message)
+
+def message_lane(phone_number_id, message):
+    """Priority lane for an inbound message; classification problems never drop the message"""
+    try:
+        return lane_for(tenant_registry.get_bot(phone_number_id), message, urgent_conversations)
+    except Exception as lane_error:
+        logger.error(f"Error choosing lane, using normal: {str(lane_error)}")
+        return NORMAL
+
+def handle_message(phone_number_id, message):
+    """Run one conversation turn for an inbound message"""
+    phone_number = message.phone_number
+    message_body = message.body
+
+    logger.info(f"Extracted phone: {phone_number}, message: {message_body}")
+
+    # A user who writes again no longer needs nudging
+    try:
+        follow_up_scheduler.cancel(phone_number_id, phone_number)
+    except Exception as follow_up_error:
+        logger.error(f"Error cancelling follow-ups: {str(follow_up_error)}")
+
+    media_type = None
+    if message.media is not None:
+        # The file itself is fetched in the background
+        media_type = message.type
+        try:
+            queue_media(phone_number_id, message)
+        except Exception as media_error:
+            logger.error(f"Error queueing media download: {str(media_error)}")
+
+    # Session and log writes for this message are committed together when the turn ends
+    # (a database failure there is logged and does not stop the reply). A merged burst is
+    # answered as one message, but each message in it is logged as it was sent
+    with SessionTurn() as turn:
+        for received in message.parts or (message,):
+            turn.log(
+                phone_number_id=phone_number_id,
+                phone_number=phone_number,
+                message_type="incoming",
+                message_content=describe_message(received.body, media_type),
+                wa_message_id=received.message_id
+            )
+        process_turn(turn, phone_number_id, phone_number, message_body, media_type)
+
+def describe_message(message_body, media_type=None):
+    """Text for logs and the agents' inbox; media messages show their type and caption"""
+    return f"[{media_type}] {message_body}".strip() if media_type else message_body
+
+def process_turn(turn, phone_number_id, phone_number, message_body, media_type=None):
+    """Generate and send the reply to one message, recording it on the turn"""
+    # Process with bot logic (this should work regardless of database issues)
+    try:
+        bot = tenant_registry.get_bot(phone_number_id)
+
+        if media_type:
+            response = bot.process_media(phone_number, message_body)
+        else:
+            response = bot.process_message(phone_number, message_body)
+        logger.info(f"Bot generated response: {response}")
+        intent, role = getattr(response, 'intent', None), getattr(response, 'role', None)
+        record_message("incoming", intent, role)
+        if intent in URGENT_INTENTS or intent == 'agent_conversation':
+            urgent_conversations.mark(phone_number)
+
+        if response:
+            logger.info(f"Attempting to send message to {phone_number}")
+            send_result = bot.send_message(phone_number, response)
+            logger.info(f"Send message result: {send_result}")
+
+            turn.log(
+                phone_number_id=phone_number_id,
+                phone_number=phone_number,
+                message_type="outgoing",
+                **outgoing_content(response),
+                wa_message_id=send_result,
+                delivery_status=None if send_result else "failed"
+            )
+            record_message("outgoing", intent, role)
+            if send_result and intent in FOLLOW_UP_INTENTS:
+                schedule_follow_ups(phone_number_id, phone_number)
+        elif intent != 'agent_conversation':
+            logger.warning("Bot did not generate a response")
+
+        route_to_agents(phone_number_id, phone_number, describe_message(message_body, media_type), intent,
+                        handed_back=getattr(response, 'handed_back', False))
+
+    except Exception as bot_error:
+        logger.error(f"Error in bot processing: {str(bot_error)}")
+        record_message("incoming", "error")
+        # Try to send a fallback message, from the number the user wrote to
+        try:
+            try:
+                bot = tenant_registry.get_bot(phone_number_id)
+            except Exception as tenant_error:
+                logger.error(f"Error loading tenant bot, sending fallback from the default number: {str(tenant_error)}")
+                bot = WhatsAppBot()
+            fallback_response = "Sorry, I'm experiencing some technical difficulties. Please try again later."
+            bot.send_message(phone_number, fallback_response)
+            logger.info("Sent fallback message due to bot processing error")
+        except Exception as fallback_error:
+            logger.error(f"Failed to send fallback message: {str(fallback_error)}")
+
+def schedule_follow_ups(phone_number_id, phone_number):
+    try:
+        follow_up_scheduler.schedule(phone_number_id, phone_number)
+    except Exception as follow_up_error:
+        logger.error(f"Error scheduling follow-ups: {str(follow_up_error)}")
+
+def route_to_agents(phone_number_id, phone_number, message_body, intent, handed_back=False):
+    """Queue handoffs, forward messages of handed-off users to the agents' inbox and close handoffs users left"""
+    try:
+        if handed_back:
+            release_handoff(phone_number_id, phone_number)
+        if intent in HANDOFF_INTENTS:
+            open_handoff(phone_number_id, phone_number, intent, message_body)
+        elif intent == 'agent_conversation':
+            record_inbound(phone_number_id, phone_number, message_body)
+    except Exception as handoff_error:
+        logger.error(f"Error routing message to agents: {str(handoff_error)}")
+
+@staff_member_required
+def lane_metrics(request):
+    """Per-lane queue depth, throughput and latency percentiles of this process"""
+    return JsonResponse(lane_scheduler.stats())
+
+@staff_member_required
+def flood_metrics(request):
+    """Messages allowed, throttled and dropped by this process's flood limiter"""
+    return JsonResponse(flood_limiter.metrics.snapshot())